@@ -1,11 +1,18 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from database import get_db, User
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, SessionLocal, User
 import os
 
 # Security
@@ -15,6 +22,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# bcrypt takes ~100-300 ms of CPU per call; a small dedicated pool keeps it off
+# the event loop and caps how many cores a burst of logins can take
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    thread_name_prefix="bcrypt",
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -22,6 +37,96 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+
+# Singleton short-TTL cache of bearer token -> user row, so a burst of
+# authenticated requests doesn't decode the JWT and query the DB every time.
+# Entries never outlive the token and are dropped when the user row changes
+# through the ORM (a flushed User object, or a bulk update()/delete() on User
+# run through a Session). Core statements on the users table bypass this and
+# are only picked up once the TTL runs out.
+class UserCache:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.ttl = float(os.getenv("AUTH_CACHE_TTL", "30"))
+        self.max_entries = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+        # token -> (user, expires_at), least recently used first
+        self._entries: OrderedDict[str, tuple[User, float]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self._mutex = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[0].id]
+
+    def get(self, token: str) -> Optional[User]:
+        with self._mutex:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return entry[0]
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        if self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._mutex:
+            self._drop(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._mutex:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(_mapper, _connection, target: User):
+    UserCache.instance().invalidate_user(target.id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_write(state):
+    # Bulk update()/delete() skip the per-object events above, and which rows they
+    # touch isn't known up front, so every cached user is dropped
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is User:
+        UserCache.instance().clear()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -32,17 +137,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def _decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("sub") is None:
+            raise JWTError("missing subject")
+        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,12 +150,35 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def get_current_user(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _decode_token(credentials.credentials)["sub"]
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
+    cache = UserCache.instance()
+    user = cache.get(credentials.credentials)
+    if user is not None:
+        return user
+    payload = _decode_token(credentials.credentials)
+    user = await db.get(User, int(payload["sub"]))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Detach so the cached row can be shared across requests and sessions
+    db.expunge(user)
+    cache.put(credentials.credentials, user, payload.get("exp"))
     return user
+
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[User]:
+    """The signed-in user, or None for anonymous requests and invalid tokens."""
+    if credentials is None:
+        return None
+    # Own short-lived session: endpoints using this can run for minutes and
+    # shouldn't hold a pooled connection for the whole request
+    try:
+        async with SessionLocal() as db:
+            return await get_current_user(credentials, db)
+    except HTTPException:
+        return None
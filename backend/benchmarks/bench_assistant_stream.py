@@ -0,0 +1,62 @@
+"""
+Compare time-to-first-token of GeminiService.stream_ask with the blocking ask(),
+against the local fake Gemini server (no network, response cache disabled).
+
+Usage (from backend/):
+    python -m benchmarks.bench_assistant_stream --iterations 5
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from benchmarks.fake_servers import FakeGeminiHandler, start_fake_server
+
+
+async def _measure(service, iterations: int) -> dict:
+    blocking, first_token, stream_total = [], [], []
+    for i in range(iterations):
+        prompt = f"How can I improve this layout? ({i})"
+
+        start = time.perf_counter()
+        await service.ask(prompt)
+        blocking.append((time.perf_counter() - start) * 1000.0)
+
+        start = time.perf_counter()
+        first = None
+        async for _ in service.stream_ask(prompt):
+            if first is None:
+                first = (time.perf_counter() - start) * 1000.0
+        first_token.append(first)
+        stream_total.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        "iterations": iterations,
+        "ask_total_ms": statistics.median(blocking),
+        "stream_first_token_ms": statistics.median(first_token),
+        "stream_total_ms": statistics.median(stream_total),
+    }
+
+
+def run(iterations: int, first_chunk_ms: float, chunk_ms: float) -> dict:
+    server, url = start_fake_server(FakeGeminiHandler, first_chunk_ms=first_chunk_ms, chunk_ms=chunk_ms)
+    os.environ["GEMINI_API_BASE"] = f"{url}/v1beta"
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    from services.gemini_service import GeminiService
+
+    try:
+        return asyncio.run(_measure(GeminiService(), iterations))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--first-chunk-ms", type=float, default=300)
+    parser.add_argument("--chunk-ms", type=float, default=80)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.first_chunk_ms, args.chunk_ms), indent=2))
@@ -0,0 +1,87 @@
+"""
+Measure what the backend router saves when the HF API misbehaves: sequential
+enhancement calls against the local fake HF server, with injected 503s and
+slow responses, with the router disabled, with the circuit breaker only, and
+with the breaker plus p95 hedging. A skipped or failed call costs nothing
+extra here (the base image is kept), as in finalize_image.
+
+Usage (from backend/):
+    python -m benchmarks.bench_backend_router --requests 60 --error-rate 0.5
+    python -m benchmarks.bench_backend_router --error-rate 0 --slow-rate 0.1 --slow-ms 3000
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from PIL import Image
+
+from benchmarks.bench_generate import _summary, _git_commit
+from benchmarks.fake_servers import FakeHFHandler, start_fake_server
+
+MODES = {
+    "direct": {"ROUTER_ENABLED": "false"},
+    "breaker": {"ROUTER_ENABLED": "true", "ROUTER_HEDGE": "false"},
+    "breaker_hedge": {"ROUTER_ENABLED": "true", "ROUTER_HEDGE": "true"},
+}
+
+
+def _measure(router, enhancer, requests: int) -> dict:
+    from services.backend_router import BackendUnavailable
+
+    image = Image.new("RGB", (64, 64), (255, 255, 255))
+    latencies, outcomes = [], {"enhanced": 0, "failed": 0, "skipped": 0}
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            router.call("hf_enhance", enhancer.enhance, image, prompt="refine")
+            outcomes["enhanced"] += 1
+        except BackendUnavailable:
+            outcomes["skipped"] += 1
+        except Exception:
+            outcomes["failed"] += 1
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    summary = _summary(latencies)
+    summary["p95_ms"] = round(statistics.quantiles(latencies, n=20)[-1], 3) if len(latencies) > 1 else summary["max_ms"]
+    summary["total_s"] = round(sum(latencies) / 1000.0, 3)
+    return {**summary, **outcomes, "router": router.snapshot()}
+
+
+def run(requests: int, latency_ms: float, error_rate: float, slow_rate: float, slow_ms: float) -> dict:
+    server, url = start_fake_server(
+        FakeHFHandler, latency_ms=latency_ms, error_rate=error_rate, slow_rate=slow_rate, slow_ms=slow_ms, size=64
+    )
+    os.environ["HF_API_BASE"] = url
+    os.environ.setdefault("HF_API_KEY", "fake")
+    # Short enough that the breaker's half-open probes show up within one run
+    os.environ.setdefault("ROUTER_OPEN_SECONDS", "2")
+    os.environ.setdefault("ROUTER_HEDGE_MIN_SECONDS", "0.1")
+    from services.backend_router import BackendRouter
+    from services.hf_enhance_service import HFEnhanceService
+
+    results = {}
+    try:
+        for mode, env in MODES.items():
+            os.environ.update(env)
+            # A fresh router per mode so stats from the previous mode don't carry over
+            results[mode] = _measure(BackendRouter(), HFEnhanceService(), requests)
+    finally:
+        server.shutdown()
+    return {
+        "commit": _git_commit(),
+        "requests": requests,
+        "fake_server": {"latency_ms": latency_ms, "error_rate": error_rate, "slow_rate": slow_rate, "slow_ms": slow_ms},
+        "modes": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.5)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.latency_ms, args.error_rate, args.slow_rate, args.slow_ms), indent=2))
@@ -0,0 +1,81 @@
+"""
+Compare images/second of N variations of one sketch generated as N
+sequential requests versus one /generate/batch-style call (sketch prepared
+once, a single pipeline invocation). The result cache is disabled so every
+image is denoised.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch --pipeline stub --images 4 --steps 4
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_generate import build_stub_pipeline
+from benchmarks.bench_preprocess import synthetic_sketch
+
+
+async def run(images: int, steps: int, rounds: int) -> dict:
+    from models.batch_scheduler import BatchScheduler
+    from models.model_loader import ModelLoader
+
+    scheduler = BatchScheduler.instance()
+    loader = ModelLoader.instance()
+    loader.start_warmup(device="cpu", dummy_inference=False)
+    if not await asyncio.to_thread(loader.wait_until_ready):
+        raise RuntimeError(f"Model failed to load: {loader.error}")
+    prompt = "modern dashboard with sidebar navigation"
+    # Untimed pass so lazy initialisation doesn't land in either measurement
+    await scheduler.submit(synthetic_sketch(512, seed=999), prompt, 7.5, steps, 0)
+
+    sequential, batched = [], []
+    for r in range(rounds):
+        sketch = synthetic_sketch(512, seed=r)
+        seeds = [r * 1000 + i for i in range(images)]
+
+        start = time.perf_counter()
+        for seed in seeds:
+            await scheduler.submit(sketch, prompt, 7.5, steps, seed)
+        sequential.append(time.perf_counter() - start)
+
+        # Fresh seeds so nothing is served from a preprocessing or result cache hit on the first path
+        start = time.perf_counter()
+        results = await scheduler.submit_many(sketch, [prompt] * images, 7.5, steps, [s + 500 for s in seeds])
+        batched.append(time.perf_counter() - start)
+        failures = [res for res in results if isinstance(res, BaseException)]
+        if failures:
+            raise failures[0]
+
+    seq_ips = images * rounds / sum(sequential)
+    batch_ips = images * rounds / sum(batched)
+    return {
+        "images": images,
+        "steps": steps,
+        "rounds": rounds,
+        "sequential_images_per_second": round(seq_ips, 3),
+        "batched_images_per_second": round(batch_ips, 3),
+        "speedup": round(batch_ips / seq_ips, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=("stub", "real"), default="stub")
+    parser.add_argument("--images", type=int, default=4, help="Variations per sketch")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pipeline == "stub":
+        os.environ["MODEL_PATH"] = str(build_stub_pipeline(Path(tempfile.gettempdir()) / "designmate-stub-pipeline"))
+    os.environ["OUTPUT_PATH"] = tempfile.mkdtemp(prefix="designmate-bench-")
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["GENERATION_BACKEND"] = "local"
+    os.environ["INFERENCE_WORKERS"] = "0"
+    # Sequential requests must not be merged into batches by the scheduler
+    os.environ["INFERENCE_MAX_BATCH"] = "1"
+    print(json.dumps(asyncio.run(run(args.images, args.steps, args.rounds)), indent=2))
@@ -0,0 +1,254 @@
+"""
+Time each stage of the sketch -> image path separately: decode, resize, canny,
+denoise, VAE decode, HF enhance, encode and file save, plus the end-to-end
+generate_from_sketch call.
+
+Runs CPU-only and offline: --pipeline stub builds a tiny random-weight
+ControlNet pipeline (absolute numbers are meaningless, relative changes are
+not), --pipeline real loads MODEL_PATH. HF enhance always talks to the local
+fake server. Results are JSON tagged with the git commit so runs can be
+compared across commits.
+
+Usage (from backend/):
+    python -m benchmarks.bench_generate --pipeline stub --iterations 3 --output before.json
+    python -m benchmarks.bench_generate --pipeline stub --iterations 3 --compare before.json
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+
+from benchmarks.bench_preprocess import synthetic_sketch
+
+
+def _bytes_to_unicode() -> dict[int, str]:
+    # Same byte -> printable character table the CLIP BPE tokenizer uses
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + n)
+            n += 1
+    return dict(zip(bs, (chr(c) for c in cs)))
+
+
+def build_stub_pipeline(path: Path) -> Path:
+    """Save a tiny random-weight StableDiffusionControlNetPipeline to path (no downloads)."""
+    import torch
+    from diffusers import (
+        AutoencoderKL,
+        ControlNetModel,
+        DDIMScheduler,
+        StableDiffusionControlNetPipeline,
+        UNet2DConditionModel,
+    )
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    if (path / "model_index.json").exists():
+        return path
+    path.mkdir(parents=True, exist_ok=True)
+    torch.manual_seed(0)
+
+    # Character-level vocabulary: every byte alone and as a word ending, no merges
+    chars = list(_bytes_to_unicode().values())
+    vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for token in chars + [c + "</w>" for c in chars]:
+        vocab[token] = len(vocab)
+    tok_dir = path / "_tokenizer_src"
+    tok_dir.mkdir(exist_ok=True)
+    (tok_dir / "vocab.json").write_text(json.dumps(vocab), encoding="utf-8")
+    (tok_dir / "merges.txt").write_text("#version: 0.2\n", encoding="utf-8")
+    tokenizer = CLIPTokenizer(str(tok_dir / "vocab.json"), str(tok_dir / "merges.txt"), pad_token="<|endoftext|>")
+
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        bos_token_id=0, eos_token_id=1, pad_token_id=1, vocab_size=len(vocab),
+        hidden_size=32, intermediate_size=37, num_attention_heads=4, num_hidden_layers=2,
+        max_position_embeddings=tokenizer.model_max_length,
+    ))
+    blocks = dict(
+        block_out_channels=(8, 16),
+        layers_per_block=1,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        cross_attention_dim=32,
+        attention_head_dim=2,
+        norm_num_groups=4,
+    )
+    unet = UNet2DConditionModel(
+        sample_size=32, in_channels=4, out_channels=4, up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"), **blocks
+    )
+    controlnet = ControlNetModel(in_channels=4, conditioning_embedding_out_channels=(8, 16), **blocks)
+    vae = AutoencoderKL(
+        block_out_channels=(8, 16),
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+        latent_channels=4,
+        norm_num_groups=4,
+    )
+    scheduler = DDIMScheduler(
+        beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear", clip_sample=False, set_alpha_to_one=False
+    )
+    pipeline = StableDiffusionControlNetPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        unet=unet,
+        controlnet=controlnet,
+        scheduler=scheduler,
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipeline.save_pretrained(str(path))
+    return path
+
+
+def _summary(samples: list[float]) -> dict:
+    return {
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pipeline_kind: str, iterations: int, steps: int, sketch_size: int, hf_latency_ms: float) -> dict:
+    import torch
+
+    from models.inference import STYLE_SUFFIX, NEGATIVE_SUFFIX, generate_from_sketch
+    from models.model_loader import ModelLoader
+    from models.preprocess import SketchPreprocessor, decode_sketch, resize_sketch
+    from services.hf_enhance_service import HFEnhanceService
+    from utils.file_handler import encode_image, _write_atomic, OUTPUT_PATH, OUTPUT_FORMAT
+
+    pre = SketchPreprocessor.instance()
+    pipe = ModelLoader.instance().load(device="cpu")
+    enhancer = HFEnhanceService()
+
+    prompt = "modern dashboard with sidebar navigation"
+    stages = {name: [] for name in (
+        "decode", "resize", "canny", "denoise", "vae_decode", "hf_enhance", "encode", "save", "end_to_end"
+    )}
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        stages[name].append((time.perf_counter() - start) * 1000.0)
+        return value
+
+    # One untimed pass so lazy initialisation doesn't land in the first sample
+    generate_from_sketch(synthetic_sketch(sketch_size, seed=999), prompt, num_inference_steps=steps, seed=0)
+
+    for i in range(iterations):
+        data = synthetic_sketch(sketch_size, seed=i)
+        rgb = timed("decode", decode_sketch, data)
+        resized = timed("resize", resize_sketch, rgb, pre.resolution)
+        control = timed("canny", pre.detector, resized)
+
+        # Same call denoise_batch makes, stopped before the VAE so the two are timed apart
+        with torch.inference_mode():
+            latents = timed(
+                "denoise",
+                lambda: pipe(
+                    prompt=[f"{prompt}{STYLE_SUFFIX}"],
+                    negative_prompt=[NEGATIVE_SUFFIX],
+                    image=[control],
+                    guidance_scale=7.5,
+                    num_inference_steps=steps,
+                    generator=[torch.Generator().manual_seed(i)],
+                    output_type="latent",
+                ).images,
+            )
+            image = timed(
+                "vae_decode",
+                lambda: pipe.image_processor.postprocess(
+                    pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0],
+                    output_type="pil",
+                )[0],
+            )
+
+        image = timed("hf_enhance", enhancer.enhance, image, prompt=prompt)
+        encoded, ext = timed("encode", encode_image, image)
+        timed("save", _write_atomic, OUTPUT_PATH / f"bench_{i}{ext}", encoded)
+        timed("end_to_end", generate_from_sketch, data, prompt, num_inference_steps=steps, seed=i)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count(), "torch_threads": torch.get_num_threads()},
+        "pipeline": pipeline_kind,
+        "model_path": ModelLoader.instance().model_path,
+        "resolution": pre.resolution,
+        "sketch_size": sketch_size,
+        "steps": steps,
+        "iterations": iterations,
+        "hf_latency_ms": hf_latency_ms,
+        "output_format": OUTPUT_FORMAT,
+        "stages": {name: _summary(samples) for name, samples in stages.items()},
+    }
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Per-stage mean of current relative to baseline (0.8 = 20% faster)."""
+    ratios = {}
+    for name, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before and before["mean_ms"]:
+            ratios[name] = round(stats["mean_ms"] / before["mean_ms"], 3)
+    return {"baseline_commit": baseline.get("commit"), "commit": current.get("commit"), "mean_ratio": ratios}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=("stub", "real"), default="stub")
+    parser.add_argument("--stub-dir", default=str(Path(tempfile.gettempdir()) / "designmate-stub-pipeline"),
+                        help="Where the stub pipeline is built (reused between runs)")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--sketch-size", type=int, default=1024, help="Edge length of the synthetic input sketch")
+    parser.add_argument("--resolution", type=int, default=None, help="Override GENERATION_RESOLUTION")
+    parser.add_argument("--hf-latency-ms", type=float, default=200, help="Latency of the fake HF enhance server")
+    parser.add_argument("--output", help="Write the JSON result to this file as well as stdout")
+    parser.add_argument("--compare", help="A previous JSON result to report per-stage ratios against")
+    args = parser.parse_args()
+
+    # Everything below is configured through env before the app modules are imported
+    if args.pipeline == "stub":
+        os.environ["MODEL_PATH"] = str(build_stub_pipeline(Path(args.stub_dir)))
+    if args.resolution:
+        os.environ["GENERATION_RESOLUTION"] = str(args.resolution)
+    os.environ["OUTPUT_PATH"] = tempfile.mkdtemp(prefix="designmate-bench-")
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["GENERATION_BACKEND"] = "local"
+    from benchmarks.fake_servers import FakeHFHandler, start_fake_server
+
+    server, url = start_fake_server(FakeHFHandler, latency_ms=args.hf_latency_ms)
+    os.environ["HF_API_BASE"] = url
+    os.environ["HF_API_KEY"] = "fake"
+
+    result = run(args.pipeline, args.iterations, args.steps, args.sketch_size, args.hf_latency_ms)
+    server.shutdown()
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            result["comparison"] = compare(result, json.load(f))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
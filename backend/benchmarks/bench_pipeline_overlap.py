@@ -0,0 +1,99 @@
+"""
+Measure how close concurrent generations get to the denoise-only bound now
+that postprocessing (HF enhance, encode, save, variants) overlaps the next
+denoise. HF enhancement goes to the local fake HF server so it has a
+realistic cost; the result cache is disabled so every job is denoised.
+
+Reports images/second against two references built from the stage
+timings: the strictly sequential rate (denoise + postprocess per image)
+and the denoise-only bound.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline_overlap --pipeline stub --jobs 8 --steps 4 --enhance-ms 500
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_generate import build_stub_pipeline, _git_commit
+from benchmarks.bench_preprocess import synthetic_sketch
+from benchmarks.fake_servers import FakeHFHandler, start_fake_server
+
+DENOISE_STAGES = ("denoise", "vae_decode")
+POSTPROCESS_STAGES = ("hf_enhance", "encode", "save")
+
+
+def _stage_seconds(stages: tuple) -> float:
+    from utils.metrics import STAGE_SECONDS
+
+    return sum(STAGE_SECONDS.labels(stage).sum for stage in stages)
+
+
+async def run(jobs: int, steps: int) -> dict:
+    from models.batch_scheduler import BatchScheduler
+    from models.model_loader import ModelLoader
+
+    scheduler = BatchScheduler.instance()
+    loader = ModelLoader.instance()
+    loader.start_warmup(device="cpu", dummy_inference=False)
+    if not await asyncio.to_thread(loader.wait_until_ready):
+        raise RuntimeError(f"Model failed to load: {loader.error}")
+    prompt = "modern dashboard with sidebar navigation"
+    # Untimed pass so lazy initialisation doesn't land in the measurement
+    await scheduler.submit(synthetic_sketch(512, seed=999), prompt, 7.5, steps, 0)
+
+    denoise_before = _stage_seconds(DENOISE_STAGES)
+    post_before = _stage_seconds(POSTPROCESS_STAGES)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(scheduler.submit(synthetic_sketch(512, seed=i), prompt, 7.5, steps, i) for i in range(jobs)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        raise failures[0]
+
+    denoise = _stage_seconds(DENOISE_STAGES) - denoise_before
+    post = _stage_seconds(POSTPROCESS_STAGES) - post_before
+    return {
+        "commit": _git_commit(),
+        "jobs": jobs,
+        "steps": steps,
+        "postprocess_workers": scheduler.postprocess_workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "images_per_second": round(jobs / elapsed, 3),
+        "sequential_images_per_second": round(jobs / (denoise + post), 3),
+        "denoise_bound_images_per_second": round(jobs / denoise, 3),
+        "denoise_seconds_per_image": round(denoise / jobs, 3),
+        "postprocess_seconds_per_image": round(post / jobs, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=("stub", "real"), default="stub")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--enhance-ms", type=float, default=500, help="Latency of the fake HF enhance call")
+    args = parser.parse_args()
+
+    server, url = start_fake_server(FakeHFHandler, latency_ms=args.enhance_ms)
+    if args.pipeline == "stub":
+        os.environ["MODEL_PATH"] = str(build_stub_pipeline(Path(tempfile.gettempdir()) / "designmate-stub-pipeline"))
+    os.environ["OUTPUT_PATH"] = tempfile.mkdtemp(prefix="designmate-bench-")
+    os.environ["HF_API_BASE"] = url
+    os.environ.setdefault("HF_API_KEY", "fake")
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["GENERATION_BACKEND"] = "local"
+    os.environ["INFERENCE_WORKERS"] = "0"
+    # One image per pipeline call, so the overlap between requests is what's measured
+    os.environ["INFERENCE_MAX_BATCH"] = "1"
+    try:
+        print(json.dumps(asyncio.run(run(args.jobs, args.steps)), indent=2))
+    finally:
+        server.shutdown()
@@ -0,0 +1,76 @@
+"""
+Benchmark the sketch preprocessing stage (decode -> resize -> canny) on its own.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preprocess --size 2048 --iterations 20
+"""
+import io
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+from models.preprocess import SketchPreprocessor, decode_sketch, resize_sketch
+
+
+def synthetic_sketch(size: int, seed: int = 0) -> bytes:
+    """A white canvas with random dark boxes and lines, PNG encoded."""
+    rng = np.random.default_rng(seed)
+    canvas = np.full((size, size, 3), 255, dtype=np.uint8)
+    for _ in range(40):
+        x0, y0 = rng.integers(0, size - 2, size=2)
+        x1, y1 = x0 + rng.integers(2, size // 4), y0 + rng.integers(2, size // 4)
+        canvas[y0:y1, x0:x0 + 3] = 0
+        canvas[y0:y1, x1:x1 + 3] = 0
+        canvas[y0:y0 + 3, x0:x1] = 0
+        canvas[y1:y1 + 3, x0:x1] = 0
+    buf = io.BytesIO()
+    Image.fromarray(canvas).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _time_ms(fn, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": statistics.median(samples),
+        "max_ms": max(samples),
+    }
+
+
+def run(size: int, iterations: int) -> dict:
+    pre = SketchPreprocessor.instance()
+    data = synthetic_sketch(size)
+    rgb = decode_sketch(data)
+    resized = resize_sketch(rgb, pre.resolution)
+
+    # Distinct bytes per call so the cold path never hits the cache
+    variants = iter([synthetic_sketch(size, seed=i + 1) for i in range(iterations)])
+
+    return {
+        "input_size": size,
+        "resolution": pre.resolution,
+        "iterations": iterations,
+        "stages": {
+            "decode": _time_ms(lambda: decode_sketch(data), iterations),
+            "resize": _time_ms(lambda: resize_sketch(rgb, pre.resolution), iterations),
+            "canny": _time_ms(lambda: pre.detector(resized), iterations),
+            "prepare_cold": _time_ms(lambda: pre.prepare(next(variants)), iterations),
+            "prepare_cached": _time_ms(lambda: pre.prepare(data), iterations),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024, help="Input sketch edge length in pixels")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.iterations), indent=2))
@@ -0,0 +1,81 @@
+"""
+Measure what the prompt embedding cache saves on CPU: the CLIP encode of the
+conditioned prompt and negative suffix on their own, and denoise_batch with
+a cold versus a warm PromptEmbeddingCache for the same prompt.
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompt_embeddings --pipeline stub --iterations 5
+    python -m benchmarks.bench_prompt_embeddings --pipeline real --steps 4
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_generate import build_stub_pipeline, _summary, _git_commit
+from benchmarks.bench_preprocess import synthetic_sketch
+
+
+def run(iterations: int, steps: int) -> dict:
+    import torch
+
+    from models.inference import STYLE_SUFFIX, NEGATIVE_SUFFIX, denoise_batch
+    from models.model_loader import ModelLoader
+    from models.preprocess import SketchPreprocessor
+    from models.prompt_embeddings import PromptEmbeddingCache
+
+    pipe = ModelLoader.instance().load(device="cpu")
+    control = SketchPreprocessor.instance().prepare(synthetic_sketch(512)).control
+    cache = PromptEmbeddingCache.instance()
+    samples = {"text_encode": [], "denoise_cold": [], "denoise_warm": []}
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        samples[name].append((time.perf_counter() - start) * 1000.0)
+        return value
+
+    # One untimed pass so lazy initialisation doesn't land in the first sample
+    denoise_batch([control], ["warm up"], num_inference_steps=steps, seeds=[0])
+
+    for i in range(iterations):
+        prompt = f"modern dashboard with sidebar navigation, variant {i}"
+        with torch.no_grad():
+            timed(
+                "text_encode",
+                lambda: [
+                    pipe.encode_prompt(text, pipe.device, num_images_per_prompt=1, do_classifier_free_guidance=False)
+                    for text in (f"{prompt}{STYLE_SUFFIX}", NEGATIVE_SUFFIX)
+                ],
+            )
+        # Cold: nothing cached for this text encoder, both prompts go through CLIP
+        cache.clear()
+        timed("denoise_cold", denoise_batch, [control], [prompt], num_inference_steps=steps, seeds=[i])
+        timed("denoise_warm", denoise_batch, [control], [prompt], num_inference_steps=steps, seeds=[i])
+
+    stages = {name: _summary(values) for name, values in samples.items()}
+    return {
+        "commit": _git_commit(),
+        "model_path": ModelLoader.instance().model_path,
+        "steps": steps,
+        "iterations": iterations,
+        "torch_threads": torch.get_num_threads(),
+        "stages": stages,
+        "saved_ms_per_call": round(stages["denoise_cold"]["mean_ms"] - stages["denoise_warm"]["mean_ms"], 3),
+        "cache": cache.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=("stub", "real"), default="stub")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.pipeline == "stub":
+        os.environ["MODEL_PATH"] = str(build_stub_pipeline(Path(tempfile.gettempdir()) / "designmate-stub-pipeline"))
+    os.environ["OUTPUT_PATH"] = tempfile.mkdtemp(prefix="designmate-bench-")
+    print(json.dumps(run(args.iterations, args.steps), indent=2))
@@ -0,0 +1,79 @@
+"""
+Measure generation throughput (images/minute) of the inference worker pool
+as the number of worker processes changes. Model load and warm-up are
+excluded; the result cache is disabled so every job runs the pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_worker_pool --workers 1,2,4 --jobs 8 --steps 4 --stub
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_generate import build_stub_pipeline
+from benchmarks.bench_preprocess import synthetic_sketch
+
+
+async def _throughput(workers: int, jobs: int, steps: int, total_threads: int) -> dict:
+    os.environ["INFERENCE_WORKERS"] = str(workers)
+    os.environ["INFERENCE_TOTAL_THREADS"] = str(total_threads)
+    from models.worker_pool import InferenceWorkerPool
+
+    # A fresh pool per configuration; the singleton is left untouched
+    pool = InferenceWorkerPool()
+    load_start = time.perf_counter()
+    pool.start_warmup()
+    while pool.readiness()["workers_ready"] < workers:
+        if pool.status == "failed":
+            raise RuntimeError(f"Worker pool failed to start: {pool.error}")
+        await asyncio.sleep(0.2)
+    load_seconds = time.perf_counter() - load_start
+
+    sketch = synthetic_sketch(512)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        pool.run_batch([sketch], [f"modern living room, variant {i}"], 7.5, steps, [i], job_ids=[None])
+        for i in range(jobs)
+    ))
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+
+    failures = [r[0] for r in results if isinstance(r[0], Exception)]
+    return {
+        "workers": workers,
+        "threads_per_worker": pool.threads_per_worker,
+        "jobs": jobs,
+        "failures": len(failures),
+        "first_error": str(failures[0]) if failures else None,
+        "load_seconds": round(load_seconds, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "images_per_minute": round((jobs - len(failures)) * 60.0 / elapsed, 2),
+    }
+
+
+async def run(worker_counts: list[int], jobs: int, steps: int, total_threads: int) -> dict:
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    runs = []
+    for workers in worker_counts:
+        runs.append(await _throughput(workers, jobs, steps, total_threads))
+    return {"steps": steps, "total_threads": total_threads, "runs": runs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--jobs", type=int, default=8, help="Images generated per configuration")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--total-threads", type=int, default=os.cpu_count() or 1,
+                        help="Cores shared between the workers of each configuration")
+    parser.add_argument("--stub", action="store_true", help="Use the tiny random-weight pipeline instead of MODEL_PATH")
+    args = parser.parse_args()
+    if args.stub:
+        # Workers inherit the environment, so they all load the same stub
+        os.environ["MODEL_PATH"] = str(build_stub_pipeline(Path(tempfile.gettempdir()) / "designmate-stub-pipeline"))
+    counts = [int(n) for n in args.workers.split(",") if n.strip()]
+    print(json.dumps(asyncio.run(run(counts, args.jobs, args.steps, args.total_threads)), indent=2))
@@ -0,0 +1,147 @@
+"""
+Local stand-ins for the external APIs, for benchmarks and manual testing without network.
+
+Usage (from backend/):
+    python -m benchmarks.fake_servers gemini --port 8001 --first-chunk-ms 300 --chunk-ms 80
+    GEMINI_API_BASE=http://127.0.0.1:8001/v1beta GEMINI_API_KEY=fake uvicorn main:app
+
+    python -m benchmarks.fake_servers hf --port 8002 --latency-ms 500
+    python -m benchmarks.fake_servers hf --port 8002 --error-rate 0.3 --slow-rate 0.1 --slow-ms 8000
+    HF_API_BASE=http://127.0.0.1:8002 HF_API_KEY=fake uvicorn main:app
+"""
+import io
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Per-server settings, filled in by start_fake_server()
+    config: dict = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("content-length", 0)))
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeGeminiHandler(_FakeHandler):
+    """Answers generateContent with JSON and streamGenerateContent with SSE chunks."""
+
+    def _chunks(self) -> list[str]:
+        words = self.config.get("answer", "This is a fake Gemini answer used for local testing.").split(" ")
+        size = max(1, len(words) // self.config.get("chunks", 8))
+        return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+    def do_POST(self):
+        self._read_body()
+        first_delay = self.config.get("first_chunk_ms", 300) / 1000.0
+        chunk_delay = self.config.get("chunk_ms", 80) / 1000.0
+        chunks = self._chunks()
+
+        if ":streamGenerateContent" not in self.path:
+            # Non-streaming: the whole answer arrives after every chunk would have been produced
+            time.sleep(first_delay + chunk_delay * (len(chunks) - 1))
+            body = {"candidates": [{"content": {"parts": [{"text": "".join(chunks)}]}, "finishReason": "STOP"}]}
+            self._send(200, json.dumps(body).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_delay)
+        for idx, text in enumerate(chunks):
+            if idx:
+                time.sleep(chunk_delay)
+            candidate = {"content": {"parts": [{"text": text}]}}
+            if idx == len(chunks) - 1:
+                candidate["finishReason"] = "STOP"
+            event = f"data: {json.dumps({'candidates': [candidate]})}\r\n\r\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeHFHandler(_FakeHandler):
+    """
+    Answers any /models/<id> inference call with a PNG image after a fixed latency.
+    error_rate of calls fail with a 503 (like a model that is loading) and slow_rate
+    of calls take slow_ms instead, to exercise the backend router.
+    """
+
+    _png: bytes | None = None
+
+    @classmethod
+    def _image(cls, size: int) -> bytes:
+        if cls._png is None:
+            buf = io.BytesIO()
+            Image.new("RGB", (size, size), (180, 200, 220)).save(buf, format="PNG")
+            cls._png = buf.getvalue()
+        return cls._png
+
+    def do_POST(self):
+        self._read_body()
+        slow = random.random() < self.config.get("slow_rate", 0.0)
+        time.sleep(self.config.get("slow_ms" if slow else "latency_ms", 500) / 1000.0)
+        if random.random() < self.config.get("error_rate", 0.0):
+            body = {"error": "Model is currently loading", "estimated_time": 20.0}
+            self._send(503, json.dumps(body).encode(), "application/json")
+            return
+        self._send(200, self._image(self.config.get("size", 512)), "image/png")
+
+
+def start_fake_server(handler_cls, port: int = 0, **config) -> tuple[ThreadingHTTPServer, str]:
+    """Serve handler_cls on a background thread; returns (server, base_url)."""
+    handler = type(handler_cls.__name__, (handler_cls,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="fake-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+HANDLERS = {
+    "gemini": FakeGeminiHandler,
+    "hf": FakeHFHandler,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("service", choices=sorted(HANDLERS))
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-chunk-ms", type=float, default=300)
+    parser.add_argument("--chunk-ms", type=float, default=80)
+    parser.add_argument("--latency-ms", type=float, default=500, help="hf: time before the image is returned")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="hf: fraction of calls answered with a 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="hf: fraction of calls that take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    args = parser.parse_args()
+    server, url = start_fake_server(
+        HANDLERS[args.service],
+        port=args.port,
+        first_chunk_ms=args.first_chunk_ms,
+        chunk_ms=args.chunk_ms,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+    )
+    print(f"Fake {args.service} server listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
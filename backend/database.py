@@ -1,14 +1,57 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey, Index, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
 # Database URL from environment - fallback to SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sketch2design.db")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_url(url: str) -> str:
+    """Map plain URLs onto the async drivers (aiosqlite / asyncpg); explicit drivers are kept."""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+IS_SQLITE = ASYNC_DATABASE_URL.startswith("sqlite")
+
+if IS_SQLITE:
+    # One file, one writer: pooling knobs don't apply, the pragmas below matter more
+    engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"timeout": 30})
+else:
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Recycle before typical server/proxy idle timeouts; pre-ping catches the rest
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() in {"1", "true", "yes"},
+    )
+
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _record):
+        # WAL lets readers proceed while a write is in progress; NORMAL sync is
+        # durable across application crashes and much cheaper than FULL
+        cursor = dbapi_connection.cursor()
+        if ":memory:" not in ASYNC_DATABASE_URL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+# expire_on_commit=False: rows stay readable after commit without another round trip
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class User(Base):
@@ -22,12 +65,51 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+class Generation(Base):
+    __tablename__ = "generations"
+    # History pages walk this index newest-first with a (created_at, id) cursor
+    __table_args__ = (Index("ix_generations_user_created", "user_id", "created_at", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    prompt = Column(Text, nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+    image_path = Column(String, nullable=False)
+    thumbnail_path = Column(String, nullable=True)
+    cached = Column(Boolean, default=False)
+    total_seconds = Column(Float, nullable=True)
+    # Bytes of the output file, summed for the per-user storage quota
+    size_bytes = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# Nullable columns added to a table after it first shipped. create_all() only creates
+# missing tables, so init_db() adds these to databases created before them.
+ADDED_COLUMNS = {
+    "generations": ["size_bytes"],
+}
+
+def _add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in column_names:
+            if name in existing:
+                continue
+            column_type = table.c[name].type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}")
+
+async def init_db():
+    """Create missing tables and columns; run once at startup (or via setup_db.py), not at import."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+
+async def close_db():
+    await engine.dispose()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -2,9 +2,10 @@ import os
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
-from starlette.middleware.base import BaseHTTPMiddleware
+from utils.static_files import OutputStaticFiles
+from utils.upload_limit import UploadLimitMiddleware
 
 # Load environment variables from backend/.env (preferred),
 # fallback to process env and optionally .env.example for local dev.
@@ -23,21 +24,8 @@ else:
         load_dotenv(example_env_path)
 
 app = FastAPI(title="DesignMate API")
-# Add cache control for latest image to avoid stale preview
-class NoStoreLatestMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        try:
-            path = request.url.path
-            if path.endswith("/static/outputs/latest.png") or path.endswith("static/outputs/latest.png"):
-                response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-                response.headers["Pragma"] = "no-cache"
-                response.headers["Expires"] = "0"
-        except Exception:
-            pass
-        return response
-
-app.add_middleware(NoStoreLatestMiddleware)
+# Oversized multipart bodies are refused before the form parser spools them
+app.add_middleware(UploadLimitMiddleware)
 
 # Frontend dist path resolution with environment override
 # FRONTEND_DIST can be absolute or relative to project root
@@ -57,10 +45,11 @@ else:
     # The root route will still guard for index.html existence
     pass
 
-# Serve backend static files (generated outputs) from backend/static
+# Serve backend static files (generated outputs) from backend/static.
+# Content-hashed outputs are cached as immutable, latest.* is revalidated; ?variant=thumb|medium|webp serves a smaller copy.
 backend_static_dir = os.path.join(BASE_DIR, "static")
 if os.path.isdir(backend_static_dir):
-    app.mount("/static", StaticFiles(directory=backend_static_dir), name="static")
+    app.mount("/static", OutputStaticFiles(directory=backend_static_dir), name="static")
 
 @app.get("/")
 async def serve_root():
@@ -101,24 +90,13 @@ else:
         **cors_kwargs,
     )
 
-# SPA fallback: serve frontend index.html for non-API GET routes like /workspace
-@app.get("/{full_path:path}")
-async def spa_fallback(full_path: str):
-    # Don't intercept API/static routes
-    blocked_prefixes = (
-        "upload/", "generate/", "recommend/",
-        "assistant/", "ai-assistant/", "static/", "assets/", "health"
-    )
-    if any(full_path.startswith(p) for p in blocked_prefixes):
-        raise HTTPException(status_code=404, detail="Not Found")
-    index_path = os.path.join(frontend_dist_path, "index.html")
-    if not os.path.isfile(index_path):
-        raise HTTPException(status_code=404, detail="Frontend not built. Run 'npm run build' in frontend.")
-    return FileResponse(index_path)
-
-from routes import generate, recommend, upload as upload_router, assistant, auth
+from routes import generate, recommend, upload as upload_router, assistant, auth, history
 from utils.logger import get_logger
-from models.model_loader import ModelLoader
+from models.batch_scheduler import BatchScheduler
+from services.http_client import HttpClient
+from database import init_db, close_db
+from utils.metrics import REGISTRY
+from utils.storage import StorageManager
 
 logger = get_logger()
 
@@ -126,16 +104,55 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(upload_router.router, prefix="/upload", tags=["upload"])
 app.include_router(generate.router, prefix="/generate", tags=["generate"])
 app.include_router(recommend.router, prefix="/recommend", tags=["recommend"])
-# History router removed per requirement
+app.include_router(history.router, prefix="/history", tags=["history"])
 app.include_router(assistant.router, prefix="/assistant", tags=["assistant"])
 app.include_router(assistant.router, prefix="/ai-assistant", tags=["ai-assistant"])
 
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Starting up: loading model into memory...")
-    ModelLoader.instance().load()
-    logger.info("Model loaded successfully.")
+    # Load weights on a background thread so the server binds immediately;
+    # /ready reports progress and /generate answers 503 until it finishes.
+    await init_db()
+    logger.info("Starting up: warming model in the background...")
+    # With INFERENCE_WORKERS > 0 each worker process loads its own copy instead
+    BatchScheduler.instance().backend().start_warmup()
+    # Periodic retention/quota sweep of OUTPUT_PATH (no-op unless a limit is configured)
+    StorageManager.instance().start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close pooled upstream connections cleanly
+    await HttpClient.instance().aclose()
+    BatchScheduler.instance().pool.shutdown()
+    await StorageManager.instance().stop()
+    await close_db()
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    readiness = BatchScheduler.instance().backend().readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# SPA fallback: serve frontend index.html for non-API GET routes like /workspace
+# Registered last so it never shadows API routes such as /health and /ready
+@app.get("/{full_path:path}")
+async def spa_fallback(full_path: str):
+    # Don't intercept API/static routes
+    blocked_prefixes = (
+        "upload/", "generate/", "recommend/", "history",
+        "assistant/", "ai-assistant/", "static/", "assets/", "health", "ready", "metrics"
+    )
+    if any(full_path.startswith(p) for p in blocked_prefixes):
+        raise HTTPException(status_code=404, detail="Not Found")
+    index_path = os.path.join(frontend_dist_path, "index.html")
+    if not os.path.isfile(index_path):
+        raise HTTPException(status_code=404, detail="Frontend not built. Run 'npm run build' in frontend.")
+    return FileResponse(index_path)
@@ -0,0 +1,453 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from models.model_loader import ModelLoader
+from models.worker_pool import InferenceWorkerPool
+from models.preprocess import PreparedSketch, SketchPreprocessor, sketch_digest
+from models.progress import ProgressTracker, GenerationCancelled
+from utils.metrics import REGISTRY, STAGE_SECONDS
+from utils.singleflight import SingleFlight
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when the inference queue is full; callers should retry later."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelNotReady(SchedulerBusy):
+    """Raised while the pipeline is still warming up (or failed to load)."""
+
+
+BATCH_SIZE = REGISTRY.histogram(
+    "designmate_inference_batch_size", "Jobs per pipeline call.", buckets=(1, 2, 4, 8, 16, 32)
+)
+REGISTRY.gauge(
+    "designmate_inference_queue_depth", "Generations waiting for a pipeline slot.",
+    fn=lambda: BatchScheduler.instance().depth(),
+)
+REGISTRY.gauge(
+    "designmate_inference_in_flight", "Generations currently running in the pipeline.",
+    fn=lambda: BatchScheduler.instance().in_flight(),
+)
+REGISTRY.gauge(
+    "designmate_postprocess_queue_depth", "Denoised images waiting for enhancement, encoding and saving.",
+    fn=lambda: BatchScheduler.instance().postprocess_depth(),
+)
+REGISTRY.gauge(
+    "designmate_model_load_seconds", "Time taken to load the diffusion pipeline.",
+    fn=lambda: BatchScheduler.instance().backend().readiness()["load_seconds"],
+)
+REGISTRY.gauge(
+    "designmate_model_ready", "1 once the pipeline is loaded and warmed up.",
+    fn=lambda: int(BatchScheduler.instance().backend().is_ready()),
+)
+
+
+@dataclass
+class _Job:
+    key: tuple
+    sketch: PreparedSketch
+    prompt: str
+    seed: int | None
+    job_id: str | None
+    future: asyncio.Future = field(repr=False)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # Jobs of one submit_many() call share a group and always run as one pipeline call
+    group: int | None = None
+    group_size: int = 1
+
+
+# Singleton scheduler that owns all access to the diffusion pipeline
+class BatchScheduler:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.max_queue = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+        self.max_batch = max(1, int(os.getenv("INFERENCE_MAX_BATCH", "4")))
+        self.batch_window = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "50")) / 1000.0
+        # During warm-up either hold requests in the queue or turn them away with 503
+        self.queue_during_warmup = os.getenv("QUEUE_DURING_WARMUP", "false").lower() in {"1", "true", "yes"}
+        self.warmup_retry_after = int(os.getenv("WARMUP_RETRY_AFTER", "10"))
+        # Longest a queued batch waits for the model before its jobs are answered with 503
+        self.warmup_wait_timeout = float(os.getenv("WARMUP_WAIT_TIMEOUT", "600"))
+        self._queue: asyncio.Queue | None = None
+        # Jobs pulled off the queue while batching but incompatible with that batch
+        self._carry: list[_Job] = []
+        # Admitted jobs still being preprocessed; they hold their queue slot from admission
+        self._reserved = 0
+        self._dispatcher: asyncio.Task | None = None
+        self._in_flight = 0
+        # A single worker thread: the pipeline is not safe to call concurrently,
+        # and running it off the event loop keeps the HTTP layer responsive.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        # Enhancement, encoding and saving of finished images run on their own threads, fed by a
+        # bounded queue, so the next batch can denoise meanwhile. When the queue is full the
+        # denoise slot is held until there is room, which keeps slow postprocessing from piling up.
+        self.postprocess_workers = max(1, int(os.getenv("POSTPROCESS_WORKERS", "2")))
+        self.postprocess_queue_size = max(1, int(os.getenv("POSTPROCESS_QUEUE_SIZE", "8")))
+        self._post_executor = ThreadPoolExecutor(max_workers=self.postprocess_workers, thread_name_prefix="postprocess")
+        self._post_queue: asyncio.Queue | None = None
+        self._post_tasks: list[asyncio.Task] = []
+        # With INFERENCE_WORKERS > 0 batches go to worker processes instead, one per worker
+        self.pool = InferenceWorkerPool.instance()
+        self._slots: asyncio.Semaphore | None = None
+        self._groups = itertools.count()
+        # Coalesces identical in-flight submit() calls, keyed by the result cache key
+        self._inflight = SingleFlight("generation")
+        # job_id -> the task through which that request waits on a (possibly shared) generation
+        self._waiters: dict[str, asyncio.Task] = {}
+        self._detached: set[str] = set()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def depth(self) -> int:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._carry) + self._reserved
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def postprocess_depth(self) -> int:
+        return self._post_queue.qsize() if self._post_queue is not None else 0
+
+    def backend(self):
+        """The component that loads and runs the pipeline: the worker pool or the in-process loader."""
+        return self.pool if self.pool.enabled else ModelLoader.instance()
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.pool.size if self.pool.enabled else 1)
+            self._post_queue = asyncio.Queue(maxsize=self.postprocess_queue_size)
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._run())
+        # Worker processes postprocess their own batches; these threads serve the in-process pipeline
+        if not self.pool.enabled:
+            self._post_tasks = [task for task in self._post_tasks if not task.done()]
+            while len(self._post_tasks) < self.postprocess_workers:
+                self._post_tasks.append(loop.create_task(self._postprocess()))
+
+    async def submit(
+            self,
+            sketch_bytes: bytes,
+            prompt: str,
+            guidance: float = 7.5,
+            num_inference_steps: int = 30,
+            seed: int | None = None,
+            job_id: str | None = None,
+            sampler: str = "default"
+    ) -> dict:
+        """
+        Queue a generation and wait for its result without blocking the event loop.
+
+        Identical requests already in flight (double-clicks, client retries) share
+        one computation instead of each running a full denoise.
+        """
+        from models.inference import result_cache_key, cached_result
+
+        # Cache hits are answered directly and never occupy a queue slot
+        digest = sketch_digest(sketch_bytes)
+        cache_key = result_cache_key(digest, prompt, guidance, num_inference_steps, seed, sampler)
+        hit = cached_result(cache_key)
+        if hit is not None:
+            return hit
+        waiter = asyncio.ensure_future(self._inflight.do(
+            cache_key,
+            lambda: self._enqueue(sketch_bytes, digest, prompt, guidance, num_inference_steps, seed, job_id, sampler),
+            # Only once every waiting request has gone: stop the denoise loop as well
+            on_abandon=lambda: ProgressTracker.instance().cancel(job_id),
+        ))
+        if job_id is None:
+            return await waiter
+        self._waiters[job_id] = waiter
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if job_id in self._detached:
+                raise GenerationCancelled("Generation cancelled")
+            raise
+        finally:
+            self._waiters.pop(job_id, None)
+            self._detached.discard(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel on behalf of one request. A request waiting on a generation shared
+        with identical requests is only detached; the generation itself stops
+        once no request is waiting for it. Other jobs are flagged in the tracker.
+        """
+        waiter = self._waiters.get(job_id)
+        if waiter is None:
+            return ProgressTracker.instance().cancel(job_id)
+        if waiter.done():
+            return False
+        self._detached.add(job_id)
+        waiter.cancel()
+        return True
+
+    async def _enqueue(
+            self,
+            sketch_bytes: bytes,
+            digest: str,
+            prompt: str,
+            guidance: float,
+            num_inference_steps: int,
+            seed: int | None,
+            job_id: str | None,
+            sampler: str
+    ) -> dict:
+        from models.inference import GENERATION_RESOLUTION
+
+        self._admit(1)
+        try:
+            # Decode + canny run on the preprocessing pool, overlapping the current denoise
+            sketch = await SketchPreprocessor.instance().prepare_async(sketch_bytes, digest)
+        finally:
+            self._reserved -= 1
+
+        # Requests sharing resolution, steps, guidance and sampler can run in one pipeline call
+        key = (GENERATION_RESOLUTION, int(num_inference_steps), float(guidance), sampler)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Job(key=key, sketch=sketch, prompt=prompt, seed=seed, job_id=job_id, future=future))
+        return await future
+
+    async def submit_many(
+            self,
+            sketch_bytes: bytes,
+            prompts: list[str],
+            guidance: float = 7.5,
+            num_inference_steps: int = 30,
+            seeds: list[int | None] | None = None,
+            job_ids: list[str | None] | None = None,
+            sampler: str = "default"
+    ) -> list[dict | Exception]:
+        """
+        Generate several variations of one sketch in a single pipeline call.
+
+        The sketch is hashed, decoded and edge-detected once and every item
+        shares it. Items are independent: a failure is returned in its slot.
+        """
+        from models.inference import GENERATION_RESOLUTION, result_cache_key, cached_result
+
+        seeds = seeds or [None] * len(prompts)
+        job_ids = job_ids or [None] * len(prompts)
+        digest = sketch_digest(sketch_bytes)
+        results: list[dict | Exception | None] = [None] * len(prompts)
+        misses = []
+        for idx, (prompt, seed) in enumerate(zip(prompts, seeds)):
+            hit = cached_result(result_cache_key(digest, prompt, guidance, num_inference_steps, seed, sampler))
+            if hit is not None:
+                results[idx] = hit
+            else:
+                misses.append(idx)
+        if not misses:
+            return results
+
+        self._admit(len(misses))
+        try:
+            sketch = await SketchPreprocessor.instance().prepare_async(sketch_bytes, digest)
+        finally:
+            self._reserved -= len(misses)
+
+        key = (GENERATION_RESOLUTION, int(num_inference_steps), float(guidance), sampler)
+        group = next(self._groups)
+        loop = asyncio.get_running_loop()
+        futures = []
+        # No await in between, so the group sits contiguously in the queue
+        for idx in misses:
+            future = loop.create_future()
+            futures.append(future)
+            self._queue.put_nowait(_Job(
+                key=key, sketch=sketch, prompt=prompts[idx], seed=seeds[idx], job_id=job_ids[idx],
+                future=future, group=group, group_size=len(misses),
+            ))
+        for idx, result in zip(misses, await asyncio.gather(*futures, return_exceptions=True)):
+            results[idx] = result
+        return results
+
+    def _admit(self, count: int):
+        """
+        Reserve count queue slots or raise. The reservation is taken before the
+        caller awaits preprocessing, so concurrent requests can't all pass the
+        depth check first; callers release it once the jobs are queued.
+        """
+        loader = self.backend()
+        if not loader.is_ready():
+            # Covers callers that never ran the app's startup hook
+            loader.start_warmup()
+            if loader.status == "failed":
+                raise ModelNotReady(f"Model failed to load: {loader.error}", self.warmup_retry_after)
+            if not self.queue_during_warmup:
+                raise ModelNotReady("Model is warming up, please retry shortly", self.warmup_retry_after)
+
+        self._ensure_started()
+        if self.depth() + count > self.max_queue:
+            raise SchedulerBusy("Inference queue is full, please retry shortly")
+        self._reserved += count
+
+    def _take_group(self, first: _Job) -> list[_Job]:
+        # Group members are queued back to back, so they are all available without waiting
+        batch = [first]
+        for job in list(self._carry):
+            if job.group == first.group:
+                self._carry.remove(job)
+                batch.append(job)
+        while len(batch) < first.group_size and not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job.group == first.group:
+                batch.append(job)
+            else:
+                self._carry.append(job)
+        return batch
+
+    async def _next_batch(self) -> list[_Job]:
+        loop = asyncio.get_running_loop()
+        first = self._carry.pop(0) if self._carry else await self._queue.get()
+        if first.group is not None:
+            # A /generate/batch request is one pipeline call, whatever INFERENCE_MAX_BATCH says
+            return self._live(self._take_group(first))
+        batch = [first]
+
+        # Earlier leftovers that match go first to preserve arrival order
+        for job in list(self._carry):
+            if len(batch) >= self.max_batch:
+                break
+            if job.key == first.key and job.group is None:
+                self._carry.remove(job)
+                batch.append(job)
+
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                job = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if job.key == first.key and job.group is None:
+                batch.append(job)
+            else:
+                self._carry.append(job)
+        return self._live(batch)
+
+    @staticmethod
+    def _live(batch: list[_Job]) -> list[_Job]:
+        # Drop jobs whose callers went away or cancelled while they were waiting
+        tracker = ProgressTracker.instance()
+        live = []
+        for job in batch:
+            if job.future.done():
+                continue
+            if tracker.is_cancelled(job.job_id):
+                job.future.set_exception(GenerationCancelled("Generation cancelled"))
+                continue
+            live.append(job)
+        return live
+
+    async def _run(self):
+        while True:
+            # Collect the next batch only once a worker is free, so jobs keep accumulating meanwhile
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            asyncio.get_running_loop().create_task(self._execute(batch))
+
+    async def _execute(self, batch: list[_Job]):
+        from models.inference import DenoisedImage, denoise_stage
+
+        loop = asyncio.get_running_loop()
+        backend = self.backend()
+        _, steps, guidance, sampler = batch[0].key
+        args = (
+            [job.sketch for job in batch],
+            [job.prompt for job in batch],
+            guidance,
+            steps,
+            [job.seed for job in batch],
+        )
+        job_ids = [job.job_id for job in batch]
+        started = time.perf_counter()
+        queue_wait = STAGE_SECONDS.labels("queue_wait")
+        for job in batch:
+            queue_wait.observe(started - job.enqueued_at)
+        BATCH_SIZE.observe(len(batch))
+        self._in_flight += len(batch)
+        denoising = True
+
+        def denoised():
+            # The pipeline is free again: let the dispatcher start the next batch
+            nonlocal denoising
+            if denoising:
+                denoising = False
+                self._in_flight -= len(batch)
+                self._slots.release()
+
+        try:
+            # Jobs queued during warm-up wait here, off the event loop
+            if not await loop.run_in_executor(None, backend.wait_until_ready, self.warmup_wait_timeout):
+                if backend.status == "failed":
+                    raise ModelNotReady(f"Model failed to load: {backend.error}", self.warmup_retry_after)
+                raise ModelNotReady("Model is still warming up, please retry shortly", self.warmup_retry_after)
+            if self.pool.enabled:
+                # Results arrive postprocessed; the worker reports when its denoise is done
+                results = await self.pool.run_batch(*args, job_ids=job_ids, sampler=sampler, on_denoised=denoised)
+            else:
+                results = await loop.run_in_executor(
+                    self._executor, denoise_stage, *args, job_ids, sampler
+                )
+            for job, result in zip(batch, results):
+                if isinstance(result, DenoisedImage):
+                    # Waits while the postprocess queue is full, still holding the pipeline slot
+                    await self._post_queue.put((job, result, time.perf_counter()))
+                else:
+                    self._deliver(job, result)
+        except Exception as e:
+            for job in batch:
+                self._deliver(job, e)
+        finally:
+            denoised()
+
+    async def _postprocess(self):
+        from models.inference import postprocess_stage
+
+        loop = asyncio.get_running_loop()
+        postprocess_wait = STAGE_SECONDS.labels("postprocess_wait")
+        while True:
+            job, item, queued_at = await self._post_queue.get()
+            postprocess_wait.observe(time.perf_counter() - queued_at)
+            try:
+                result = await loop.run_in_executor(self._post_executor, postprocess_stage, item)
+            except Exception as e:
+                result = e
+            self._deliver(job, result)
+
+    @staticmethod
+    def _deliver(job: _Job, result):
+        if job.future.done():
+            return
+        if isinstance(result, Exception):
+            job.future.set_exception(result)
+        else:
+            job.future.set_result(result)
@@ -1,104 +1,273 @@
 import io
 import base64
+import hashlib
+from dataclasses import dataclass
 from PIL import Image
-import torch
 from models.model_loader import ModelLoader
-from utils.file_handler import save_image_to_outputs, save_image_and_latest
+from utils.file_handler import publish_image, publish_latest, mime_for_path, ensure_variant, web_path, VARIANTS, VARIANTS_ON_SAVE
 import os
 from services.hf_enhance_service import HFEnhanceService
-from controlnet_aux import CannyDetector
-from PIL import Image as PILImage
 from services.hf_generate_service import HFGenerateService
+from services.backend_router import BackendRouter, BackendUnavailable
+from utils.result_cache import ResultCache
+from models.preprocess import PreparedSketch, SketchPreprocessor, sketch_digest
+from models.progress import ProgressTracker, GenerationCancelled
+from models.prompt_embeddings import PromptEmbeddingCache
+from utils.metrics import STAGE_SECONDS
+from utils.logger import get_logger
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+logger = get_logger(__name__)
+
+# Every sketch is normalized to this square resolution before conditioning
+GENERATION_RESOLUTION = SketchPreprocessor.instance().resolution
+
+# Strengthen conditioning for higher quality UI/3D outputs
+STYLE_SUFFIX = (
+    ", clean layout, consistent spacing, modern typography, high contrast,"
+    " photorealistic 3D product render, studio lighting, detailed materials"
+)
+NEGATIVE_SUFFIX = ", cartoon, distorted, low quality, text overlay, fake texture"
+
+# Emit a low-res latent preview with progress events every N steps (0 = off)
+PROGRESS_PREVIEW_EVERY = int(os.getenv("PROGRESS_PREVIEW_EVERY", "0"))
+# Linear approximation of the SD 1.x VAE decoder (latent channels -> RGB);
+# good enough for a thumbnail-sized preview at a tiny fraction of a VAE decode.
+_LATENT_RGB_FACTORS = [
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+]
 
-# Initialize pipeline via singleton loader on the best available device
-pipe = ModelLoader.instance().load(device=device)
 
 def pil_image_from_bytes(bytes_data: bytes) -> Image.Image:
     return Image.open(io.BytesIO(bytes_data)).convert("RGB")
 
-def generate_from_sketch(
-        sketch_bytes: bytes,
+
+def result_cache_key(
+        digest: str,
         prompt: str,
-        guidance: float = 7.5,
-        num_inference_steps: int = 30
+        guidance: float,
+        num_inference_steps: int,
+        seed: int | None,
+        sampler: str = "default"
+) -> str:
+    """Content address of a generation: identical inputs and backend give identical keys."""
+    backend = os.getenv("GENERATION_BACKEND", "local").lower()
+    h = hashlib.sha256()
+    for part in (
+        digest,
+        prompt,
+        repr(float(guidance)),
+        str(int(num_inference_steps)),
+        "" if seed is None else str(int(seed)),
+        sampler,
+        str(GENERATION_RESOLUTION),
+        backend,
+        ModelLoader.instance().model_path,
+        os.getenv("HF_GEN_MODEL", "stabilityai/stable-diffusion-xl-base-1.0") if backend == "hf" else "",
+        os.getenv("HF_ENHANCE_MODEL", "timbrooks/instruct-pix2pix") if HFEnhanceService().is_enabled() else "",
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _result_from_file(
+        path: str,
+        latest_path: str,
+        image_bytes: bytes | None = None,
+        image: Image.Image | None = None
 ) -> dict:
-    """
-    Returns dict: { 'image_path': str, 'image_base64': str }
-    """
-    # pipeline = ModelLoader.instance().load()
+    image_web = web_path(path)
+    latest_web = web_path(latest_path)
+    # Gallery/history views use these instead of the full-size image. Variants not
+    # made at save time are created by the static route on first request.
+    variants = {name: f"{image_web}?variant={name}" for name in VARIANTS}
+    for name in VARIANTS_ON_SAVE:
+        try:
+            variants[name] = web_path(ensure_variant(path, name, image))
+        except OSError as e:
+            logger.warning("Variant creation failed", extra={"path": path, "variant": name, "error": str(e)})
+    thumbnail_web = variants["thumb"]
+    try:
+        # Counted against the owner's storage quota when the generation is recorded
+        size_bytes = os.path.getsize(path)
+    except OSError:
+        size_bytes = None
+
+    # Optionally include base64 (can be very large). Default off.
+    include_b64 = os.getenv("RETURN_BASE64", "false").lower() in {"1", "true", "yes"}
+    if include_b64:
+        if image_bytes is None:
+            with open(path, "rb") as f:
+                image_bytes = f.read()
+        img_b64 = base64.b64encode(image_bytes).decode()
+        return {
+            "image_path": image_web,
+            "latest_path": latest_web,
+            "thumbnail_path": thumbnail_web,
+            "variants": variants,
+            "size_bytes": size_bytes,
+            "image_base64": img_b64,
+            "image_mime": mime_for_path(path),
+        }
+    return {
+        "image_path": image_web,
+        "latest_path": latest_web,
+        "thumbnail_path": thumbnail_web,
+        "variants": variants,
+        "size_bytes": size_bytes,
+    }
+
+
+def _publish(image: Image.Image, cache_key: str | None = None) -> dict:
+    # Encode once; the same bytes back the unique file, latest and base64
+    out_path, latest_path, image_bytes = publish_image(image)
+    if cache_key is not None:
+        ResultCache.instance().put(cache_key, out_path)
+    return _result_from_file(out_path, latest_path, image_bytes, image)
 
 
-    # prepare input
-    sketch = pil_image_from_bytes(sketch_bytes)
-    # Normalize resolution for stability
+def cached_result(cache_key: str) -> dict | None:
+    """Serve a previous generation for cache_key, or None on a miss."""
+    cached = ResultCache.instance().get(cache_key)
+    if cached is None:
+        return None
     try:
-        sketch = sketch.resize((512, 512), PILImage.LANCZOS)
-    except Exception:
-        pass
-    # Optionally use HF text/img2img generation instead of local ControlNet
-    if os.getenv("GENERATION_BACKEND", "local").lower() == "hf":
-        try:
-            hf_gen = HFGenerateService()
-            if hf_gen.is_enabled():
-                generated = hf_gen.generate(prompt, sketch)
-                if generated is not None:
-                    image = generated
-                    # Skip local pipeline entirely
-                    enhancer = HFEnhanceService()
-                    if enhancer.is_enabled():
-                        try:
-                            image = enhancer.enhance(image, prompt=prompt)
-                        except Exception as e:
-                            print(f"HF enhance after HF gen failed: {e}")
-                    # save + return
-                    out_path = save_image_to_outputs(image)
-                    abs_path = os.path.abspath(out_path)
-                    parts = abs_path.replace("\\", "/").split("/static/")
-                    web_path = f"/static/{parts[1]}" if len(parts) == 2 else out_path.replace("\\", "/")
-                    include_b64 = os.getenv("RETURN_BASE64", "false").lower() in {"1", "true", "yes"}
-                    if include_b64:
-                        buff = io.BytesIO(); image.save(buff, format="PNG")
-                        return {"image_path": web_path, "image_base64": base64.b64encode(buff.getvalue()).decode()}
-                    return {"image_path": web_path}
-        except Exception as e:
-            print(f"HF generation fallback to local due to: {e}")
+        latest_path = publish_latest(cached)
+    except OSError:
+        latest_path = str(cached)
+    result = _result_from_file(str(cached), latest_path)
+    result["cached"] = True
+    return result
+
+
+def _remote_image(hf_gen: HFGenerateService, prompt: str, sketch: Image.Image) -> Image.Image:
+    # An empty response counts as a backend failure for the router's error rate
+    image = hf_gen.generate(prompt, sketch)
+    if image is None:
+        raise RuntimeError("HF generation returned no image")
+    return image
 
-    # ControlNet: Canny conditioning to preserve structure (best-effort)
+
+def _generate_remote(sketch: Image.Image, prompt: str, cache_key: str | None = None) -> dict | None:
+    """Run the HF text/img2img backend; None means fall back to the local pipeline."""
     try:
-        canny = CannyDetector()
-        sketch = canny(sketch)
-    except Exception:
-        pass
+        hf_gen = HFGenerateService()
+        if not hf_gen.is_enabled():
+            return None
+        image = BackendRouter.instance().call("hf_generate", _remote_image, hf_gen, prompt, sketch)
+        # Skip local pipeline entirely
+        enhancer = HFEnhanceService()
+        if enhancer.is_enabled():
+            try:
+                image = BackendRouter.instance().call("hf_enhance", enhancer.enhance, image, prompt=prompt)
+            except Exception as e:
+                logger.warning("HF enhance after HF generation failed", extra={"error": str(e)})
+        return _publish(image, cache_key)
+    except BackendUnavailable as e:
+        logger.info("Skipping HF generation, using local pipeline", extra={"reason": str(e)})
+        return None
+    except Exception as e:
+        logger.warning("HF generation failed, falling back to local pipeline", extra={"error": str(e)})
+        return None
 
 
-# If your pipeline expects a specific conditioning, adapt here.
-# This is a straight-forward call; adjust to your ControlNet conditioning API.
-    generator = torch.Generator(device=pipe.device)
+def latent_preview(latents) -> str:
+    """Cheap base64 PNG preview of one (4, h, w) latent, at latent resolution."""
+    import torch
 
+    factors = torch.tensor(_LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+    rgb = torch.einsum("chw,cr->hwr", latents.float(), factors)
+    rgb = ((rgb + 1.0) / 2.0).clamp(0, 1).mul(255).byte().cpu().numpy()
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode()
 
-    # Strengthen conditioning for higher quality UI/3D outputs
-    style_suffix = (
-        ", clean layout, consistent spacing, modern typography, high contrast,"
-        " photorealistic 3D product render, studio lighting, detailed materials"
-    )
-    negative_suffix = ", cartoon, distorted, low quality, text overlay, fake texture"
-    conditioned_prompt = f"{prompt}{style_suffix}"
 
-    with torch.autocast(device_type=str(pipe.device), dtype=torch.float16 if str(pipe.device).startswith("cuda") else torch.float32):
-        output = pipe(
-            prompt=conditioned_prompt,
-            negative_prompt=negative_suffix,
-            image=sketch,
-            guidance_scale=guidance,
-            num_inference_steps=num_inference_steps,
-            generator=generator,
-        )
+def denoise_batch(
+        control_images: list[Image.Image],
+        prompts: list[str],
+        guidance: float = 7.5,
+        num_inference_steps: int = 30,
+        seeds: list[int | None] | None = None,
+        job_ids: list[str | None] | None = None,
+        sampler: str = "default"
+) -> list[Image.Image]:
+    """Run one batched ControlNet pipeline call; all items share guidance, steps and sampler."""
+    import torch
+
+    # Loaded by the background warm-up; callers wait for readiness before getting here.
+    # Selecting the sampler swaps only the scheduler object, never the weights.
+    pipe = ModelLoader.instance().use_sampler(sampler)
+    conditioned_prompts = [f"{prompt}{STYLE_SUFFIX}" for prompt in prompts]
+    # One generator per item keeps each image independent of its batch neighbours
+    generators = []
+    for seed in seeds or [None] * len(prompts):
+        generator = torch.Generator(device=pipe.device)
+        if seed is not None:
+            generator.manual_seed(int(seed))
+        generators.append(generator)
+
+    tracker = ProgressTracker.instance()
+    job_ids = job_ids or [None] * len(prompts)
+    for job_id in job_ids:
+        if job_id is not None:
+            tracker.start(job_id)
+
+    def on_step_end(pipeline, step, _timestep, callback_kwargs):
+        latents = callback_kwargs.get("latents")
+        want_preview = PROGRESS_PREVIEW_EVERY > 0 and (step + 1) % PROGRESS_PREVIEW_EVERY == 0
+        for idx, job_id in enumerate(job_ids):
+            if job_id is None:
+                continue
+            preview = latent_preview(latents[idx]) if want_preview and latents is not None else None
+            tracker.update(job_id, step + 1, preview)
+        # Stop denoising once nobody is waiting for any image in this batch
+        if all(job_id is not None and tracker.is_cancelled(job_id) for job_id in job_ids):
+            pipeline._interrupt = True
+        return callback_kwargs
+
+    # Text embeddings come from the LRU in front of the text encoder, so repeat prompts
+    # and variation runs skip CLIP; the constant negative is encoded only once.
+    embeddings = PromptEmbeddingCache.instance()
+    negative_embeds = embeddings.negative(pipe, NEGATIVE_SUFFIX)
+    # Variations of one sketch (/generate/batch) share the edge map: pass it once and let
+    # the pipeline repeat it, along with a single prompt embedding when the prompt is shared.
+    shared_control = all(image is control_images[0] for image in control_images)
+    if shared_control and len(set(conditioned_prompts)) == 1:
+        prompt_kwargs = {
+            "prompt_embeds": embeddings.positive(pipe, conditioned_prompts[0]),
+            "negative_prompt_embeds": negative_embeds,
+            "num_images_per_prompt": len(prompts),
+        }
+    else:
+        prompt_kwargs = {
+            "prompt_embeds": torch.cat([embeddings.positive(pipe, p) for p in conditioned_prompts]),
+            "negative_prompt_embeds": negative_embeds.expand(len(prompts), -1, -1),
+        }
 
+    with torch.autocast(device_type=str(pipe.device), dtype=torch.float16 if str(pipe.device).startswith("cuda") else torch.float32):
+        # Stop at the latents so the VAE decode is measured as its own stage
+        with STAGE_SECONDS.time("denoise"):
+            latents = pipe(
+                **prompt_kwargs,
+                image=control_images[0] if shared_control else control_images,
+                guidance_scale=guidance,
+                num_inference_steps=num_inference_steps,
+                generator=generators,
+                callback_on_step_end=on_step_end,
+                callback_on_step_end_tensor_inputs=["latents"],
+                output_type="latent",
+            ).images
+        with STAGE_SECONDS.time("vae_decode"), torch.inference_mode():
+            decoded = pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0]
+            images = pipe.image_processor.postprocess(decoded, output_type="pil")
+    return list(images)
 
-    image = output.images[0]
 
+def finalize_image(image: Image.Image, prompt: str, cache_key: str | None = None) -> dict:
     # Optional enhancement via Hugging Face Inference API
     enhancer = HFEnhanceService()
     if enhancer.is_enabled():
@@ -108,43 +277,140 @@ def generate_from_sketch(
                 f"Refine and modernize this design. {prompt}. Maintain structure, "
                 f"improve aesthetics, add realistic 3D materials and lighting."
             )
-            image = enhancer.enhance(image, prompt=enhance_prompt)
+            with STAGE_SECONDS.time("hf_enhance"):
+                image = BackendRouter.instance().call("hf_enhance", enhancer.enhance, image, prompt=enhance_prompt)
+        except BackendUnavailable as skipped:
+            logger.info("Skipping HF enhancement", extra={"reason": str(skipped)})
         except Exception as enhance_error:
             # Never fail the request because of enhancement; return base image
-            print(f"HF enhancement error: {enhance_error}")
+            logger.warning("HF enhancement error", extra={"error": str(enhance_error)})
+    return _publish(image, cache_key)
 
 
-    # save file (unique + latest)
-    out_path, latest_path = save_image_and_latest(image)
+@dataclass
+class DenoisedImage:
+    """Output of the denoise stage still to be enhanced, encoded and published."""
+    image: Image.Image
+    prompt: str
+    cache_key: str | None
+    job_id: str | None = None
 
-    # Normalize to web path under /static
-    try:
-        # If path is within backend/static, expose under /static
-        abs_path = os.path.abspath(out_path)
-        # Find 'static' segment and rebuild as /static/...
-        parts = abs_path.replace("\\", "/").split("/static/")
-        if len(parts) == 2:
-            web_path = f"/static/{parts[1]}"
+
+def denoise_stage(
+        sketches: list[bytes | PreparedSketch],
+        prompts: list[str],
+        guidance: float = 7.5,
+        num_inference_steps: int = 30,
+        seeds: list[int | None] | None = None,
+        job_ids: list[str | None] | None = None,
+        sampler: str = "default"
+) -> list[dict | Exception | DenoisedImage]:
+    """
+    The model-bound part of generate_batch: one denoise call for every item
+    that isn't a cache hit or served remotely. Those items come back as
+    DenoisedImage for postprocess_stage, so the caller can release the
+    pipeline before HF enhancement and encoding run.
+    """
+    preprocessor = SketchPreprocessor.instance()
+    results: list[dict | Exception | DenoisedImage | None] = [None] * len(sketches)
+    seeds = seeds or [None] * len(sketches)
+    job_ids = job_ids or [None] * len(sketches)
+    tracker = ProgressTracker.instance()
+    use_hf = os.getenv("GENERATION_BACKEND", "local").lower() == "hf"
+    cache_keys: list[str | None] = [None] * len(sketches)
+
+    pending: list[tuple[int, Image.Image]] = []
+    for idx, sketch in enumerate(sketches):
+        digest = sketch.digest if isinstance(sketch, PreparedSketch) else sketch_digest(sketch)
+        cache_keys[idx] = result_cache_key(digest, prompts[idx], guidance, num_inference_steps, seeds[idx], sampler)
+        hit = cached_result(cache_keys[idx])
+        if hit is not None:
+            results[idx] = hit
+            continue
+        try:
+            if not isinstance(sketch, PreparedSketch):
+                sketch = preprocessor.prepare(sketch, digest)
+        except Exception as e:
+            results[idx] = e
+            continue
+        # Optionally use HF text/img2img generation instead of local ControlNet
+        if use_hf:
+            remote = _generate_remote(sketch.sketch, prompts[idx], cache_keys[idx])
+            if remote is not None:
+                results[idx] = remote
+                continue
+            # Don't cache a local fallback under the remote backend's key
+            cache_keys[idx] = None
+        pending.append((idx, sketch.control))
+
+    if pending:
+        try:
+            images = denoise_batch(
+                [control for _, control in pending],
+                [prompts[idx] for idx, _ in pending],
+                guidance,
+                num_inference_steps,
+                [seeds[idx] for idx, _ in pending],
+                [job_ids[idx] for idx, _ in pending],
+                sampler,
+            )
+        except Exception as e:
+            for idx, _ in pending:
+                results[idx] = e
         else:
-            # Fallback to original
-            web_path = out_path.replace("\\", "/")
-    except Exception:
-        web_path = out_path.replace("\\", "/")
+            for (idx, _), image in zip(pending, images):
+                if tracker.is_cancelled(job_ids[idx]):
+                    # Possibly only partially denoised; never publish it
+                    results[idx] = GenerationCancelled("Generation cancelled")
+                    continue
+                results[idx] = DenoisedImage(image, prompts[idx], cache_keys[idx], job_ids[idx])
+    return results
+
 
-    # Also compute stable web path for latest
+def postprocess_stage(item: dict | Exception | DenoisedImage) -> dict | Exception:
+    """Finish one denoise_stage result; thread-safe, so several can run beside the next denoise."""
+    if not isinstance(item, DenoisedImage):
+        return item
+    if ProgressTracker.instance().is_cancelled(item.job_id):
+        return GenerationCancelled("Generation cancelled")
     try:
-        latest_abs = os.path.abspath(latest_path)
-        lparts = latest_abs.replace("\\", "/").split("/static/")
-        latest_web = f"/static/{lparts[1]}" if len(lparts) == 2 else latest_path.replace("\\", "/")
-    except Exception:
-        latest_web = web_path
+        return finalize_image(item.image, item.prompt, item.cache_key)
+    except Exception as e:
+        return e
 
 
-    # Optionally include base64 (can be very large). Default off.
-    include_b64 = os.getenv("RETURN_BASE64", "false").lower() in {"1", "true", "yes"}
-    if include_b64:
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_b64 = base64.b64encode(buffered.getvalue()).decode()
-        return {"image_path": web_path, "latest_path": latest_web, "image_base64": img_b64}
-    return {"image_path": web_path, "latest_path": latest_web}
\ No newline at end of file
+def generate_batch(
+        sketches: list[bytes | PreparedSketch],
+        prompts: list[str],
+        guidance: float = 7.5,
+        num_inference_steps: int = 30,
+        seeds: list[int | None] | None = None,
+        job_ids: list[str | None] | None = None,
+        sampler: str = "default"
+) -> list[dict | Exception]:
+    """
+    Generate one result per (sketch, prompt) pair with a single denoise call.
+
+    Sketches may be raw upload bytes or already preprocessed. Items are
+    independent: a failure for one item is returned in its slot as the raised
+    exception instead of failing the whole batch.
+    """
+    items = denoise_stage(sketches, prompts, guidance, num_inference_steps, seeds, job_ids, sampler)
+    return [postprocess_stage(item) for item in items]
+
+
+def generate_from_sketch(
+        sketch_bytes: bytes,
+        prompt: str,
+        guidance: float = 7.5,
+        num_inference_steps: int = 30,
+        seed: int | None = None,
+        sampler: str = "default"
+) -> dict:
+    """
+    Returns dict: { 'image_path': str, 'image_base64': str }
+    """
+    result = generate_batch([sketch_bytes], [prompt], guidance, num_inference_steps, [seed], sampler=sampler)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
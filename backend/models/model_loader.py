@@ -1,7 +1,54 @@
 import os
+import json
+import time
 import threading
-from diffusers import StableDiffusionControlNetPipeline
-import torch
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Sampler registry: name -> (diffusers scheduler class, extra config, default steps).
+# "default" keeps whatever scheduler ships with MODEL_PATH.
+SAMPLERS = {
+    "default": (None, {}, 30),
+    "dpmpp_2m": ("DPMSolverMultistepScheduler", {"algorithm_type": "dpmsolver++"}, 20),
+    "dpmpp_2m_karras": ("DPMSolverMultistepScheduler", {"algorithm_type": "dpmsolver++", "use_karras_sigmas": True}, 20),
+    "unipc": ("UniPCMultistepScheduler", {}, 20),
+    "euler_a": ("EulerAncestralDiscreteScheduler", {}, 25),
+    "euler": ("EulerDiscreteScheduler", {}, 25),
+    "ddim": ("DDIMScheduler", {}, 30),
+}
+
+# Quality/latency presets: name -> (sampler, steps). Override with SAMPLER_PRESETS,
+# e.g. SAMPLER_PRESETS='{"draft": ["unipc", 10]}'
+PRESETS = {
+    "draft": ("dpmpp_2m", 12),
+    "standard": ("unipc", 20),
+    "final": ("dpmpp_2m_karras", 30),
+}
+PRESETS.update({name: tuple(value) for name, value in json.loads(os.getenv("SAMPLER_PRESETS", "{}")).items()})
+DEFAULT_SAMPLER = os.getenv("DEFAULT_SAMPLER", "default")
+
+
+class UnknownSampler(ValueError):
+    """Raised for a sampler or preset name that isn't registered."""
+
+
+def resolve_sampling(preset: str | None = None, sampler: str | None = None, steps: int | None = None) -> tuple[str, int]:
+    """
+    Pick (sampler, steps) for a request. Explicit values win over the preset,
+    and the preset wins over DEFAULT_SAMPLER and that sampler's default steps.
+    """
+    preset_sampler, preset_steps = None, None
+    if preset:
+        if preset not in PRESETS:
+            raise UnknownSampler(f"Unknown preset '{preset}'; choose one of {sorted(PRESETS)}")
+        preset_sampler, preset_steps = PRESETS[preset]
+    name = sampler or preset_sampler or DEFAULT_SAMPLER
+    if name not in SAMPLERS:
+        raise UnknownSampler(f"Unknown sampler '{name}'; choose one of {sorted(SAMPLERS)}")
+    return name, int(steps or preset_steps or SAMPLERS[name][2])
 
 
 # Singleton loader
@@ -13,6 +60,17 @@ class ModelLoader:
     def __init__(self):
         self.pipeline = None
         self.model_path = os.getenv("MODEL_PATH", "./models/SketchToUI_Model")
+        # Readiness state reported by /ready: idle -> loading -> loaded -> warming -> ready | failed
+        self.status = "idle"
+        self.progress = 0.0
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warmup_thread: threading.Thread | None = None
+        # Scheduler shipped with the weights, and samplers built from its config
+        self._base_scheduler = None
+        self._samplers: dict[str, object] = {}
 
 
     @classmethod
@@ -27,18 +85,141 @@ class ModelLoader:
         if self.pipeline is not None:
             return self.pipeline
 
+        with self._load_lock:
+            if self.pipeline is not None:
+                return self.pipeline
+
+            # Heavy imports live here so importing the app doesn't pull in torch/diffusers
+            import torch
+            from diffusers import StableDiffusionControlNetPipeline
+
+            self.status = "loading"
+            self.progress = 0.05
+            self.error = None
+            started = time.perf_counter()
+            try:
+                # choose device
+                device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+
+                # Example: load from local folder (ensure all required files exist)
+                # You may need to adapt this depending on how you saved the pipeline.
+                pipeline = StableDiffusionControlNetPipeline.from_pretrained(
+                self.model_path,
+                safety_checker=None,
+                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+                )
+                self.progress = 0.6
+                pipeline = pipeline.to(device)
+                pipeline.enable_attention_slicing()
+            except Exception as e:
+                self.status = "failed"
+                self.error = str(e)
+                raise
+            self.load_seconds = time.perf_counter() - started
+            logger.info("Model loaded", extra={"model_path": self.model_path, "device": device, "load_seconds": round(self.load_seconds, 2)})
+            self.status = "loaded"
+            self.progress = 0.8
+            self._base_scheduler = pipeline.scheduler
+            self.pipeline = pipeline
+            return self.pipeline
+
+
+    def use_sampler(self, name: str = "default"):
+        """
+        Swap the pipeline's scheduler in place. Schedulers hold no weights, so this
+        is cheap; instances are built once from the model's own scheduler config.
+        Only call it from the thread that runs the pipeline.
+        """
+        pipeline = self.load()
+        if name not in SAMPLERS:
+            raise UnknownSampler(f"Unknown sampler '{name}'")
+        scheduler = self._samplers.get(name)
+        if scheduler is None:
+            class_name, extra_config, _ = SAMPLERS[name]
+            if class_name is None:
+                scheduler = self._base_scheduler
+            else:
+                import diffusers
+
+                scheduler = getattr(diffusers, class_name).from_config(self._base_scheduler.config, **extra_config)
+            self._samplers[name] = scheduler
+        pipeline.scheduler = scheduler
+        return pipeline
+
+
+    def warmup(self, steps: int = 2):
+        """Run a tiny dummy inference so first-request allocations happen up front."""
+        import torch
+        from PIL import Image
+
+        pipeline = self.load()
+        self.status = "warming"
+        size = int(os.getenv("GENERATION_RESOLUTION", "512"))
+
+        def on_step_end(_pipe, step, _timestep, callback_kwargs):
+            self.progress = 0.8 + 0.2 * (step + 1) / max(steps, 1)
+            return callback_kwargs
+
+        with torch.inference_mode():
+            pipeline(
+                prompt="warmup",
+                image=Image.new("RGB", (size, size)),
+                num_inference_steps=steps,
+                callback_on_step_end=on_step_end,
+            )
+
+
+    def _warmup_worker(self, device: str | None, dummy_inference: bool):
+        try:
+            self.load(device=device)
+            if dummy_inference:
+                self.warmup(steps=int(os.getenv("WARMUP_STEPS", "2")))
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.exception("Model warm-up failed")
+            # Release waiters so queued requests fail fast instead of hanging
+            self._ready.set()
+            return
+        self.status = "ready"
+        self.progress = 1.0
+        self._ready.set()
+
+
+    def start_warmup(self, device: str | None = None, dummy_inference: bool | None = None):
+        """Load (and optionally warm) the pipeline on a background thread; returns immediately."""
+        if dummy_inference is None:
+            dummy_inference = os.getenv("WARMUP_DUMMY_INFERENCE", "true").lower() in {"1", "true", "yes"}
+        with self._load_lock:
+            if self._warmup_thread is not None or self._ready.is_set():
+                return
+            self._warmup_thread = threading.Thread(
+                target=self._warmup_worker,
+                args=(device, dummy_inference),
+                name="model-warmup",
+                daemon=True,
+            )
+            self._warmup_thread.start()
+
+
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
 
-    # choose device
-        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Block until warm-up finishes (successfully or not); starts it if needed."""
+        if self._warmup_thread is None:
+            self.start_warmup()
+        self._ready.wait(timeout)
+        return self.is_ready()
 
 
-        # Example: load from local folder (ensure all required files exist)
-        # You may need to adapt this depending on how you saved the pipeline.
-        self.pipeline = StableDiffusionControlNetPipeline.from_pretrained(
-        self.model_path,
-        safety_checker=None,
-        torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-        )
-        self.pipeline = self.pipeline.to(device)
-        self.pipeline.enable_attention_slicing()
-        return self.pipeline
\ No newline at end of file
+    def readiness(self) -> dict:
+        return {
+            "status": self.status,
+            "ready": self.is_ready(),
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+        }
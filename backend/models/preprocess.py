@@ -0,0 +1,153 @@
+import io
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.metrics import STAGE_SECONDS, register_cache
+
+
+class PreprocessError(ValueError):
+    """Raised when an uploaded sketch cannot be decoded."""
+
+
+@dataclass(frozen=True)
+class PreparedSketch:
+    digest: str
+    # Resized RGB sketch (used by the remote backend)
+    sketch: Image.Image
+    # Canny edge map fed to ControlNet
+    control: Image.Image
+
+
+def sketch_digest(sketch_bytes: bytes) -> str:
+    return hashlib.sha256(sketch_bytes).hexdigest()
+
+
+def decode_sketch(sketch_bytes: bytes) -> np.ndarray:
+    """Decode to an RGB uint8 array."""
+    buf = np.frombuffer(sketch_bytes, dtype=np.uint8)
+    bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf.size else None
+    if bgr is not None:
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    # OpenCV lacks a few formats PIL handles (e.g. GIF)
+    try:
+        return np.asarray(Image.open(io.BytesIO(sketch_bytes)).convert("RGB"))
+    except Exception as e:
+        raise PreprocessError(f"Could not decode sketch image: {e}") from e
+
+
+def resize_sketch(rgb: np.ndarray, resolution: int) -> np.ndarray:
+    h, w = rgb.shape[:2]
+    if (w, h) == (resolution, resolution):
+        return rgb
+    # Area averaging is the fast, alias-free choice when shrinking
+    interpolation = cv2.INTER_AREA if w >= resolution and h >= resolution else cv2.INTER_LANCZOS4
+    return cv2.resize(rgb, (resolution, resolution), interpolation=interpolation)
+
+
+class CannyEdgeDetector:
+    """Long-lived edge detector; equivalent to controlnet_aux.CannyDetector at 512px."""
+
+    def __init__(self, low_threshold: int = 100, high_threshold: int = 200):
+        self.low_threshold = low_threshold
+        self.high_threshold = high_threshold
+
+    def __call__(self, rgb: np.ndarray) -> np.ndarray:
+        edges = cv2.Canny(rgb, self.low_threshold, self.high_threshold)
+        # ControlNet expects a 3-channel conditioning image
+        return np.repeat(edges[:, :, None], 3, axis=2)
+
+
+# Singleton sketch preprocessing stage: decode -> resize -> canny, cached by sketch hash
+class SketchPreprocessor:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.resolution = int(os.getenv("GENERATION_RESOLUTION", "512"))
+        self.detector = CannyEdgeDetector(
+            int(os.getenv("CANNY_LOW_THRESHOLD", "100")),
+            int(os.getenv("CANNY_HIGH_THRESHOLD", "200")),
+        )
+        self.cache_size = int(os.getenv("PREPROCESS_CACHE_SIZE", "64"))
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, PreparedSketch] = OrderedDict()
+        self._mutex = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PREPROCESS_WORKERS", "2")),
+            thread_name_prefix="preprocess",
+        )
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _lookup(self, digest: str) -> PreparedSketch | None:
+        with self._mutex:
+            prepared = self._cache.get(digest)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(digest)
+            self.hits += 1
+            return prepared
+
+    def _store(self, prepared: PreparedSketch):
+        if self.cache_size <= 0:
+            return
+        with self._mutex:
+            self._cache[prepared.digest] = prepared
+            self._cache.move_to_end(prepared.digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def prepare(self, sketch_bytes: bytes, digest: str | None = None) -> PreparedSketch:
+        """Return the resized sketch and its edge map, reusing a cached result when possible."""
+        digest = digest or sketch_digest(sketch_bytes)
+        cached = self._lookup(digest)
+        if cached is not None:
+            return cached
+
+        with STAGE_SECONDS.time("decode"):
+            decoded = decode_sketch(sketch_bytes)
+        with STAGE_SECONDS.time("resize"):
+            rgb = resize_sketch(decoded, self.resolution)
+        with STAGE_SECONDS.time("canny"):
+            edges = self.detector(rgb)
+        prepared = PreparedSketch(
+            digest=digest,
+            sketch=Image.fromarray(rgb),
+            control=Image.fromarray(edges),
+        )
+        self._store(prepared)
+        return prepared
+
+    async def prepare_async(self, sketch_bytes: bytes, digest: str | None = None) -> PreparedSketch:
+        """Run prepare() on the preprocessing thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.prepare, sketch_bytes, digest)
+
+    def stats(self) -> dict:
+        with self._mutex:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+register_cache("preprocess", lambda: SketchPreprocessor.instance().stats())
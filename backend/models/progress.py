@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from dataclasses import dataclass, field
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised for a job that was cancelled before its result was produced."""
+
+
+@dataclass
+class JobProgress:
+    job_id: str
+    total_steps: int
+    status: str = "queued"  # queued -> running -> done | failed | cancelled
+    step: int = 0
+    started_at: float | None = None
+    updated_at: float = field(default_factory=time.time)
+    preview: str | None = None
+    error: str | None = None
+    cancelled: bool = False
+
+    def eta_seconds(self) -> float | None:
+        if not self.started_at or self.step <= 0:
+            return None
+        per_step = (time.time() - self.started_at) / self.step
+        return round(per_step * max(self.total_steps - self.step, 0), 2)
+
+    def snapshot(self) -> dict:
+        event = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "eta_seconds": self.eta_seconds(),
+        }
+        if self.preview is not None:
+            event["preview"] = self.preview
+        if self.error is not None:
+            event["error"] = self.error
+        return event
+
+
+# Singleton registry of generation progress, fed from the inference thread
+# and consumed by SSE subscribers on the event loop.
+class ProgressTracker:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        # Finished jobs are kept this long so late subscribers still see the outcome
+        self.retention_seconds = float(os.getenv("PROGRESS_RETENTION_SECONDS", "300"))
+        self._jobs: dict[str, JobProgress] = {}
+        self._subscribers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        # Plain callbacks for every event / every cancellation (used to relay across processes)
+        self._listeners: list = []
+        self._cancel_listeners: list = []
+        self._mutex = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            # Running jobs are never dropped; abandoned placeholders and finished jobs are
+            if job.status != "running" and job.updated_at < cutoff:
+                del self._jobs[job_id]
+                self._subscribers.pop(job_id, None)
+
+    def create(self, total_steps: int, job_id: str | None = None) -> str:
+        """Register a job. Client-chosen ids let a progress stream be opened before the job starts."""
+        job_id = job_id or uuid.uuid4().hex
+        with self._mutex:
+            self._prune()
+            existing = self._jobs.get(job_id)
+            if existing is None or existing.status in ("done", "failed", "cancelled"):
+                self._jobs[job_id] = JobProgress(job_id=job_id, total_steps=total_steps)
+            elif existing.status == "queued":
+                existing.total_steps = total_steps
+        return job_id
+
+    def get(self, job_id: str) -> JobProgress | None:
+        with self._mutex:
+            return self._jobs.get(job_id)
+
+    def add_listener(self, callback):
+        """Call callback(event) for every published event; it must not block."""
+        self._listeners.append(callback)
+
+    def add_cancel_listener(self, callback):
+        """Call callback(job_id) whenever a job is flagged as cancelled."""
+        self._cancel_listeners.append(callback)
+
+    def _publish(self, job: JobProgress):
+        # Called with the mutex held; hands the event to each subscriber's loop
+        job.updated_at = time.time()
+        event = job.snapshot()
+        for callback in self._listeners:
+            callback(event)
+        for loop, queue in self._subscribers.get(job.job_id, []):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                pass
+
+    def start(self, job_id: str):
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == "queued":
+                job.status = "running"
+                job.started_at = time.time()
+                self._publish(job)
+
+    def update(self, job_id: str, step: int, preview: str | None = None):
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "running":
+                return
+            job.step = step
+            if preview is not None:
+                job.preview = preview
+            self._publish(job)
+
+    def finish(self, job_id: str, status: str = "done", error: str | None = None):
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.status = "cancelled" if job.cancelled else status
+            if job.status == "done":
+                job.step = job.total_steps
+            job.error = error
+            self._publish(job)
+
+    def cancel(self, job_id: str) -> bool:
+        """Flag a job as cancelled; the denoise loop stops at its next step."""
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in ("done", "failed", "cancelled"):
+                return False
+            job.cancelled = True
+            if job.status == "queued":
+                job.status = "cancelled"
+                self._publish(job)
+        for callback in self._cancel_listeners:
+            callback(job_id)
+        return True
+
+    def is_cancelled(self, job_id: str | None) -> bool:
+        if job_id is None:
+            return False
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            return job is not None and job.cancelled
+
+    async def subscribe(self, job_id: str):
+        """Yield progress events for job_id until it reaches a terminal state."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        entry = (loop, queue)
+        with self._mutex:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            self._subscribers.setdefault(job_id, []).append(entry)
+            current = job.snapshot()
+        try:
+            yield current
+            while current["status"] not in ("done", "failed", "cancelled"):
+                current = await queue.get()
+                yield current
+        finally:
+            with self._mutex:
+                subscribers = self._subscribers.get(job_id, [])
+                if entry in subscribers:
+                    subscribers.remove(entry)
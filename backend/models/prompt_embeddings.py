@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+
+from utils.metrics import STAGE_SECONDS, register_cache
+
+
+# Singleton LRU of CLIP text embeddings keyed by the exact conditioned prompt text.
+# The negative prompt is constant, so it is encoded once and never evicted.
+class PromptEmbeddingCache:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        # ~240 KB per entry for SD 1.x (77 x 768 float32)
+        self.max_entries = int(os.getenv("PROMPT_EMBED_CACHE_SIZE", "128"))
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, object] = OrderedDict()
+        self._negative: dict[str, object] = {}
+        self._encoder = None
+        self._mutex = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _bind(self, pipe):
+        # Embeddings belong to one text encoder; drop them if the pipeline was reloaded
+        if self._encoder is not pipe.text_encoder:
+            self._cache.clear()
+            self._negative.clear()
+            self._encoder = pipe.text_encoder
+
+    @staticmethod
+    def _encode(pipe, text: str):
+        import torch
+
+        with STAGE_SECONDS.time("text_encode"), torch.no_grad():
+            embeds, _ = pipe.encode_prompt(
+                text, pipe.device, num_images_per_prompt=1, do_classifier_free_guidance=False
+            )
+        return embeds
+
+    def positive(self, pipe, text: str):
+        """(1, tokens, dim) embedding of text, encoded on a miss. Call from the pipeline thread."""
+        with self._mutex:
+            self._bind(pipe)
+            embeds = self._cache.get(text)
+            if embeds is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return embeds
+            self.misses += 1
+        embeds = self._encode(pipe, text)
+        if self.max_entries > 0:
+            with self._mutex:
+                self._cache[text] = embeds
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return embeds
+
+    def negative(self, pipe, text: str):
+        """Embedding of a constant negative prompt; encoded on first use only."""
+        with self._mutex:
+            self._bind(pipe)
+            embeds = self._negative.get(text)
+        if embeds is None:
+            embeds = self._encode(pipe, text)
+            with self._mutex:
+                self._negative[text] = embeds
+        return embeds
+
+    def clear(self):
+        with self._mutex:
+            self._cache.clear()
+            self._negative.clear()
+
+    def stats(self) -> dict:
+        with self._mutex:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+register_cache("prompt_embedding", lambda: PromptEmbeddingCache.instance().stats())
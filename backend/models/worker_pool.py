@@ -0,0 +1,331 @@
+import os
+import time
+import queue
+import pickle
+import asyncio
+import itertools
+import threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from models.progress import ProgressTracker
+from utils.logger import get_logger, CONSOLE_ONLY_PROCESS_PREFIX
+
+logger = get_logger(__name__)
+
+
+def _finish_batch(batch_id: int, items: list, job_ids: list, results):
+    """Postprocess one denoised batch inside the worker and send the results to the API process."""
+    from models.inference import postprocess_stage
+
+    tracker = ProgressTracker.instance()
+    safe = []
+    for item in items:
+        item = postprocess_stage(item)
+        # Exceptions must survive the trip back to the API process
+        if isinstance(item, Exception):
+            try:
+                pickle.loads(pickle.dumps(item))
+            except Exception:
+                item = RuntimeError(str(item))
+        safe.append(item)
+    for job_id in job_ids:
+        if job_id is not None:
+            tracker.finish(job_id)
+    results.put(("result", batch_id, safe))
+
+
+def _worker_main(index: int, num_threads: int, cores: list[int] | None, jobs, results, control):
+    """Entry point of one inference worker process: its own pipeline, its own share of the cores."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+
+    tracker = ProgressTracker.instance()
+
+    # Relay step events to the API process; terminal states are reported there
+    def forward(event: dict):
+        if event["status"] == "running":
+            results.put(("progress", None, event))
+
+    tracker.add_listener(forward)
+
+    def watch_cancellations():
+        while True:
+            job_id = control.get()
+            if job_id is None:
+                return
+            tracker.cancel(job_id)
+
+    threading.Thread(target=watch_cancellations, name="cancel-watch", daemon=True).start()
+
+    try:
+        import torch
+
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+
+        from models.model_loader import ModelLoader
+        from models.inference import denoise_stage
+
+        loader = ModelLoader.instance()
+        loader.load(device="cpu")
+        if os.getenv("WARMUP_DUMMY_INFERENCE", "true").lower() in {"1", "true", "yes"}:
+            loader.warmup(steps=int(os.getenv("WARMUP_STEPS", "2")))
+    except Exception as e:
+        results.put(("failed", index, str(e)))
+        return
+    results.put(("ready", index, loader.load_seconds))
+
+    # One batch's postprocessing overlaps the next batch's denoise; at most
+    # POSTPROCESS_QUEUE_SIZE denoised images wait before this worker stops taking batches
+    postprocess = ThreadPoolExecutor(max_workers=1, thread_name_prefix="postprocess")
+    max_waiting = max(1, int(os.getenv("POSTPROCESS_QUEUE_SIZE", "8")))
+    waiting: deque = deque()
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            postprocess.shutdown(wait=True)
+            return
+        batch_id, args, kwargs = message
+        job_ids = kwargs.get("job_ids") or []
+        for job_id, steps in zip(job_ids, itertools.repeat(args[3])):
+            if job_id is not None:
+                tracker.create(steps, job_id)
+        try:
+            items = denoise_stage(*args, **kwargs)
+        except Exception as e:
+            items = [e] * len(args[0])
+        waiting.append((postprocess.submit(_finish_batch, batch_id, items, job_ids, results), len(items)))
+        while waiting and (waiting[0][0].done() or sum(count for _, count in waiting) > max_waiting):
+            waiting.popleft()[0].result()
+        results.put(("denoised", index, batch_id))
+
+
+# Singleton pool of inference worker processes (INFERENCE_WORKERS > 0).
+# Each worker holds its own pipeline and a fixed slice of the CPU cores, so
+# torch intra-op threads don't compete with each other or with uvicorn.
+class InferenceWorkerPool:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.size = int(os.getenv("INFERENCE_WORKERS", "0"))
+        total = int(os.getenv("INFERENCE_TOTAL_THREADS", str(os.cpu_count() or 1)))
+        self.threads_per_worker = max(1, total // max(self.size, 1))
+        self.pin_cores = os.getenv("INFERENCE_PIN_CORES", "false").lower() in {"1", "true", "yes"}
+        self.status = "idle"
+        self.error: str | None = None
+        # Slowest worker's pipeline load time
+        self.load_seconds: float | None = None
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._processes: dict[int, mp.Process] = {}
+        self._jobs: dict[int, object] = {}
+        self._control: dict[int, object] = {}
+        self._ready_workers: set[int] = set()
+        # Bumped on every (re)spawn, so idle-queue entries of a dead worker are recognised as stale
+        self._generation: dict[int, int] = {}
+        # How often the result reader checks that the workers are still alive
+        self.reap_interval = float(os.getenv("INFERENCE_WORKER_REAP_SECONDS", "1"))
+        self._ready = threading.Event()
+        # batch_id -> (worker index, loop, future, job ids, on_denoised callback)
+        self._pending: dict[int, tuple[int, asyncio.AbstractEventLoop, asyncio.Future, list, object]] = {}
+        self._batch_ids = itertools.count()
+        # (worker index, generation), or None once no worker is left
+        self._idle: asyncio.Queue | None = None
+        self._idle_loop: asyncio.AbstractEventLoop | None = None
+        self._mutex = threading.Lock()
+        self._reader: threading.Thread | None = None
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _spawn(self, index: int):
+        cores = None
+        if self.pin_cores:
+            start = index * self.threads_per_worker
+            cores = list(range(start, start + self.threads_per_worker))
+        self._jobs[index] = self._ctx.Queue()
+        self._control[index] = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.threads_per_worker, cores, self._jobs[index], self._results, self._control[index]),
+            name=f"{CONSOLE_ONLY_PROCESS_PREFIX}-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        self._generation[index] = self._generation.get(index, 0) + 1
+
+    def start_warmup(self):
+        """Spawn the workers; each loads and warms its own pipeline in the background."""
+        with self._mutex:
+            if self.status != "idle":
+                return
+            self.status = "loading"
+        ProgressTracker.instance().add_cancel_listener(self._forward_cancel)
+        for index in range(self.size):
+            self._spawn(index)
+        self._reader = threading.Thread(target=self._read_results, name="worker-results", daemon=True)
+        self._reader.start()
+
+    def _forward_cancel(self, job_id: str):
+        with self._mutex:
+            for worker, _, _, job_ids, _ in self._pending.values():
+                if job_id in job_ids:
+                    self._control[worker].put(job_id)
+
+    def _mark_idle(self, index: int | None):
+        # None wakes dispatchers waiting for a worker when none is left
+        entry = None if index is None else (index, self._generation.get(index))
+        if self._idle is not None and self._idle_loop is not None:
+            self._idle_loop.call_soon_threadsafe(self._idle.put_nowait, entry)
+
+    def _worker_failed(self, index: int, error: str):
+        """A worker that never became ready is given up; the pool fails once none are left."""
+        logger.error("Inference worker failed to start", extra={"worker": index, "error": error})
+        with self._mutex:
+            self.error = error
+            self._processes.pop(index, None)
+            if self._processes:
+                return
+            self.status = "failed"
+        self._ready.set()
+        self._mark_idle(None)
+
+    def _read_results(self):
+        tracker = ProgressTracker.instance()
+        next_reap = time.monotonic() + self.reap_interval
+        while True:
+            # Checked on a clock rather than only when idle, so steady traffic can't hide a dead worker
+            if time.monotonic() >= next_reap:
+                self._reap_dead_workers()
+                next_reap = time.monotonic() + self.reap_interval
+            try:
+                kind, ident, payload = self._results.get(timeout=self.reap_interval)
+            except queue.Empty:
+                continue
+            if kind == "progress":
+                tracker.start(payload["job_id"])
+                tracker.update(payload["job_id"], payload["step"], payload.get("preview"))
+            elif kind == "ready":
+                with self._mutex:
+                    self._ready_workers.add(ident)
+                    self.status = "ready"
+                    if payload is not None:
+                        self.load_seconds = max(self.load_seconds or 0.0, payload)
+                self._mark_idle(ident)
+                self._ready.set()
+            elif kind == "failed":
+                self._worker_failed(ident, payload)
+            elif kind == "denoised":
+                # The worker's pipeline is free; its postprocessing of the batch continues
+                with self._mutex:
+                    entry = self._pending.get(payload)
+                if entry is not None and entry[4] is not None:
+                    entry[1].call_soon_threadsafe(entry[4])
+                self._mark_idle(ident)
+            elif kind == "result":
+                with self._mutex:
+                    entry = self._pending.pop(ident, None)
+                if entry is None:
+                    continue
+                _, loop, future, _, _ = entry
+                loop.call_soon_threadsafe(self._resolve, future, payload)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, payload):
+        if not future.done():
+            future.set_result(payload)
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
+
+    def _reap_dead_workers(self):
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            if index not in self._ready_workers:
+                # Died while loading without reporting (OOM kill, segfault)
+                self._worker_failed(index, f"Inference worker exited while loading (exit code {process.exitcode})")
+                continue
+            logger.error("Inference worker exited, restarting", extra={"worker": index, "exitcode": process.exitcode})
+            with self._mutex:
+                self._ready_workers.discard(index)
+                lost = [bid for bid, entry in self._pending.items() if entry[0] == index]
+                for bid in lost:
+                    _, loop, future, _, _ = self._pending.pop(bid)
+                    loop.call_soon_threadsafe(self._fail, future, RuntimeError("Inference worker exited"))
+            self._spawn(index)
+
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        if self.status == "idle":
+            self.start_warmup()
+        self._ready.wait(timeout)
+        return self.is_ready()
+
+    def readiness(self) -> dict:
+        return {
+            "status": self.status,
+            "ready": self.is_ready(),
+            "progress": round(len(self._ready_workers) / max(self.size, 1), 3),
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "workers": self.size,
+            "workers_ready": len(self._ready_workers),
+            "threads_per_worker": self.threads_per_worker,
+        }
+
+    async def run_batch(self, *args, on_denoised=None, **kwargs) -> list:
+        """
+        Run denoise_stage(*args, **kwargs) and then postprocessing on the next idle worker.
+        on_denoised() is called on this loop once the worker is free for another batch.
+        """
+        loop = asyncio.get_running_loop()
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._idle_loop = loop
+            for index in sorted(self._ready_workers):
+                self._mark_idle(index)
+        while True:
+            entry = await self._idle.get()
+            if entry is None:
+                # Left in place for the other waiting dispatchers
+                self._idle.put_nowait(None)
+                raise RuntimeError(f"No inference worker available: {self.error}")
+            worker, generation = entry
+            # Entries queued before a worker died (or was respawned) are dropped
+            if worker in self._ready_workers and generation == self._generation.get(worker):
+                process = self._processes.get(worker)
+                if process is not None and process.is_alive():
+                    break
+        future = loop.create_future()
+        batch_id = next(self._batch_ids)
+        with self._mutex:
+            self._pending[batch_id] = (worker, loop, future, list(kwargs.get("job_ids") or []), on_denoised)
+        self._jobs[worker].put((batch_id, args, kwargs))
+        return await future
+
+    def shutdown(self):
+        for index, process in self._processes.items():
+            self._jobs[index].put(None)
+            self._control[index].put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
@@ -1,18 +1,24 @@
 from fastapi import APIRouter, HTTPException, Response, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from services.gemini_service import GeminiService
 from utils.response_formatter import success_response
+from utils.file_handler import read_upload_bytes, UploadTooLarge
+from utils.logger import get_logger
 import base64
 import io
+import json
 from PIL import Image
 
+logger = get_logger(__name__)
+
 router = APIRouter()
 
 # Initialize Gemini service
 try:
     gemini_service = GeminiService()
 except RuntimeError as e:
-    print(f"Warning: {e}")
+    logger.warning("Gemini service unavailable", extra={"error": str(e)})
     gemini_service = None
 
 
@@ -33,12 +39,40 @@ async def chat_with_assistant(request: ChatRequest):
         )
     
     try:
-        response = gemini_service.ask(request.message, request.context)
-        return success_response({"response": response})
+        response, cache_status = await gemini_service.ask_with_status(request.message, request.context)
+        return success_response({"response": response, "cache": cache_status})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_with_assistant_stream(request: ChatRequest):
+    """
+    Stream the assistant's answer as server-sent events:
+    `data: {"text": ...}` per chunk, then `event: done` (or `event: error`).
+    """
+    if not gemini_service:
+        raise HTTPException(
+            status_code=500, 
+            detail="Gemini service is not available. Please check GEMINI_API_KEY environment variable."
+        )
+
+    async def events():
+        try:
+            async for chunk in gemini_service.stream_ask(request.message, request.context):
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so chunks reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/health")
 async def assistant_health():
     """
@@ -66,7 +100,7 @@ async def analyze_image(
     
     try:
         # Read and process the image
-        image_data = await image.read()
+        image_data = await read_upload_bytes(image)
         
         # Convert to base64 for Gemini API
         image_base64 = base64.b64encode(image_data).decode('utf-8')
@@ -87,9 +121,11 @@ async def analyze_image(
         """
         
         # Use Gemini's vision capabilities
-        response = gemini_service.analyze_image_with_text(image_base64, analysis_prompt)
-        return success_response({"response": response})
+        response, cache_status = await gemini_service.analyze_image_with_status(image_base64, analysis_prompt)
+        return success_response({"response": response, "cache": cache_status})
         
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -100,6 +136,12 @@ async def chat_options():
     return Response(status_code=204)
 
 
+@router.options("/chat/stream")
+async def chat_stream_options():
+    # Explicit CORS preflight support
+    return Response(status_code=204)
+
+
 @router.options("/analyze-image")
 async def analyze_image_options():
     # Explicit CORS preflight support
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from database import get_db, User
-from auth import verify_password, get_password_hash, create_access_token
+from auth import verify_password_async, get_password_hash_async, create_access_token
 from datetime import timedelta
 from utils.response_formatter import success_response
 from auth import get_current_user
@@ -25,30 +27,42 @@ class Token(BaseModel):
     username: str
 
 @router.post("/signup", response_model=Token)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user already exists
-    if db.query(User).filter(User.email == user.email).first():
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Check email and username uniqueness in one round trip
+    existing = (await db.execute(
+        select(User.email, User.username)
+        .where(or_(User.email == user.email, User.username == user.username))
+        .limit(2)
+    )).all()
+    if any(row.email == user.email for row in existing):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    if db.query(User).filter(User.username == user.username).first():
+    if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent signup for the same email or username
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
+        )
     
     # Create token
     access_token = create_access_token(
@@ -64,10 +78,10 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     )
 
 @router.post("/signin", response_model=Token)
-async def signin(user: UserLogin, db: Session = Depends(get_db)):
+async def signin(user: UserLogin, db: AsyncSession = Depends(get_db)):
     # Find user by email
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
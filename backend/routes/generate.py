@@ -1,31 +1,269 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import os
+import json
+import time
+import secrets
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
 from utils.response_formatter import success_response
-from models.inference import generate_from_sketch
+from models.batch_scheduler import BatchScheduler, SchedulerBusy
+from models.progress import ProgressTracker, GenerationCancelled
+from models.model_loader import PRESETS, SAMPLERS, DEFAULT_SAMPLER, UnknownSampler, resolve_sampling
+from models.preprocess import PreprocessError
+from utils.result_cache import ResultCache
+from utils.file_handler import read_upload_bytes, UploadTooLarge
+from utils.logger import get_logger
+from auth import get_optional_user
+from database import User
+from services.history_service import record_generation
+
+logger = get_logger(__name__)
 
 
 router = APIRouter()
 
+# How often a waiting /run request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+# Upper bound on variations per /batch request; they all run in one pipeline call
+GENERATE_BATCH_MAX_ITEMS = int(os.getenv("GENERATE_BATCH_MAX_ITEMS", "8"))
+
 
+async def _await_unless_disconnected(request: Request, job_ids: list[str], coro):
+    """
+    Await coro, but cancel it if the client goes away. job_ids are cancelled in
+    the tracker too, which stops their denoise loop; /run passes none because its
+    generation may be shared with identical requests (the scheduler stops it once
+    nobody is waiting).
+    """
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            for job_id in job_ids:
+                ProgressTracker.instance().cancel(job_id)
+            task.cancel()
+            raise GenerationCancelled("Client disconnected")
 
 
 @router.post("/run")
 async def generate_endpoint(
+request: Request,
 sketch: UploadFile = File(...),
 prompt: str = Form(...),
 guidance: float = Form(7.5),
-steps: int = Form(30),
+steps: int | None = Form(None),
+seed: int | None = Form(None),
+job_id: str | None = Form(None),
+preset: str | None = Form(None),
+sampler: str | None = Form(None),
+current_user: User | None = Depends(get_optional_user),
 ):
+    # preset (draft/standard/final) maps to a sampler + step count; explicit fields override it
+    try:
+        sampler, steps = resolve_sampling(preset, sampler, steps)
+    except UnknownSampler as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Clients may pick job_id up front and open /generate/progress/{job_id} in parallel
+    tracker = ProgressTracker.instance()
+    job_id = tracker.create(steps, job_id)
+    status = "failed"
+    started = time.perf_counter()
     try:
-        sketch_bytes = await sketch.read()
-        result = generate_from_sketch(sketch_bytes, prompt, guidance, steps)
-        return success_response(result)
+        sketch_bytes = await read_upload_bytes(sketch)
+        # Inference runs on the scheduler's worker thread; compatible requests are batched
+        result = await _await_unless_disconnected(
+            request,
+            [],
+            BatchScheduler.instance().submit(
+                sketch_bytes, prompt, guidance, steps, seed, job_id=job_id, sampler=sampler
+            ),
+        )
+        status = "done"
+        generation_id = None
+        if current_user is not None:
+            # Anonymous generations aren't kept; history is per account
+            generation_id = await record_generation(
+                current_user,
+                prompt,
+                {"guidance": guidance, "steps": steps, "seed": seed, "sampler": sampler, "preset": preset},
+                result,
+                time.perf_counter() - started,
+            )
+        return success_response({
+            **result, "job_id": job_id, "sampler": sampler, "steps": steps, "generation_id": generation_id
+        })
+    except GenerationCancelled as e:
+        # A detached request isn't flagged in the tracker (the generation may live on for others)
+        status = "cancelled"
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PreprocessError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SchedulerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         # Log the error server-side and return structured error
-        print(f"/generate/run error: {e}")
+        logger.exception("/generate/run error")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        tracker.finish(job_id, status)
+
+
+def _batch_items(
+        prompt: str | None,
+        prompts: list[str] | None,
+        seeds: list[int] | None,
+        count: int | None
+) -> tuple[list[str], list[int]]:
+    """Expand the /batch form into parallel prompt and seed lists."""
+    prompts = [p for p in (prompts or []) if p.strip()] or ([prompt] if prompt else [])
+    if not prompts:
+        raise HTTPException(status_code=400, detail="Provide prompt or prompts")
+    seeds = seeds or []
+    size = max(len(prompts), len(seeds), count or 1)
+    if len(prompts) not in (1, size) or len(seeds) not in (0, 1, size):
+        raise HTTPException(status_code=400, detail="prompts and seeds must have one entry or one per image")
+    if size > GENERATE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {GENERATE_BATCH_MAX_ITEMS} images per batch")
+    prompts = prompts * size if len(prompts) == 1 else prompts
+    if not seeds:
+        # Unseeded variations would share one result cache key (and one image); pick a
+        # random base so each item differs, and report it so the set can be reproduced
+        seeds = [secrets.randbelow(2 ** 31 - GENERATE_BATCH_MAX_ITEMS)]
+    if len(seeds) == 1:
+        # One seed fixes the whole set reproducibly while keeping the images distinct
+        seeds = [seeds[0] + i for i in range(size)]
+    return prompts, seeds
+
+
+@router.post("/batch")
+async def generate_batch_endpoint(
+request: Request,
+sketch: UploadFile = File(...),
+prompt: str | None = Form(None),
+prompts: list[str] | None = Form(None),
+seeds: list[int] | None = Form(None),
+count: int | None = Form(None),
+guidance: float = Form(7.5),
+steps: int | None = Form(None),
+preset: str | None = Form(None),
+sampler: str | None = Form(None),
+current_user: User | None = Depends(get_optional_user),
+):
+    """
+    Several variations of one sketch in a single pipeline call: repeat the
+    prompts and/or seeds fields, or send one prompt with count. The sketch is
+    uploaded and preprocessed once; each image gets its own job_id for
+    /generate/progress.
+    """
+    try:
+        sampler, steps = resolve_sampling(preset, sampler, steps)
+    except UnknownSampler as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    prompts, seeds = _batch_items(prompt, prompts, seeds, count)
+
+    tracker = ProgressTracker.instance()
+    job_ids = [tracker.create(steps) for _ in prompts]
+    statuses = ["failed"] * len(job_ids)
+    started = time.perf_counter()
+    try:
+        sketch_bytes = await read_upload_bytes(sketch)
+        results = await _await_unless_disconnected(
+            request,
+            job_ids,
+            BatchScheduler.instance().submit_many(
+                sketch_bytes, prompts, guidance, steps, seeds, job_ids=job_ids, sampler=sampler
+            ),
+        )
+        elapsed = time.perf_counter() - started
+        items = []
+        for idx, result in enumerate(results):
+            item = {"job_id": job_ids[idx], "prompt": prompts[idx], "seed": seeds[idx]}
+            if isinstance(result, BaseException):
+                item["error"] = str(result) or type(result).__name__
+                items.append(item)
+                continue
+            statuses[idx] = "done"
+            if current_user is not None:
+                item["generation_id"] = await record_generation(
+                    current_user,
+                    prompts[idx],
+                    {"guidance": guidance, "steps": steps, "seed": seeds[idx], "sampler": sampler,
+                     "preset": preset, "batch_size": len(prompts)},
+                    result,
+                    elapsed,
+                )
+            items.append({**result, **item})
+        if "done" not in statuses:
+            # Nothing succeeded: answer like /run would for that error
+            raise next(r for r in results if isinstance(r, BaseException))
+        return success_response({"results": items, "sampler": sampler, "steps": steps})
+    except GenerationCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PreprocessError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SchedulerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.exception("/generate/batch error")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for job_id, status in zip(job_ids, statuses):
+            tracker.finish(job_id, status)
+
+
+@router.get("/progress/{job_id}")
+async def generate_progress(job_id: str):
+    """
+    Server-sent events with step, ETA and (if PROGRESS_PREVIEW_EVERY is set) a
+    base64 latent preview, ending with a done/failed/cancelled event.
+    """
+    tracker = ProgressTracker.instance()
+    if tracker.get(job_id) is None:
+        # Placeholder so the stream can be opened before /run is posted
+        tracker.create(0, job_id)
+
+    async def events():
+        async for event in tracker.subscribe(job_id):
+            yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/cancel/{job_id}")
+async def generate_cancel(job_id: str):
+    # Detaches this request; a generation shared with identical requests keeps running for them
+    if not BatchScheduler.instance().cancel(job_id):
+        raise HTTPException(status_code=404, detail="No active job with that id")
+    return success_response({"job_id": job_id}, message="Cancelling")
+
+
+@router.get("/samplers")
+async def generate_samplers():
+    return success_response({
+        "default": DEFAULT_SAMPLER,
+        "samplers": {name: {"default_steps": steps} for name, (_, _, steps) in SAMPLERS.items()},
+        "presets": {name: {"sampler": preset_sampler, "steps": steps} for name, (preset_sampler, steps) in PRESETS.items()},
+    })
+
+
+@router.get("/cache")
+async def generate_cache_stats():
+    # Hit/miss counters for the content-addressed result cache
+    return success_response(ResultCache.instance().stats())
 
 
 @router.options("/run")
 async def generate_options():
     # Allow CORS preflight explicitly
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
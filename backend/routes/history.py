@@ -1,10 +1,50 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from auth import get_current_user
+from database import get_db, Generation, User
+from services.history_service import list_generations, get_generation, InvalidCursor, MAX_PAGE_SIZE
 from utils.response_formatter import success_response
 
 router = APIRouter()
 
+
+def _serialize(generation: Generation) -> dict:
+    # Lists show the thumbnail; the full-size image is only fetched when opened
+    return {
+        "id": generation.id,
+        "prompt": generation.prompt,
+        "params": generation.params or {},
+        "thumbnail_url": generation.thumbnail_path or generation.image_path,
+        "image_url": generation.image_path,
+        "cached": generation.cached,
+        "total_seconds": generation.total_seconds,
+        "created_at": generation.created_at.isoformat(),
+    }
+
 @router.get("/")
-async def get_history(limit: int = 50):
-    # For now, return empty history since we're using localStorage
-    # This endpoint can be used later when implementing database storage
-    return success_response({"history": []})
\ No newline at end of file
+async def get_history(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Newest first; pass next_cursor back as cursor for the following page."""
+    try:
+        generations, next_cursor = await list_generations(db, current_user.id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return success_response({
+        "history": [_serialize(g) for g in generations],
+        "next_cursor": next_cursor,
+    })
+
+@router.get("/{generation_id}")
+async def get_history_item(
+    generation_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    generation = await get_generation(db, current_user.id, generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return success_response(_serialize(generation))
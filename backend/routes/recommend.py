@@ -1,10 +1,20 @@
 from fastapi import APIRouter, Body, HTTPException
 from services.gemini_service import GeminiService
 from utils.response_formatter import success_response
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter()
 
+# Shared service instance; its HTTP connections are pooled process-wide
+try:
+    gemini_service = GeminiService()
+except RuntimeError as e:
+    logger.warning("Gemini service unavailable", extra={"error": str(e)})
+    gemini_service = None
+
 
 
 
@@ -16,8 +26,8 @@ async def recommend_endpoint(payload: dict = Body(...)):
     try:
         prompt = payload.get("prompt")
         context = payload.get("context")
-        gs = GeminiService()
-        resp = gs.ask(prompt, context)
-        return success_response({"answer": resp})
+        gs = gemini_service or GeminiService()
+        resp, cache_status = await gs.ask_with_status(prompt, context)
+        return success_response({"answer": resp, "cache": cache_status})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from utils.file_handler import save_upload_file
+from utils.file_handler import stream_upload_to_disk, UploadTooLarge
 from utils.response_formatter import success_response, error_response
 
 
@@ -11,7 +11,9 @@ router = APIRouter()
 @router.post("/sketch")
 async def upload_sketch(file: UploadFile = File(...)):
     try:
-        saved_path = await save_upload_file(file)
-        return success_response({"path": saved_path}, message="Uploaded")
+        saved_path, sha256, size = await stream_upload_to_disk(file)
+        return success_response({"path": saved_path, "sha256": sha256, "size": size}, message="Uploaded")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.metrics import REGISTRY
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SKIPPED = REGISTRY.counter(
+    "designmate_backend_skipped_total",
+    "Remote backend calls skipped by the router (circuit_open) or abandoned for a fallback (hedged).",
+    ("backend", "reason"),
+)
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised instead of (or while) calling a backend that is circuit-broken or was hedged away."""
+
+
+class _Backend:
+    def __init__(self, window: int):
+        # (finished_at, seconds, ok), newest last
+        self.samples: deque[tuple[float, float, bool]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+
+# Singleton router in front of the remote (Hugging Face) backends. It keeps rolling
+# latency and error stats per backend and trips a circuit breaker after repeated
+# failures, so an outage costs callers nothing instead of a full HF_TIMEOUT each.
+class BackendRouter:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.enabled = os.getenv("ROUTER_ENABLED", "true").lower() in {"1", "true", "yes"}
+        self.window = int(os.getenv("ROUTER_WINDOW", "50"))
+        self.window_seconds = float(os.getenv("ROUTER_WINDOW_SECONDS", "300"))
+        self.min_samples = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+        # Open after this many failures in a row, or this error rate over the window
+        self.failure_threshold = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+        self.error_rate_threshold = float(os.getenv("ROUTER_ERROR_RATE", "0.5"))
+        # How long an open circuit skips the backend before letting one probe call through
+        self.open_seconds = float(os.getenv("ROUTER_OPEN_SECONDS", "30"))
+        # Hedging: stop waiting for a call that runs past factor x its rolling p95 and
+        # let the caller fall back; the call finishes in the background for the stats
+        self.hedge = os.getenv("ROUTER_HEDGE", "false").lower() in {"1", "true", "yes"}
+        self.hedge_factor = float(os.getenv("ROUTER_HEDGE_FACTOR", "1.0"))
+        self.hedge_min_seconds = float(os.getenv("ROUTER_HEDGE_MIN_SECONDS", "1.0"))
+        self._backends: dict[str, _Backend] = {}
+        self._mutex = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("ROUTER_HEDGE_WORKERS", "4")),
+            thread_name_prefix="router",
+        )
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _backend(self, name: str) -> _Backend:
+        backend = self._backends.get(name)
+        if backend is None:
+            with self._mutex:
+                backend = self._backends.setdefault(name, _Backend(self.window))
+        return backend
+
+    def _recent(self, backend: _Backend) -> list[tuple[float, float, bool]]:
+        cutoff = time.time() - self.window_seconds
+        return [s for s in backend.samples if s[0] >= cutoff]
+
+    def allow(self, name: str) -> bool:
+        """False while the circuit is open; after open_seconds a single probe call is let through."""
+        backend = self._backend(name)
+        with self._mutex:
+            if backend.state == "closed":
+                return True
+            if backend.state == "open" and time.time() - backend.opened_at >= self.open_seconds:
+                backend.state = "half_open"
+            if backend.state == "half_open" and not backend.probe_in_flight:
+                backend.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, name: str, seconds: float, ok: bool):
+        backend = self._backend(name)
+        with self._mutex:
+            backend.samples.append((time.time(), seconds, ok))
+            backend.probe_in_flight = False
+            if ok:
+                backend.consecutive_failures = 0
+                if backend.state != "closed":
+                    logger.info("Backend circuit closed", extra={"backend": name})
+                backend.state = "closed"
+                return
+            backend.consecutive_failures += 1
+            recent = self._recent(backend)
+            error_rate = sum(1 for s in recent if not s[2]) / len(recent)
+            if backend.state == "half_open" or backend.consecutive_failures >= self.failure_threshold or (
+                len(recent) >= self.min_samples and error_rate >= self.error_rate_threshold
+            ):
+                if backend.state != "open":
+                    logger.warning("Backend circuit opened", extra={
+                        "backend": name,
+                        "consecutive_failures": backend.consecutive_failures,
+                        "error_rate": round(error_rate, 3),
+                    })
+                backend.state = "open"
+                backend.opened_at = time.time()
+
+    def p95(self, name: str) -> float | None:
+        """Rolling p95 latency of successful calls, or None with too few samples."""
+        with self._mutex:
+            latencies = sorted(s[1] for s in self._recent(self._backend(name)) if s[2])
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def _hedge_after(self, name: str) -> float | None:
+        if not self.hedge:
+            return None
+        p95 = self.p95(name)
+        return None if p95 is None else max(self.hedge_min_seconds, p95 * self.hedge_factor)
+
+    def call(self, name: str, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) against backend name, recording latency and outcome.
+        Raises BackendUnavailable when the circuit is open or the call was hedged;
+        errors from fn propagate after being counted.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        if not self.allow(name):
+            SKIPPED.labels(name, "circuit_open").inc()
+            raise BackendUnavailable(f"{name} is unavailable (circuit open)")
+
+        hedge_after = self._hedge_after(name)
+        start = time.perf_counter()
+        if hedge_after is None:
+            try:
+                value = fn(*args, **kwargs)
+            except Exception:
+                self.record(name, time.perf_counter() - start, False)
+                raise
+            self.record(name, time.perf_counter() - start, True)
+            return value
+
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(
+            lambda f: self.record(name, time.perf_counter() - start, f.exception() is None)
+        )
+        try:
+            return future.result(timeout=hedge_after)
+        except FutureTimeout:
+            SKIPPED.labels(name, "hedged").inc()
+            raise BackendUnavailable(f"{name} exceeded its p95 latency ({hedge_after:.1f}s); falling back")
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, backend in list(self._backends.items()):
+            with self._mutex:
+                recent = self._recent(backend)
+                state = backend.state
+            result[name] = {
+                "state": state,
+                "samples": len(recent),
+                "error_rate": round(sum(1 for s in recent if not s[2]) / len(recent), 3) if recent else 0.0,
+                "p95_seconds": self.p95(name),
+            }
+        return result
+
+
+REGISTRY.gauge(
+    "designmate_backend_circuit_open", "1 while a backend's circuit breaker is open.", ("backend",),
+    fn=lambda: {(name,): int(s["state"] != "closed") for name, s in BackendRouter.instance().snapshot().items()},
+)
+REGISTRY.gauge(
+    "designmate_backend_p95_seconds", "Rolling p95 latency of successful backend calls.", ("backend",),
+    fn=lambda: {(name,): s["p95_seconds"] for name, s in BackendRouter.instance().snapshot().items()},
+)
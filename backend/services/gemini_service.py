@@ -1,7 +1,18 @@
 import os
-import requests
+import httpx
 import json
+import hashlib
 from services.config_loader import get_secret
+from services.http_client import HttpClient
+from services.response_cache import ResponseCache, make_key, normalize_prompt
+from utils.logger import get_logger
+from utils.metrics import track_external
+from utils.singleflight import SingleFlight
+
+logger = get_logger(__name__)
+
+# Shared by all GeminiService instances: concurrent identical questions make one upstream call
+_inflight = SingleFlight("gemini")
 
 
 class GeminiService:
@@ -11,83 +22,165 @@ class GeminiService:
         if not self.api_key:
             raise RuntimeError("GEMINI_API_KEY is not set in env")
         # Model and endpoint per Google Generative Language API
-        model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+        self.model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+        # Overridable so tests and benchmarks can point at a local fake server
+        api_base = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+        self.api_url = f"{api_base}/models/{self.model}:generateContent"
+        self.stream_url = f"{api_base}/models/{self.model}:streamGenerateContent"
+        self.timeout_seconds = float(os.getenv("GEMINI_TIMEOUT", "30"))
+        self.generation_config = {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
+        }
+        self.http = HttpClient.instance()
+        self.cache = ResponseCache.instance()
 
-    def ask(self, prompt: str, context: str | None = None) -> str:
+    async def _cached(self, key: str, compute) -> tuple[str, str]:
+        """Serve key from the response cache or compute it; returns (text, cache status)."""
+        if not self.cache.enabled:
+            text, _ = await _inflight.do(key, compute)
+            return text, "disabled"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+        text, ok = await _inflight.do(key, compute)
+        if not ok:
+            # Errors and filtered answers are never cached
+            return text, "bypass"
+        await self.cache.set(key, text)
+        return text, "miss"
+
+    async def ask(self, prompt: str, context: str | None = None) -> str:
         """
         Send a prompt to Gemini API and return the response
         """
+        text, _ = await self.ask_with_status(prompt, context)
+        return text
+
+    def _ask_key(self, prompt: str, context: str | None) -> str:
+        return make_key(
+            "ask", normalize_prompt(prompt), normalize_prompt(context), self.model, self.generation_config
+        )
+
+    async def ask_with_status(self, prompt: str, context: str | None = None) -> tuple[str, str]:
+        key = self._ask_key(prompt, context)
+        return await self._cached(key, lambda: self._ask_uncached(prompt, context))
+
+    def _chat_payload(self, prompt: str, context: str | None = None) -> dict:
+        content_parts = [{"text": prompt}]
+        if context:
+            content_parts.insert(0, {"text": f"Context: {context}\n\n"})
+        return {
+            "contents": [{
+                "parts": content_parts
+            }],
+            "generationConfig": self.generation_config
+        }
+
+    async def stream_ask(self, prompt: str, context: str | None = None):
+        """
+        Yield the answer in chunks as Gemini produces them (streamGenerateContent over SSE).
+        A cached answer is yielded as a single chunk.
+        """
+        key = self._ask_key(prompt, context)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        finish_reason = None
+        # Measured until the last chunk, not time to first token
+        with track_external("gemini_stream"):
+            async for line in self.http.stream_lines(
+                "POST",
+                f"{self.stream_url}?alt=sse&key={self.api_key}",
+                json=self._chat_payload(prompt, context),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout_seconds,
+            ):
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):].strip())
+                for candidate in data.get("candidates", [])[:1]:
+                    finish_reason = candidate.get("finishReason", finish_reason)
+                    for part in candidate.get("content", {}).get("parts", []):
+                        text = part.get("text")
+                        if text:
+                            chunks.append(text)
+                            yield text
+
+        # Only a fully streamed, normally finished answer is cacheable
+        if chunks and finish_reason in (None, "STOP"):
+            await self.cache.set(key, "".join(chunks))
+
+    async def _ask_uncached(self, prompt: str, context: str | None = None) -> tuple[str, bool]:
         try:
-            # Log a short fingerprint only, avoid printing full keys
-            print(f"Gemini API Key: {self.api_key[:6]}***" if self.api_key else "No API key")
-            print(f"API URL: {self.api_url}")
-            
             # Prepare the request payload
-            content_parts = [{"text": prompt}]
-            if context:
-                content_parts.insert(0, {"text": f"Context: {context}\n\n"})
-            
-            payload = {
-                "contents": [{
-                    "parts": content_parts
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
+            payload = self._chat_payload(prompt, context)
             
             headers = {
                 "Content-Type": "application/json"
             }
             
-            print(f"Making request to Gemini API with payload: {payload}")
+            # Debug lines are sampled and payload fields truncated by the logging pipeline
+            logger.debug("Gemini request", extra={"url": self.api_url, "payload": payload})
             
             # Make the API call
-            response = requests.post(
-                f"{self.api_url}?key={self.api_key}",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            print(f"Response status: {response.status_code}")
-            print(f"Response headers: {response.headers}")
-            
-            response.raise_for_status()
+            with track_external("gemini"):
+                response = await self.http.post(
+                    f"{self.api_url}?key={self.api_key}",
+                    json=payload,
+                    headers=headers,
+                    timeout=self.timeout_seconds
+                )
+                
+                logger.debug("Gemini response", extra={"status": response.status_code, "headers": dict(response.headers)})
+                response.raise_for_status()
             data = response.json()
             
-            print(f"Response data: {data}")
+            logger.debug("Gemini response body", extra={"body": data})
             
             # Extract the generated text from the response
             if "candidates" in data and len(data["candidates"]) > 0:
                 candidate = data["candidates"][0]
                 if "content" in candidate and "parts" in candidate["content"]:
-                    return candidate["content"]["parts"][0]["text"]
+                    return candidate["content"]["parts"][0]["text"], True
                 elif "finishReason" in candidate:
-                    print(f"Finish reason: {candidate['finishReason']}")
-                    return "Sorry, the response was filtered or incomplete. Please try rephrasing your question."
+                    logger.warning("Gemini answer filtered", extra={"finish_reason": candidate["finishReason"]})
+                    return "Sorry, the response was filtered or incomplete. Please try rephrasing your question.", False
             
-            print(f"No valid candidates in response: {data}")
-            return "Sorry, I couldn't generate a response. Please try again."
+            logger.warning("Gemini returned no candidates", extra={"body": data})
+            return "Sorry, I couldn't generate a response. Please try again.", False
             
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {str(e)}")
-            return f"Error connecting to Gemini API: {str(e)}"
+        except httpx.HTTPError as e:
+            logger.error("Gemini request failed", extra={"error": str(e)})
+            return f"Error connecting to Gemini API: {str(e)}", False
         except Exception as e:
-            print(f"General error: {str(e)}")
-            return f"Error processing request: {str(e)}"
+            logger.exception("Gemini request error")
+            return f"Error processing request: {str(e)}", False
 
-    def analyze_image_with_text(self, image_base64: str, text_prompt: str) -> str:
+    async def analyze_image_with_text(self, image_base64: str, text_prompt: str) -> str:
         """
         Analyze an image with text prompt using Gemini API's vision capabilities
         """
+        text, _ = await self.analyze_image_with_status(image_base64, text_prompt)
+        return text
+
+    async def analyze_image_with_status(self, image_base64: str, text_prompt: str) -> tuple[str, str]:
+        key = make_key(
+            "analyze",
+            hashlib.sha256(image_base64.encode("ascii")).hexdigest(),
+            normalize_prompt(text_prompt),
+            self.model,
+            self.generation_config,
+        )
+        return await self._cached(key, lambda: self._analyze_uncached(image_base64, text_prompt))
+
+    async def _analyze_uncached(self, image_base64: str, text_prompt: str) -> tuple[str, bool]:
         try:
-            print(f"Analyzing image with Gemini API...")
-            
             # Prepare the request payload with image and text
             content_parts = [
                 {"text": text_prompt},
@@ -103,50 +196,45 @@ class GeminiService:
                 "contents": [{
                     "parts": content_parts
                 }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
+                "generationConfig": self.generation_config
             }
             
             headers = {
                 "Content-Type": "application/json"
             }
             
-            print(f"Making vision request to Gemini API...")
+            logger.debug("Gemini vision request", extra={"url": self.api_url, "payload": payload})
             
             # Make the API call
-            response = requests.post(
-                f"{self.api_url}?key={self.api_key}",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            print(f"Response status: {response.status_code}")
-            
-            response.raise_for_status()
+            with track_external("gemini"):
+                response = await self.http.post(
+                    f"{self.api_url}?key={self.api_key}",
+                    json=payload,
+                    headers=headers,
+                    timeout=self.timeout_seconds
+                )
+                
+                logger.debug("Gemini vision response", extra={"status": response.status_code})
+                response.raise_for_status()
             data = response.json()
             
-            print(f"Vision response data: {data}")
+            logger.debug("Gemini vision response body", extra={"body": data})
             
             # Extract the generated text from the response
             if "candidates" in data and len(data["candidates"]) > 0:
                 candidate = data["candidates"][0]
                 if "content" in candidate and "parts" in candidate["content"]:
-                    return candidate["content"]["parts"][0]["text"]
+                    return candidate["content"]["parts"][0]["text"], True
                 elif "finishReason" in candidate:
-                    print(f"Finish reason: {candidate['finishReason']}")
-                    return "Sorry, the image analysis was filtered or incomplete. Please try with a different image."
+                    logger.warning("Gemini vision answer filtered", extra={"finish_reason": candidate["finishReason"]})
+                    return "Sorry, the image analysis was filtered or incomplete. Please try with a different image.", False
             
-            print(f"No valid candidates in vision response: {data}")
-            return "Sorry, I couldn't analyze the image. Please try again."
+            logger.warning("Gemini vision returned no candidates", extra={"body": data})
+            return "Sorry, I couldn't analyze the image. Please try again.", False
             
-        except requests.exceptions.RequestException as e:
-            print(f"Vision request error: {str(e)}")
-            return f"Error connecting to Gemini API: {str(e)}"
+        except httpx.HTTPError as e:
+            logger.error("Gemini vision request failed", extra={"error": str(e)})
+            return f"Error connecting to Gemini API: {str(e)}", False
         except Exception as e:
-            print(f"Vision analysis error: {str(e)}")
-            return f"Error processing image analysis: {str(e)}"
\ No newline at end of file
+            logger.exception("Gemini vision analysis error")
+            return f"Error processing image analysis: {str(e)}", False
\ No newline at end of file
@@ -2,9 +2,13 @@ import os
 import io
 import base64
 from typing import Optional
-import requests
 from PIL import Image
 from services.config_loader import get_secret
+from services.http_client import HttpClient
+from utils.logger import get_logger
+from utils.metrics import track_external
+
+logger = get_logger(__name__)
 
 
 class HFEnhanceService:
@@ -12,6 +16,9 @@ class HFEnhanceService:
         self.api_key = get_secret("HF_API_KEY")
         self.model_id = os.getenv("HF_ENHANCE_MODEL", "timbrooks/instruct-pix2pix")
         self.timeout_seconds = int(os.getenv("HF_TIMEOUT", "60"))
+        # Overridable so benchmarks can point at a local fake server
+        self.api_base = os.getenv("HF_API_BASE", "https://api-inference.huggingface.co").rstrip("/")
+        self.http = HttpClient.instance()
 
     def is_enabled(self) -> bool:
         return bool(self.api_key)
@@ -25,7 +32,7 @@ class HFEnhanceService:
         if not self.is_enabled():
             return image
 
-        api_url = f"https://api-inference.huggingface.co/models/{self.model_id}"
+        api_url = f"{self.api_base}/models/{self.model_id}"
         headers = {"Authorization": f"Bearer {self.api_key}"}
 
         # Many img2img models (e.g., timbrooks/instruct-pix2pix) accept multipart with fields
@@ -37,8 +44,9 @@ class HFEnhanceService:
             "inputs": prompt or "Improve the visual design while preserving layout and structure",
         }
 
-        resp = requests.post(api_url, headers=headers, data=data, files=files, timeout=self.timeout_seconds)
-        resp.raise_for_status()
+        with track_external("hf_enhance"):
+            resp = self.http.post_sync(api_url, headers=headers, data=data, files=files, timeout=self.timeout_seconds)
+            resp.raise_for_status()
 
         # HF image models may return raw bytes for image outputs depending on model; attempt to parse
         try:
@@ -52,7 +60,7 @@ class HFEnhanceService:
             return Image.open(io.BytesIO(resp.content)).convert("RGB")
         except Exception as e:
             # If enhancement fails, fall back to original image
-            print(f"HF enhancement failed: {e}")
+            logger.warning("HF enhancement failed", extra={"error": str(e)})
             return image
 
 
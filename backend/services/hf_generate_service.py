@@ -2,9 +2,10 @@ import io
 import base64
 import os
 from typing import Optional
-import requests
 from PIL import Image
 from services.config_loader import get_secret
+from services.http_client import HttpClient
+from utils.metrics import track_external
 
 
 class HFGenerateService:
@@ -13,6 +14,9 @@ class HFGenerateService:
         # Default to SDXL base text2img; many img2img-capable models accept an image field too
         self.model_id = os.getenv("HF_GEN_MODEL", "stabilityai/stable-diffusion-xl-base-1.0")
         self.timeout_seconds = int(os.getenv("HF_TIMEOUT", "60"))
+        # Overridable so benchmarks can point at a local fake server
+        self.api_base = os.getenv("HF_API_BASE", "https://api-inference.huggingface.co").rstrip("/")
+        self.http = HttpClient.instance()
 
     def is_enabled(self) -> bool:
         return bool(self.api_key)
@@ -26,7 +30,7 @@ class HFGenerateService:
         if not self.is_enabled():
             return None
 
-        api_url = f"https://api-inference.huggingface.co/models/{self.model_id}"
+        api_url = f"{self.api_base}/models/{self.model_id}"
         headers = {"Authorization": f"Bearer {self.api_key}"}
 
         data = {
@@ -40,8 +44,9 @@ class HFGenerateService:
                 "image": ("sketch.png", self._image_to_bytes(sketch), "image/png")
             }
 
-        resp = requests.post(api_url, headers=headers, data=data if files else None, json=(None if files else data), files=files, timeout=self.timeout_seconds)
-        resp.raise_for_status()
+        with track_external("hf_generate"):
+            resp = self.http.post_sync(api_url, headers=headers, data=data if files else None, json=(None if files else data), files=files, timeout=self.timeout_seconds)
+            resp.raise_for_status()
 
         # Try to interpret result as image
         ctype = resp.headers.get("content-type", "")
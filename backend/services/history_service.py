@@ -0,0 +1,97 @@
+import json
+import base64
+from datetime import datetime
+
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, Generation, User
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+def encode_cursor(generation: Generation) -> str:
+    raw = json.dumps({"t": generation.created_at.isoformat(), "id": generation.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+async def record_generation(
+        user: User,
+        prompt: str,
+        params: dict,
+        result: dict,
+        total_seconds: float | None = None
+) -> int | None:
+    """
+    Store one finished generation. Uses its own session so the caller holds no
+    connection while generating; a failure here is logged, never raised, so
+    history can't break generation.
+    """
+    try:
+        async with SessionLocal() as db:
+            generation = Generation(
+                user_id=user.id,
+                prompt=prompt,
+                params=params,
+                image_path=result["image_path"],
+                thumbnail_path=result.get("thumbnail_path"),
+                cached=bool(result.get("cached", False)),
+                total_seconds=total_seconds,
+                size_bytes=result.get("size_bytes"),
+            )
+            db.add(generation)
+            await db.commit()
+            return generation.id
+    except Exception:
+        logger.exception("Failed to record generation")
+        return None
+
+
+async def list_generations(
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 20,
+        cursor: str | None = None
+) -> tuple[list[Generation], str | None]:
+    """
+    One page of a user's generations, newest first, plus the cursor for the next page.
+
+    Keyset pagination: the page starts right after the (created_at, id) in the
+    cursor, so with the (user_id, created_at, id) index every page costs the
+    same however long the history is, unlike OFFSET.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(Generation).where(Generation.user_id == user_id)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Generation.created_at < created_at,
+            and_(Generation.created_at == created_at, Generation.id < last_id),
+        ))
+    query = query.order_by(Generation.created_at.desc(), Generation.id.desc()).limit(limit + 1)
+    rows = list((await db.execute(query)).scalars())
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def get_generation(db: AsyncSession, user_id: int, generation_id: int) -> Generation | None:
+    generation = await db.get(Generation, generation_id)
+    if generation is None or generation.user_id != user_id:
+        return None
+    return generation
@@ -0,0 +1,142 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import httpx
+
+
+# Singleton, process-wide HTTP client shared by the Gemini and Hugging Face services.
+#
+# One httpx.AsyncClient (keep-alive connection pool) runs on a dedicated I/O
+# event loop thread. Async callers on any loop await it without blocking; sync
+# callers such as the inference worker thread block only themselves. Each
+# upstream host gets its own concurrency limit so one slow API can't take every
+# pooled connection.
+class HttpClient:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.timeout = httpx.Timeout(
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read=float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+            write=float(os.getenv("HTTP_WRITE_TIMEOUT", "30")),
+            pool=float(os.getenv("HTTP_POOL_TIMEOUT", "10")),
+        )
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        )
+        self.max_per_host = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="http-io", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # _get_client, _slot and the _do_* coroutines only ever run on the I/O loop
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def _do_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self._slot(url):
+            response = await self._get_client().request(method, url, **kwargs)
+            await response.aread()
+            return response
+
+    async def _do_stream_open(self, method: str, url: str, **kwargs) -> tuple[httpx.Response, asyncio.Semaphore]:
+        slot = self._slot(url)
+        await slot.acquire()
+        try:
+            client = self._get_client()
+            response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+                response.raise_for_status()
+        except BaseException:
+            slot.release()
+            raise
+        return response, slot
+
+    async def _do_stream_close(self, response: httpx.Response, slot: asyncio.Semaphore):
+        try:
+            await response.aclose()
+        finally:
+            slot.release()
+
+    @staticmethod
+    async def _do_anext(iterator):
+        return await iterator.__anext__()
+
+    async def _do_close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self, coro):
+        return await asyncio.wrap_future(self._submit(coro))
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request from async code; the body is fully read before returning."""
+        return await self._run(self._do_request(method, url, **kwargs))
+
+    async def stream_lines(self, method: str, url: str, **kwargs):
+        """Yield response lines as they arrive (e.g. server-sent events); holds the host slot until done."""
+        response, slot = await self._run(self._do_stream_open(method, url, **kwargs))
+        lines = response.aiter_lines()
+        try:
+            while True:
+                try:
+                    line = await self._run(self._do_anext(lines))
+                except StopAsyncIteration:
+                    break
+                yield line
+        finally:
+            await self._run(self._do_stream_close(response, slot))
+
+    def request_sync(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Blocking variant for worker threads. Never call it from an event loop."""
+        return self._submit(self._do_request(method, url, **kwargs)).result()
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def post_sync(self, url: str, **kwargs) -> httpx.Response:
+        return self.request_sync("POST", url, **kwargs)
+
+    async def aclose(self):
+        if self._loop is None:
+            return
+        await self._run(self._do_close())
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from utils.metrics import register_cache
+
+
+def normalize_prompt(text: str | None) -> str:
+    """Collapse whitespace and case so trivially different phrasings share a key."""
+    return " ".join((text or "").split()).casefold()
+
+
+def make_key(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, separators=(",", ":"))
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _SqliteStore:
+    """Persistent second tier so cached answers survive restarts."""
+
+    def __init__(self, path: Path, max_entries: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._mutex = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        now = time.time()
+        with self._mutex:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        now = time.time()
+        with self._mutex:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._writes += 1
+            # Prune occasionally rather than on every write
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+
+# Singleton TTL + LRU cache for assistant responses, with an optional SQLite tier
+class ResponseCache:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+        self.ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, expires_at), least recently used first
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._mutex = threading.Lock()
+        self._store: _SqliteStore | None = None
+        if self.enabled and os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower() == "sqlite":
+            default_path = Path(__file__).resolve().parent.parent / "cache" / "responses.sqlite3"
+            self._store = _SqliteStore(
+                Path(os.getenv("RESPONSE_CACHE_PATH", str(default_path))),
+                int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "10000")),
+            )
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        with self._mutex:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_memory(self, key: str) -> str | None:
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is None and self._store is not None:
+            # Disk lookups run off the event loop
+            row = await asyncio.to_thread(self._store.get, key)
+            if row is not None:
+                value = row[0]
+                self._remember(key, row[0], row[1])
+        with self._mutex:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        with self._mutex:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "sqlite" if self._store is not None else "memory",
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+register_cache("response", lambda: ResponseCache.instance().stats())
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """Setup database tables"""
-from database import Base, engine
+import asyncio
+from database import init_db
 
 if __name__ == "__main__":
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    asyncio.run(init_db())
     print("Database tables created successfully!")
     print("You can now start the backend server.")
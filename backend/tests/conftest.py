@@ -0,0 +1,50 @@
+"""
+Shared setup for the backend tests. Settings are read at import time, so the
+environment points outputs, the database and logs at a scratch directory
+before any application module is imported.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+SCRATCH = Path(tempfile.mkdtemp(prefix="designmate-tests-"))
+# Under a static/ segment so web_path() maps outputs to /static/... URLs as in production
+os.environ["OUTPUT_PATH"] = str(SCRATCH / "static" / "outputs")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH / 'test.db'}"
+os.environ["LOG_FILE"] = str(SCRATCH / "app.log")
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+
+def run(coro):
+    """Run a coroutine on a fresh loop, releasing pooled DB connections bound to it afterwards."""
+    from database import engine
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def db():
+    """Fresh tables for one test."""
+    from database import Base, engine
+
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(reset())
+    yield
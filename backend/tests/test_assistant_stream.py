@@ -0,0 +1,58 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from benchmarks.fake_servers import FakeGeminiHandler, start_fake_server
+
+ANSWER = "one two three four five six seven eight"
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Run /assistant/chat/stream against the fake Gemini server; returns [(seconds, event), ...]."""
+    import routes.assistant as assistant
+    from services.gemini_service import GeminiService
+
+    server, url = start_fake_server(FakeGeminiHandler, answer=ANSWER, chunks=4, first_chunk_ms=50, chunk_ms=100)
+
+    def call(api_base: str = f"{url}/v1beta"):
+        monkeypatch.setenv("GEMINI_API_BASE", api_base)
+        monkeypatch.setenv("GEMINI_API_KEY", "fake")
+        monkeypatch.setattr(assistant, "gemini_service", GeminiService())
+
+        async def collect():
+            start = time.perf_counter()
+            response = await assistant.chat_with_assistant_stream(assistant.ChatRequest(message="hi"))
+            assert response.media_type == "text/event-stream"
+            return [(time.perf_counter() - start, event) async for event in response.body_iterator]
+
+        return asyncio.run(collect())
+
+    yield call
+    server.shutdown()
+
+
+def _data(event: str) -> dict:
+    return json.loads(event.split("data: ", 1)[1])
+
+
+def test_chunks_are_relayed_as_they_arrive(stream):
+    events = stream()
+
+    chunks = [_data(event)["text"] for _, event in events[:-1]]
+    assert len(chunks) == 4
+    assert "".join(chunks).strip() == ANSWER
+    assert events[-1][1] == "event: done\ndata: {}\n\n"
+    # The first chunk is forwarded long before the upstream answer is complete
+    assert events[-1][0] - events[0][0] >= 0.25
+
+
+def test_upstream_failure_ends_the_stream_with_an_error_event(stream):
+    # Nothing listens on port 9 (discard) here
+    events = stream("http://127.0.0.1:9/v1beta")
+
+    assert len(events) == 1
+    assert events[0][1].startswith("event: error\n")
+    assert _data(events[0][1])["detail"]
@@ -0,0 +1,139 @@
+import time
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import event, update, select
+
+from tests.conftest import run
+
+
+@pytest.fixture
+def user(db):
+    """A stored user and a bearer token for it, with an empty user cache."""
+    from auth import UserCache, create_access_token
+    from database import SessionLocal, User
+
+    async def insert():
+        async with SessionLocal() as session:
+            session.add(User(id=1, email="u1@x.io", username="u1", hashed_password="x"))
+            await session.commit()
+
+    run(insert())
+    UserCache.instance().clear()
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": "1"}))
+
+
+@pytest.fixture
+def queries():
+    """SELECTs run against the database while the test runs."""
+    from database import engine
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def _current_user(credentials):
+    from auth import get_current_user
+    from database import SessionLocal
+
+    async def lookup():
+        async with SessionLocal() as session:
+            return await get_current_user(credentials, session)
+
+    return run(lookup())
+
+
+def test_repeated_lookups_are_served_from_the_cache(user, queries):
+    first = _current_user(user)
+    assert len(queries) == 1
+
+    again = _current_user(user)
+    assert again is first
+    assert len(queries) == 1
+
+
+def test_invalid_tokens_are_rejected():
+    from auth import verify_token
+
+    with pytest.raises(HTTPException) as error:
+        verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials="not.a.jwt"))
+    assert error.value.status_code == 401
+
+
+def test_orm_update_invalidates_the_cached_user(user):
+    from database import SessionLocal, User
+
+    _current_user(user)
+
+    async def rename():
+        async with SessionLocal() as session:
+            row = await session.get(User, 1)
+            row.username = "renamed"
+            await session.commit()
+
+    run(rename())
+    assert _current_user(user).username == "renamed"
+
+
+def test_bulk_update_and_delete_invalidate_the_cache(user):
+    from auth import UserCache
+    from database import SessionLocal, User
+
+    _current_user(user)
+
+    async def execute(statement):
+        async with SessionLocal() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    run(execute(update(User).where(User.id == 1).values(username="bulk")))
+    assert UserCache.instance().get(user.credentials) is None
+    assert _current_user(user).username == "bulk"
+
+    # Reads through the ORM leave the cache alone
+    run(execute(select(User)))
+    assert UserCache.instance().get(user.credentials) is not None
+
+
+def test_cache_entries_never_outlive_the_token():
+    from auth import UserCache
+    from database import User
+
+    cache = UserCache()
+    cache.put("expired", User(id=1), token_expires_at=time.time() - 1)
+    cache.put("valid", User(id=2), token_expires_at=time.time() + 60)
+
+    assert cache.get("expired") is None
+    assert cache.get("valid").id == 2
+
+
+def test_password_hashing_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+    import auth
+
+    threads = []
+
+    def record(result):
+        def call(*args):
+            threads.append(threading.current_thread().name)
+            return result
+        return call
+
+    monkeypatch.setattr(auth, "get_password_hash", record("hashed"))
+    monkeypatch.setattr(auth, "verify_password", record(True))
+
+    async def main():
+        return await auth.get_password_hash_async("s3cret"), await auth.verify_password_async("s3cret", "hashed")
+
+    assert asyncio.run(main()) == ("hashed", True)
+    assert len(threads) == 2
+    assert all(name.startswith("bcrypt") for name in threads)
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+
+def _router(**settings):
+    from services.backend_router import BackendRouter
+
+    router = BackendRouter()
+    router.enabled = True
+    router.hedge = False
+    for name, value in settings.items():
+        setattr(router, name, value)
+    return router
+
+
+def _fail():
+    raise ConnectionError("503")
+
+
+def test_circuit_opens_after_consecutive_failures_and_skips_calls():
+    from services.backend_router import BackendUnavailable
+
+    router = _router(failure_threshold=3, open_seconds=60)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            router.call("hf", _fail)
+    assert router.snapshot()["hf"]["state"] == "open"
+
+    calls = []
+    with pytest.raises(BackendUnavailable):
+        router.call("hf", calls.append, 1)
+    assert calls == []
+
+
+def test_error_rate_opens_the_circuit_without_a_failure_streak():
+    router = _router(failure_threshold=100, min_samples=4, error_rate_threshold=0.5)
+    for ok in (True, False, True, False):
+        if ok:
+            router.call("hf", lambda: None)
+        else:
+            with pytest.raises(ConnectionError):
+                router.call("hf", _fail)
+
+    assert router.snapshot()["hf"]["state"] == "open"
+
+
+def test_half_open_probe_closes_or_reopens_the_circuit():
+    router = _router(failure_threshold=1, open_seconds=0.05)
+    with pytest.raises(ConnectionError):
+        router.call("hf", _fail)
+    time.sleep(0.06)
+
+    # One probe at a time while half open
+    assert router.allow("hf") is True
+    assert router.allow("hf") is False
+    router.record("hf", 0.01, False)
+    assert router.snapshot()["hf"]["state"] == "open"
+
+    time.sleep(0.06)
+    assert router.call("hf", lambda: "ok") == "ok"
+    assert router.snapshot()["hf"]["state"] == "closed"
+
+
+def test_hedging_falls_back_once_a_call_runs_past_p95():
+    from services.backend_router import BackendUnavailable
+
+    router = _router(hedge=True, min_samples=5, hedge_factor=1.0, hedge_min_seconds=0.05)
+    # No p95 yet: calls run inline however long they take
+    for _ in range(5):
+        router.call("hf", time.sleep, 0.01)
+    assert router.p95("hf") == pytest.approx(0.01, abs=0.02)
+
+    start = time.perf_counter()
+    with pytest.raises(BackendUnavailable):
+        router.call("hf", time.sleep, 0.5)
+    assert time.perf_counter() - start < 0.3
+    # The slow call still finishes in the background and is recorded
+    time.sleep(0.5)
+    assert router.snapshot()["hf"]["samples"] == 6
+
+
+def test_disabled_router_calls_straight_through():
+    router = _router(enabled=False, failure_threshold=1)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            router.call("hf", _fail)
+
+    assert router.call("hf", lambda: "ok") == "ok"
+    assert router.snapshot() == {}
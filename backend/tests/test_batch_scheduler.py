@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from models.batch_scheduler import BatchScheduler, SchedulerBusy
+from models.preprocess import PreparedSketch, sketch_digest
+
+
+class FakePipeline:
+    """Stands in for the denoise and postprocess stages; records every pipeline call."""
+
+    def __init__(self, denoise_seconds: float = 0.05):
+        self.denoise_seconds = denoise_seconds
+        self.calls: list[list[str]] = []
+
+    def denoise_stage(self, sketches, prompts, guidance, steps, seeds, job_ids=None, sampler="default"):
+        import time
+        from models.inference import DenoisedImage
+
+        self.calls.append(list(prompts))
+        time.sleep(self.denoise_seconds)
+        job_ids = job_ids or [None] * len(prompts)
+        return [DenoisedImage(Image.new("RGB", (8, 8)), p, None, j) for p, j in zip(prompts, job_ids)]
+
+    @staticmethod
+    def postprocess_stage(item):
+        return {"prompt": item.prompt}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    import models.inference as inference
+    from models.model_loader import ModelLoader
+    from models.preprocess import SketchPreprocessor
+
+    fake = FakePipeline()
+    monkeypatch.setattr(inference, "denoise_stage", fake.denoise_stage)
+    monkeypatch.setattr(inference, "postprocess_stage", fake.postprocess_stage)
+    monkeypatch.setattr(inference, "cached_result", lambda key: None)
+    loader = ModelLoader.instance()
+    monkeypatch.setattr(loader, "status", "ready")
+    monkeypatch.setattr(loader, "wait_until_ready", lambda timeout=None: True)
+
+    async def prepare_async(sketch_bytes, digest=None):
+        # Slow enough that concurrent submissions are all waiting here at once
+        await asyncio.sleep(0.05)
+        image = Image.new("RGB", (8, 8))
+        return PreparedSketch(digest or sketch_digest(sketch_bytes), image, image)
+
+    monkeypatch.setattr(SketchPreprocessor.instance(), "prepare_async", prepare_async)
+    return fake
+
+
+def _scheduler(**settings) -> BatchScheduler:
+    scheduler = BatchScheduler()
+    for name, value in settings.items():
+        setattr(scheduler, name, value)
+    return scheduler
+
+
+def test_queue_size_holds_under_concurrent_submits(pipeline):
+    scheduler = _scheduler(max_queue=4, max_batch=1, batch_window=0)
+
+    async def main():
+        return await asyncio.gather(
+            *(scheduler.submit(b"sketch", f"prompt {i}", 7.5, 4, i) for i in range(20)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    busy = [r for r in results if isinstance(r, SchedulerBusy)]
+    assert len(busy) == 16
+    assert sorted(r["prompt"] for r in results if isinstance(r, dict)) == [f"prompt {i}" for i in range(4)]
+    assert scheduler.depth() == 0
+
+
+def test_released_slots_admit_later_requests(pipeline):
+    scheduler = _scheduler(max_queue=1, max_batch=1, batch_window=0)
+
+    async def main():
+        first = await scheduler.submit(b"sketch", "one", 7.5, 4, 1)
+        second = await scheduler.submit(b"sketch", "two", 7.5, 4, 2)
+        return first, second
+
+    assert [r["prompt"] for r in asyncio.run(main())] == ["one", "two"]
+
+
+def test_compatible_requests_share_a_pipeline_call(pipeline):
+    scheduler = _scheduler(max_batch=4, batch_window=0.2)
+
+    async def main():
+        return await asyncio.gather(*(scheduler.submit(b"sketch", f"p{i}", 7.5, 4, i) for i in range(4)))
+
+    results = asyncio.run(main())
+    assert [r["prompt"] for r in results] == ["p0", "p1", "p2", "p3"]
+    assert sorted(map(sorted, pipeline.calls)) == [["p0", "p1", "p2", "p3"]]
+
+
+def test_incompatible_requests_run_separately(pipeline):
+    scheduler = _scheduler(max_batch=4, batch_window=0.2)
+
+    async def main():
+        # Different step counts can't share one denoise call
+        return await asyncio.gather(*(scheduler.submit(b"sketch", f"p{i}", 7.5, 4 + i % 2, i) for i in range(4)))
+
+    asyncio.run(main())
+    assert sorted(map(sorted, pipeline.calls)) == [["p0", "p2"], ["p1", "p3"]]
+
+
+def test_submit_many_is_one_call_and_respects_the_queue_bound(pipeline):
+    scheduler = _scheduler(max_queue=4, max_batch=1, batch_window=0)
+
+    async def main():
+        results = await scheduler.submit_many(b"sketch", ["a", "b", "c"], 7.5, 4, [1, 2, 3])
+        with pytest.raises(SchedulerBusy):
+            await scheduler.submit_many(b"sketch", ["a"] * 5, 7.5, 4, [1, 2, 3, 4, 5])
+        return results
+
+    assert [r["prompt"] for r in asyncio.run(main())] == ["a", "b", "c"]
+    assert pipeline.calls == [["a", "b", "c"]]
+
+
+def test_cancel_detaches_one_of_several_identical_requests(pipeline):
+    from models.progress import GenerationCancelled, ProgressTracker
+
+    pipeline.denoise_seconds = 0.3
+    scheduler = _scheduler(max_batch=1, batch_window=0)
+    tracker = ProgressTracker.instance()
+    first, second = tracker.create(4), tracker.create(4)
+
+    async def main():
+        waiters = [
+            asyncio.ensure_future(scheduler.submit(b"sketch", "same", 7.5, 4, 1, job_id=job_id))
+            for job_id in (first, second)
+        ]
+        await asyncio.sleep(0.15)
+        assert scheduler.cancel(first)
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    cancelled, result = asyncio.run(main())
+    assert isinstance(cancelled, GenerationCancelled)
+    assert result == {"prompt": "same"}
+    # The shared generation ran once and was never flagged for cancellation
+    assert pipeline.calls == [["same"]]
+    assert not tracker.is_cancelled(first)
+
+
+def test_cancel_of_the_only_request_stops_its_generation(pipeline):
+    from models.progress import GenerationCancelled, ProgressTracker
+
+    pipeline.denoise_seconds = 0.3
+    scheduler = _scheduler(max_batch=1, batch_window=0)
+    job_id = ProgressTracker.instance().create(4)
+
+    async def main():
+        waiter = asyncio.ensure_future(scheduler.submit(b"sketch", "alone", 7.5, 4, 1, job_id=job_id))
+        await asyncio.sleep(0.15)
+        assert scheduler.cancel(job_id)
+        with pytest.raises(GenerationCancelled):
+            await waiter
+
+    asyncio.run(main())
+    assert ProgressTracker.instance().is_cancelled(job_id)
+
+
+def test_queued_jobs_give_up_on_a_model_that_never_loads(pipeline, monkeypatch):
+    from models.batch_scheduler import ModelNotReady
+    from models.model_loader import ModelLoader
+
+    loader = ModelLoader.instance()
+    monkeypatch.setattr(loader, "status", "loading")
+    monkeypatch.setattr(loader, "is_ready", lambda: False)
+    monkeypatch.setattr(loader, "start_warmup", lambda *args, **kwargs: None)
+    waits = []
+
+    def wait_until_ready(timeout=None):
+        waits.append(timeout)
+        return False
+
+    monkeypatch.setattr(loader, "wait_until_ready", wait_until_ready)
+    scheduler = _scheduler(queue_during_warmup=True, warmup_wait_timeout=0.01, batch_window=0)
+
+    with pytest.raises(ModelNotReady, match="still warming up"):
+        asyncio.run(scheduler.submit(b"sketch", "prompt", 7.5, 4, 0))
+    assert waits == [0.01]
+    assert pipeline.calls == []
@@ -0,0 +1,38 @@
+from sqlalchemy import text
+
+from tests.conftest import run
+
+
+def test_init_db_adds_columns_missing_from_an_existing_table(db):
+    from database import Base, SessionLocal, engine, init_db, Generation
+
+    async def main():
+        # A generations table as created before size_bytes existed
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL, username VARCHAR NOT NULL,"
+                " hashed_password VARCHAR NOT NULL, is_active BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+            ))
+            await conn.execute(text(
+                "CREATE TABLE generations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id),"
+                " prompt TEXT NOT NULL, params JSON NOT NULL, image_path VARCHAR NOT NULL, thumbnail_path VARCHAR,"
+                " cached BOOLEAN, total_seconds FLOAT, created_at DATETIME NOT NULL)"
+            ))
+            await conn.execute(text("INSERT INTO users (id, email, username, hashed_password) VALUES (1, 'a@x.io', 'a', 'x')"))
+            await conn.execute(text(
+                "INSERT INTO generations (user_id, prompt, params, image_path, created_at)"
+                " VALUES (1, 'old', '{}', '/static/outputs/old.png', '2024-01-01 00:00:00')"
+            ))
+
+        await init_db()
+        # Running it again is a no-op
+        await init_db()
+
+        async with SessionLocal() as session:
+            session.add(Generation(user_id=1, prompt="new", params={}, image_path="/static/outputs/new.png", size_bytes=42))
+            await session.commit()
+            rows = (await session.execute(text("SELECT prompt, size_bytes FROM generations ORDER BY id"))).all()
+        return [tuple(row) for row in rows]
+
+    assert run(main()) == [("old", None), ("new", 42)]
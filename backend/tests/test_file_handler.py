@@ -0,0 +1,65 @@
+import io
+import os
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="sketch.png")
+
+
+def _leftovers() -> list[Path]:
+    from utils.file_handler import OUTPUT_PATH
+
+    return list(OUTPUT_PATH.glob(".upload_*"))
+
+
+def test_uploads_are_stored_once_by_content():
+    from utils.file_handler import stream_upload_to_disk
+
+    data = os.urandom(300_000)
+    first = asyncio.run(stream_upload_to_disk(_upload(data)))
+    again = asyncio.run(stream_upload_to_disk(_upload(data)))
+
+    assert first == again
+    assert Path(first[0]).read_bytes() == data
+    assert first[2] == len(data)
+    assert _leftovers() == []
+
+
+def test_oversized_uploads_leave_nothing_behind():
+    from utils.file_handler import stream_upload_to_disk, UploadTooLarge
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(stream_upload_to_disk(_upload(b"x" * 5000), max_bytes=4096))
+    assert _leftovers() == []
+
+
+def test_file_system_calls_stay_off_the_event_loop(monkeypatch):
+    from utils import file_handler
+
+    on_loop = []
+    loop_thread = threading.get_ident()
+
+    def watch(name, fn):
+        def call(*args, **kwargs):
+            on_loop.append((name, threading.get_ident() == loop_thread))
+            return fn(*args, **kwargs)
+        return call
+
+    monkeypatch.setattr(file_handler.os, "replace", watch("replace", os.replace))
+    monkeypatch.setattr(Path, "unlink", watch("unlink", Path.unlink))
+    monkeypatch.setattr(Path, "mkdir", watch("mkdir", Path.mkdir))
+
+    data = os.urandom(1000)
+    asyncio.run(file_handler.stream_upload_to_disk(_upload(data)))
+    asyncio.run(file_handler.stream_upload_to_disk(_upload(data)))
+    with pytest.raises(file_handler.UploadTooLarge):
+        asyncio.run(file_handler.stream_upload_to_disk(_upload(b"x" * 5000), max_bytes=4096))
+
+    assert {name for name, _ in on_loop} == {"replace", "unlink", "mkdir"}
+    assert not any(blocked for _, blocked in on_loop)
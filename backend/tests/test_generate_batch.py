@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+
+from routes.generate import GENERATE_BATCH_MAX_ITEMS, _batch_items
+
+
+def test_count_only_gives_each_variation_its_own_seed():
+    prompts, seeds = _batch_items("a dashboard", None, None, 4)
+
+    assert prompts == ["a dashboard"] * 4
+    assert len(set(seeds)) == 4
+    assert seeds == [seeds[0] + i for i in range(4)]
+
+
+def test_unseeded_batches_differ_between_calls():
+    assert _batch_items("a dashboard", None, None, 4)[1] != _batch_items("a dashboard", None, None, 4)[1]
+
+
+def test_one_seed_expands_reproducibly():
+    assert _batch_items("a dashboard", None, [7], 3) == (["a dashboard"] * 3, [7, 8, 9])
+
+
+def test_per_item_prompts_and_seeds_are_kept():
+    assert _batch_items(None, ["a", "b"], [5, 1], None) == (["a", "b"], [5, 1])
+
+
+@pytest.mark.parametrize("prompts, seeds, count", [
+    (["a", "b"], [1, 2, 3], None),
+    (["a", "b"], None, 3),
+    (None, None, GENERATE_BATCH_MAX_ITEMS + 1),
+])
+def test_invalid_shapes_are_rejected(prompts, seeds, count):
+    with pytest.raises(HTTPException) as error:
+        _batch_items("a" if prompts is None else None, prompts, seeds, count)
+    assert error.value.status_code == 400
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.conftest import run
+
+
+def _seed(rows: int) -> list[int]:
+    """rows generations for user 1 (three per timestamp, so ties need the id) and one for user 2."""
+    from database import SessionLocal, User, Generation
+
+    async def insert():
+        async with SessionLocal() as db:
+            for user_id in (1, 2):
+                db.add(User(id=user_id, email=f"u{user_id}@x.io", username=f"u{user_id}", hashed_password="x"))
+            await db.flush()
+            base = datetime(2024, 1, 1)
+            generations = [
+                Generation(user_id=1, prompt=f"p{i}", params={}, image_path=f"/static/{i}.png",
+                           created_at=base + timedelta(minutes=i // 3))
+                for i in range(rows)
+            ]
+            db.add_all(generations)
+            db.add(Generation(user_id=2, prompt="other", params={}, image_path="/static/x.png", created_at=base))
+            await db.commit()
+            return [g.id for g in generations]
+
+    return run(insert())
+
+
+def _pages(limit: int, cursor=None) -> list[list[int]]:
+    from database import SessionLocal
+    from services.history_service import list_generations
+
+    async def walk():
+        pages, next_cursor = [], cursor
+        async with SessionLocal() as db:
+            while True:
+                rows, next_cursor = await list_generations(db, 1, limit=limit, cursor=next_cursor)
+                pages.append([g.id for g in rows])
+                if next_cursor is None:
+                    return pages
+
+    return run(walk())
+
+
+def test_pages_walk_the_history_newest_first_without_gaps(db):
+    ids = _seed(10)
+    pages = _pages(limit=4)
+
+    newest_first = sorted(ids, key=lambda i: ((i - ids[0]) // 3, i), reverse=True)
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert [i for page in pages for i in page] == newest_first
+
+
+def test_last_full_page_has_no_next_cursor(db):
+    _seed(4)
+    assert [len(page) for page in _pages(limit=4)] == [4]
+
+
+def test_page_size_is_clamped(db):
+    from services.history_service import MAX_PAGE_SIZE
+
+    _seed(3)
+    assert [len(page) for page in _pages(limit=0)] == [1, 1, 1]
+    assert [len(page) for page in _pages(limit=MAX_PAGE_SIZE * 10)] == [3]
+
+
+def test_cursor_round_trips():
+    from database import Generation
+    from services.history_service import encode_cursor, decode_cursor
+
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    cursor = encode_cursor(Generation(id=42, created_at=created_at))
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "e30", "eyJ0IjoibmV2ZXIiLCJpZCI6MX0"])
+def test_malformed_cursors_are_rejected(cursor):
+    from services.history_service import decode_cursor, InvalidCursor
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
@@ -0,0 +1,92 @@
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.http_client import HttpClient
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers every POST after a delay, tracking how many requests it serves at once."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        stats = self.server.stats
+        with stats["lock"]:
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+        time.sleep(self.delay)
+        with stats["lock"]:
+            stats["active"] -= 1
+        self.send_response(200)
+        self.send_header("content-type", "text/plain")
+        self.send_header("content-length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+@pytest.fixture
+def servers():
+    """Two local hosts (distinct ports) with their concurrency stats."""
+    started = []
+    for _ in range(2):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        server.stats = {"lock": threading.Lock(), "active": 0, "peak": 0}
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        started.append(server)
+    yield [(f"http://127.0.0.1:{s.server_address[1]}", s.stats) for s in started]
+    for server in started:
+        server.shutdown()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_PER_HOST", "2")
+    return HttpClient()
+
+
+def test_requests_to_one_host_are_capped(servers, client):
+    (url, stats), _ = servers
+
+    async def main():
+        return await asyncio.gather(*(client.post(url, content=b"x") for _ in range(6)))
+
+    responses = asyncio.run(main())
+    assert [r.text for r in responses] == ["ok"] * 6
+    assert stats["peak"] == 2
+
+
+def test_a_busy_host_does_not_hold_up_another(servers, client):
+    (busy_url, _), (other_url, other_stats) = servers
+
+    async def main():
+        busy = [asyncio.create_task(client.post(busy_url)) for _ in range(8)]
+        await asyncio.sleep(0.02)
+        start = time.perf_counter()
+        await client.post(other_url)
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*busy)
+        return elapsed
+
+    # The busy host has four rounds of requests queued; the other host answers in one
+    assert asyncio.run(main()) < 3 * SlowHandler.delay
+    assert other_stats["peak"] == 1
+
+
+def test_sync_callers_share_the_same_limit(servers, client):
+    (url, stats), _ = servers
+    threads = [threading.Thread(target=client.post_sync, args=(url,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats["peak"] == 2
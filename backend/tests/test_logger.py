@@ -0,0 +1,16 @@
+import multiprocessing
+
+import pytest
+
+from utils.logger import writes_log_file
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("MainProcess", True),
+    # uvicorn --reload / --workers run the server in spawned children
+    ("SpawnProcess-1", True),
+    ("inference-worker-0", False),
+])
+def test_only_inference_workers_skip_the_log_file(monkeypatch, name, expected):
+    monkeypatch.setattr(multiprocessing.current_process(), "name", name)
+    assert writes_log_file() is expected
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+import pytest
+
+from models.progress import ProgressTracker, GenerationCancelled
+
+
+def test_job_lifecycle_is_streamed_to_subscribers():
+    tracker = ProgressTracker()
+    job_id = tracker.create(3)
+
+    async def main():
+        events = []
+
+        async def listen():
+            async for event in tracker.subscribe(job_id):
+                events.append(event)
+
+        listener = asyncio.create_task(listen())
+        await asyncio.sleep(0)
+
+        # Published from the inference thread, as the denoise loop does
+        def generate():
+            tracker.start(job_id)
+            for step in (1, 2):
+                tracker.update(job_id, step, preview="p" if step == 2 else None)
+            tracker.finish(job_id)
+
+        await asyncio.to_thread(generate)
+        await asyncio.wait_for(listener, 1)
+        return events
+
+    events = asyncio.run(main())
+    assert [(e["status"], e["step"]) for e in events] == [
+        ("queued", 0), ("running", 0), ("running", 1), ("running", 2), ("done", 3),
+    ]
+    assert events[-1]["preview"] == "p"
+    assert events[-1]["eta_seconds"] is not None
+
+
+def test_late_subscribers_see_the_final_state():
+    tracker = ProgressTracker()
+    job_id = tracker.create(2)
+    tracker.start(job_id)
+    tracker.finish(job_id, status="failed", error="boom")
+
+    async def collect():
+        return [event async for event in tracker.subscribe(job_id)]
+
+    assert asyncio.run(collect()) == [
+        {"job_id": job_id, "status": "failed", "step": 0, "total_steps": 2, "eta_seconds": None, "error": "boom"},
+    ]
+
+
+def test_cancelling_a_queued_job_ends_it_at_once():
+    tracker = ProgressTracker()
+    cancelled = []
+    tracker.add_cancel_listener(cancelled.append)
+    job_id = tracker.create(5, "client-id")
+
+    assert tracker.cancel(job_id) is True
+    assert tracker.get(job_id).status == "cancelled"
+    assert tracker.is_cancelled(job_id)
+    assert cancelled == ["client-id"]
+    # Nothing left to cancel
+    assert tracker.cancel(job_id) is False
+    assert tracker.cancel("unknown") is False
+
+
+def test_cancelling_a_running_job_flags_it_until_the_loop_stops():
+    tracker = ProgressTracker()
+    job_id = tracker.create(5)
+    tracker.start(job_id)
+
+    assert tracker.cancel(job_id) is True
+    assert tracker.get(job_id).status == "running"
+    assert tracker.is_cancelled(job_id)
+    # The denoise loop notices and finishes the job; it ends up cancelled, not done
+    tracker.finish(job_id)
+    assert tracker.get(job_id).status == "cancelled"
+
+
+def test_finished_jobs_are_pruned_after_the_retention_period():
+    tracker = ProgressTracker()
+    tracker.retention_seconds = 0
+    finished = tracker.create(1)
+    tracker.finish(finished)
+    running = tracker.create(1)
+    tracker.start(running)
+
+    tracker.create(1)
+    assert tracker.get(finished) is None
+    assert tracker.get(running) is not None
+
+
+class DisconnectingRequest:
+    """Reports the client gone after a number of polls."""
+
+    def __init__(self, connected_polls: int):
+        self.polls = 0
+        self.connected_polls = connected_polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.polls > self.connected_polls
+
+
+def test_client_disconnect_cancels_the_generation(monkeypatch):
+    import routes.generate as generate
+
+    monkeypatch.setattr(generate, "DISCONNECT_POLL_SECONDS", 0.01)
+    tracker = ProgressTracker.instance()
+    job_id = tracker.create(10)
+    tracker.start(job_id)
+    stopped = threading.Event()
+
+    async def generation():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.set()
+            raise
+
+    with pytest.raises(GenerationCancelled):
+        asyncio.run(generate._await_unless_disconnected(DisconnectingRequest(2), [job_id], generation()))
+    assert stopped.is_set()
+    assert tracker.is_cancelled(job_id)
+
+
+def test_connected_clients_get_the_result(monkeypatch):
+    import routes.generate as generate
+
+    monkeypatch.setattr(generate, "DISCONNECT_POLL_SECONDS", 0.01)
+
+    async def generation():
+        await asyncio.sleep(0.05)
+        return "image"
+
+    request = DisconnectingRequest(1000)
+    assert asyncio.run(generate._await_unless_disconnected(request, [], generation())) == "image"
+    assert request.polls >= 1
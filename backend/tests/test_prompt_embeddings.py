@@ -0,0 +1,81 @@
+import pytest
+
+from models.prompt_embeddings import PromptEmbeddingCache
+
+
+class FakePipe:
+    def __init__(self):
+        self.text_encoder = object()
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """Texts actually run through the text encoder; embeddings are (encoder, text) tuples."""
+    calls = []
+
+    def encode(pipe, text):
+        calls.append(text)
+        return (pipe.text_encoder, text)
+
+    monkeypatch.setattr(PromptEmbeddingCache, "_encode", staticmethod(encode))
+    return calls
+
+
+def test_repeated_prompts_skip_the_encoder(encoded):
+    cache = PromptEmbeddingCache()
+    pipe = FakePipe()
+
+    first = cache.positive(pipe, "a login page")
+    assert cache.positive(pipe, "a login page") is first
+    assert encoded == ["a login page"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_prompt_is_evicted(encoded):
+    cache = PromptEmbeddingCache()
+    cache.max_entries = 2
+    pipe = FakePipe()
+
+    cache.positive(pipe, "a")
+    cache.positive(pipe, "b")
+    # Touching a makes b the oldest
+    cache.positive(pipe, "a")
+    cache.positive(pipe, "c")
+    cache.positive(pipe, "a")
+    cache.positive(pipe, "b")
+
+    assert encoded == ["a", "b", "c", "b"]
+    assert cache.stats()["entries"] == 2
+
+
+def test_negative_prompt_is_encoded_once_and_never_evicted(encoded):
+    cache = PromptEmbeddingCache()
+    cache.max_entries = 1
+    pipe = FakePipe()
+
+    for text in ("a", "b", "c"):
+        cache.positive(pipe, text)
+        cache.negative(pipe, "blurry")
+
+    assert encoded.count("blurry") == 1
+
+
+def test_a_reloaded_pipeline_drops_embeddings_of_the_old_encoder(encoded):
+    cache = PromptEmbeddingCache()
+    old, new = FakePipe(), FakePipe()
+    cache.positive(old, "a")
+    cache.negative(old, "blurry")
+
+    assert cache.positive(new, "a") == (new.text_encoder, "a")
+    assert cache.negative(new, "blurry") == (new.text_encoder, "blurry")
+    assert encoded == ["a", "blurry", "a", "blurry"]
+
+
+def test_zero_size_disables_caching(encoded):
+    cache = PromptEmbeddingCache()
+    cache.max_entries = 0
+    pipe = FakePipe()
+
+    cache.positive(pipe, "a")
+    cache.positive(pipe, "a")
+    assert encoded == ["a", "a"]
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """A fresh in-memory cache; call with backend="sqlite" for the disk tier."""
+    from services.response_cache import ResponseCache
+
+    def build(backend: str = "memory", **env) -> ResponseCache:
+        monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "true")
+        monkeypatch.setenv("RESPONSE_CACHE_BACKEND", backend)
+        monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "responses.sqlite3"))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return ResponseCache()
+
+    return build
+
+
+def test_keys_ignore_case_and_whitespace_but_not_params():
+    from services.response_cache import make_key, normalize_prompt
+
+    assert normalize_prompt("  Login   PAGE\n") == normalize_prompt("login page")
+    assert make_key("chat", normalize_prompt("Login  page"), {"a": 1, "b": 2}) == \
+        make_key("chat", "login page", {"b": 2, "a": 1})
+    assert make_key("chat", "login page", {"a": 1}) != make_key("chat", "login page", {"a": 2})
+    # Parts are delimited, so shifting text between them changes the key
+    assert make_key("ab", "c") != make_key("a", "bc")
+
+
+def test_entries_expire_after_the_ttl(cache):
+    responses = cache(RESPONSE_CACHE_TTL=0.05)
+
+    async def scenario():
+        await responses.set("k", "v")
+        assert await responses.get("k") == "v"
+        await asyncio.sleep(0.06)
+        return await responses.get("k")
+
+    assert asyncio.run(scenario()) is None
+    assert responses.stats()["entries"] == 0
+    assert (responses.hits, responses.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    responses = cache(RESPONSE_CACHE_MAX_ENTRIES=2)
+
+    async def scenario():
+        await responses.set("a", "1")
+        await responses.set("b", "2")
+        # Reading a makes b the least recently used
+        await responses.get("a")
+        await responses.set("c", "3")
+        return [await responses.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["1", None, "3"]
+
+
+def test_sqlite_tier_survives_a_restart(cache):
+    first = cache("sqlite")
+    asyncio.run(first.set("k", "v"))
+
+    restarted = cache("sqlite")
+    assert restarted.stats()["entries"] == 0
+    assert asyncio.run(restarted.get("k")) == "v"
+    # Promoted to memory on the way
+    assert restarted.stats()["entries"] == 1
+    assert restarted.stats()["backend"] == "sqlite"
+
+
+def test_sqlite_tier_skips_expired_rows_and_prunes_to_its_cap(cache):
+    responses = cache("sqlite", RESPONSE_CACHE_TTL=0.05, RESPONSE_CACHE_DISK_MAX_ENTRIES=10)
+    store = responses._store
+
+    async def scenario():
+        await responses.set("old", "v")
+        await asyncio.sleep(0.06)
+        assert await asyncio.to_thread(store.get, "old") is None
+        responses.ttl = 3600
+        # Pruning runs every 100 writes
+        for i in range(99):
+            await responses.set(f"k{i}", "v")
+
+    asyncio.run(scenario())
+    rows = store._conn.execute("SELECT key FROM responses").fetchall()
+    assert len(rows) == 10
+    assert ("old",) not in rows
+
+
+def test_disabled_cache_stores_nothing(cache):
+    responses = cache(RESPONSE_CACHE_ENABLED="false")
+    asyncio.run(responses.set("k", "v"))
+
+    assert asyncio.run(responses.get("k")) is None
+    assert responses.stats()["entries"] == 0
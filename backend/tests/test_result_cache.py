@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from utils.result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("RESULT_CACHE_MAX_ENTRIES", "3")
+    return ResultCache()
+
+
+def _output(tmp_path: Path, name: str, data: bytes = b"image") -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_put_then_get_hardlinks_the_output(cache, tmp_path):
+    source = _output(tmp_path, "out.png")
+    stored = cache.put("abc", source)
+
+    assert cache.get("abc") == stored
+    assert stored.stat().st_ino == Path(source).stat().st_ino
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_stored_by_another_process_are_adopted_without_a_scan(cache, tmp_path, monkeypatch):
+    (cache.directory / "fromworker.png").write_bytes(b"image")
+    monkeypatch.setattr(Path, "glob", lambda *args, **kwargs: pytest.fail("directory scanned"))
+
+    assert cache.get("fromworker") == cache.directory / "fromworker.png"
+    assert cache.get("nothere") is None
+
+
+def test_put_of_an_existing_key_keeps_the_stored_file(cache, tmp_path):
+    first = cache.put("abc", _output(tmp_path, "one.png", b"first"))
+    inode = first.stat().st_ino
+
+    again = cache.put("abc", _output(tmp_path, "two.png", b"second"))
+    assert again == first
+    assert again.stat().st_ino == inode
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache, tmp_path):
+    for key in ("a", "b", "c"):
+        cache.put(key, _output(tmp_path, f"{key}.png"))
+    cache.get("a")
+    cache.put("d", _output(tmp_path, "d.png"))
+
+    assert cache.get("b") is None
+    assert not (cache.directory / "b.png").exists()
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
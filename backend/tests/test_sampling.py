@@ -0,0 +1,34 @@
+import pytest
+
+from models import model_loader
+from models.model_loader import PRESETS, SAMPLERS, UnknownSampler, resolve_sampling
+
+
+def test_defaults_come_from_the_default_sampler(monkeypatch):
+    monkeypatch.setattr(model_loader, "DEFAULT_SAMPLER", "euler")
+    assert resolve_sampling() == ("euler", SAMPLERS["euler"][2])
+
+
+def test_preset_picks_sampler_and_steps():
+    sampler, steps = PRESETS["draft"]
+    assert resolve_sampling("draft") == (sampler, steps)
+
+
+@pytest.mark.parametrize("sampler, steps, expected", [
+    # Explicit values win over the preset, each on its own
+    ("ddim", None, ("ddim", PRESETS["final"][1])),
+    (None, 7, (PRESETS["final"][0], 7)),
+    ("euler_a", 9, ("euler_a", 9)),
+])
+def test_explicit_values_override_the_preset(sampler, steps, expected):
+    assert resolve_sampling("final", sampler, steps) == expected
+
+
+def test_explicit_sampler_without_preset_uses_its_own_default_steps():
+    assert resolve_sampling(sampler="unipc") == ("unipc", SAMPLERS["unipc"][2])
+
+
+@pytest.mark.parametrize("preset, sampler", [("nope", None), (None, "nope"), ("draft", "nope")])
+def test_unknown_names_are_rejected(preset, sampler):
+    with pytest.raises(UnknownSampler, match="nope"):
+        resolve_sampling(preset, sampler)
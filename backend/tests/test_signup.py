@@ -0,0 +1,83 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import event
+
+from tests.conftest import run
+
+
+@pytest.fixture
+def signup(db, monkeypatch):
+    """POST /auth/signup against a fresh database; returns (status, body, SELECTs issued)."""
+    import routes.auth
+    from database import engine
+
+    async def fake_hash(password: str) -> str:
+        return f"hashed:{password}"
+
+    # Hashing is covered by the auth tests; keep these fast and independent of bcrypt
+    monkeypatch.setattr(routes.auth, "get_password_hash_async", fake_hash)
+    app = FastAPI()
+    app.include_router(routes.auth.router, prefix="/auth")
+
+    def post(**fields):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        async def call():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/auth/signup", json={"password": "pw", **fields})
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = run(call())
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        return response.status_code, response.json(), statements
+
+    return post
+
+
+def test_signup_checks_email_and_username_in_one_query(signup):
+    status, body, selects = signup(email="a@x.io", username="a")
+
+    assert status == 200
+    assert body["username"] == "a"
+    assert body["access_token"]
+    assert len(selects) == 1
+
+
+@pytest.mark.parametrize("fields, detail", [
+    ({"email": "a@x.io", "username": "other"}, "Email already registered"),
+    ({"email": "other@x.io", "username": "a"}, "Username already taken"),
+    # Both taken (by different users): the email is reported
+    ({"email": "a@x.io", "username": "b"}, "Email already registered"),
+])
+def test_taken_email_or_username_is_rejected(signup, fields, detail):
+    signup(email="a@x.io", username="a")
+    signup(email="b@x.io", username="b")
+
+    status, body, selects = signup(**fields)
+    assert (status, body["detail"]) == (400, detail)
+    assert len(selects) == 1
+
+
+def test_losing_a_signup_race_is_reported_not_raised(signup, monkeypatch):
+    import routes.auth
+    from database import SessionLocal, User
+
+    async def hash_while_another_signup_commits(password: str) -> str:
+        # The uniqueness check already passed; a concurrent request takes the email meanwhile
+        async with SessionLocal() as db:
+            db.add(User(email="a@x.io", username="winner", hashed_password="x"))
+            await db.commit()
+        return "hashed"
+
+    monkeypatch.setattr(routes.auth, "get_password_hash_async", hash_while_another_signup_commits)
+    status, body, _ = signup(email="a@x.io", username="a")
+
+    assert (status, body["detail"]) == (400, "Email or username already registered")
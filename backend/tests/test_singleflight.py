@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+class Work:
+    """A controllable computation that counts how often it was started."""
+
+    def __init__(self, value="result", error: Exception | None = None):
+        self.value = value
+        self.error = error
+        self.started = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def test_concurrent_calls_share_one_computation():
+    async def main():
+        flight, work = SingleFlight("test"), Work()
+        waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.in_flight() == 1
+        work.release.set()
+        return await asyncio.gather(*waiters), work, flight
+
+    results, work, flight = asyncio.run(main())
+    assert results == ["result"] * 3
+    assert work.started == 1
+    assert flight.in_flight() == 0
+
+
+def test_errors_reach_every_waiter():
+    async def main():
+        flight, work = SingleFlight("test"), Work(error=ValueError("boom"))
+        waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(main())] == [ValueError, ValueError]
+
+
+def test_different_keys_run_separately_and_finished_keys_are_forgotten():
+    async def main():
+        flight, work = SingleFlight("test"), Work()
+        work.release.set()
+        await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        await flight.do("a", work)
+        return work.started
+
+    assert asyncio.run(main()) == 3
+
+
+def test_one_waiter_leaving_does_not_cancel_the_others():
+    abandoned = []
+
+    async def main():
+        flight, work = SingleFlight("test"), Work()
+        first = asyncio.ensure_future(flight.do("key", work, on_abandon=lambda: abandoned.append(1)))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, work
+
+    result, work = asyncio.run(main())
+    assert result == "result"
+    assert not work.cancelled
+    assert abandoned == []
+
+
+def test_last_waiter_leaving_cancels_the_computation():
+    abandoned = []
+
+    async def main():
+        flight, work = SingleFlight("test"), Work()
+        waiters = [
+            asyncio.ensure_future(flight.do("key", work, on_abandon=lambda: abandoned.append(1))) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return work, flight
+
+    work, flight = asyncio.run(main())
+    assert work.cancelled
+    assert abandoned == [1]
+    assert flight.in_flight() == 0
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+@pytest.fixture
+def client():
+    from utils.file_handler import OUTPUT_PATH
+    from utils.static_files import OutputStaticFiles
+
+    app = FastAPI()
+    app.mount("/static", OutputStaticFiles(directory=OUTPUT_PATH.parent), name="static")
+    return TestClient(app)
+
+
+def _url(path) -> str:
+    from utils.file_handler import web_path
+
+    return web_path(path)
+
+
+def test_content_named_outputs_are_immutable(client):
+    from utils.file_handler import publish_image
+    from utils.static_files import IMMUTABLE_CACHE_CONTROL
+
+    image = Image.new("RGB", (32, 32), (10, 20, 30))
+    out_path, _, data = publish_image(image)
+    # The same image always lands on the same name
+    assert publish_image(image)[0] == out_path
+
+    response = client.get(_url(out_path))
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    partial = client.get(_url(out_path), headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == data[:10]
+
+
+def test_latest_is_revalidated_against_its_etag(client):
+    from utils.file_handler import publish_image
+
+    _, latest_path, _ = publish_image(Image.new("RGB", (32, 32), (1, 2, 3)))
+    response = client.get(_url(latest_path))
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    cached = client.get(_url(latest_path), headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["cache-control"] == "no-cache"
+
+    # A new generation replaces latest; the old ETag no longer matches
+    _, _, data = publish_image(Image.new("RGB", (48, 48), (4, 5, 6)))
+    refreshed = client.get(_url(latest_path), headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.content == data
+
+
+def test_outputs_without_a_content_hash_are_not_immutable(client):
+    from utils.file_handler import GENERATED_DIR, OUTPUT_PATH
+
+    # Named like outputs written before content naming (random 16 hex characters)
+    legacy = OUTPUT_PATH / GENERATED_DIR / "out_0123456789abcdef.png"
+    legacy.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (32, 32)).save(legacy)
+
+    response = client.get(_url(legacy))
+    assert response.headers["cache-control"] == "no-cache"
+    variant = client.get(_url(legacy) + "?variant=thumb", follow_redirects=False)
+    assert variant.status_code == 307
+    assert variant.headers["cache-control"] == "no-cache"
+
+
+def test_variant_redirects_to_its_content_hashed_url(client):
+    from utils.file_handler import publish_image
+    from utils.static_files import IMMUTABLE_CACHE_CONTROL
+
+    out_path, latest_path, _ = publish_image(Image.new("RGB", (600, 400), (200, 100, 0)))
+    redirect = client.get(_url(out_path) + "?variant=thumb", follow_redirects=False)
+    assert redirect.status_code == 307
+    assert redirect.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    location = redirect.headers["location"]
+    variant = client.get(location)
+    assert variant.status_code == 200
+    assert variant.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    # The hash in the name is the ETag
+    assert variant.headers["etag"] == f'"{location.rsplit(".", 2)[1]}"'
+    assert max(Image.open(io.BytesIO(variant.content)).size) <= 256
+
+    assert client.get(_url(latest_path) + "?variant=thumb").status_code == 400
+    assert client.get(location + "?variant=thumb").status_code == 400
@@ -0,0 +1,155 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from tests.conftest import run
+
+
+@pytest.fixture
+def outputs(db):
+    """Six outputs written like inference does: unique file, result cache link, latest link to the newest."""
+    from utils.file_handler import OUTPUT_PATH, publish_image
+    from utils.result_cache import ResultCache
+
+    for path in (OUTPUT_PATH / "generated", ResultCache.instance().directory):
+        for old in sorted(path.rglob("*"), reverse=True) if path.exists() else []:
+            old.rmdir() if old.is_dir() else old.unlink()
+    paths = []
+    now = time.time()
+    for i in range(6):
+        out_path, _, _ = publish_image(Image.new("RGB", (32, 32), (i * 40, 0, 0)))
+        ResultCache.instance().put(f"key{i}", out_path)
+        # Oldest first, a minute apart
+        os.utime(out_path, (now - 3600 + i * 60, now - 3600 + i * 60))
+        paths.append(Path(out_path))
+    return paths
+
+
+def _manager(**settings):
+    from utils.storage import StorageManager
+
+    manager = StorageManager()
+    manager.policy = "age"
+    for name, value in settings.items():
+        setattr(manager, name, value)
+    return manager
+
+
+def _record(user_id: int, paths: list[Path]):
+    from database import SessionLocal, User, Generation
+    from utils.file_handler import web_path
+
+    async def insert():
+        async with SessionLocal() as db:
+            db.add(User(id=user_id, email=f"u{user_id}@x.io", username=f"u{user_id}", hashed_password="x"))
+            await db.flush()
+            for path in paths:
+                db.add(Generation(
+                    user_id=user_id, prompt="p", params={}, image_path=web_path(path), size_bytes=path.stat().st_size,
+                ))
+            await db.commit()
+
+    run(insert())
+
+
+def _history_paths() -> set[str]:
+    from database import SessionLocal, Generation
+
+    async def query():
+        async with SessionLocal() as db:
+            return set((await db.execute(select(Generation.image_path))).scalars())
+
+    return run(query())
+
+
+def test_global_quota_counts_bytes_through_cache_links(outputs):
+    size = outputs[0].stat().st_size
+    manager = _manager(max_bytes=1)
+    total = run(manager.collect(dry_run=True))["total_bytes"]
+    # Room for everything but two outputs
+    manager.max_bytes = total - 2 * size
+    report = run(manager.collect(dry_run=True))
+
+    assert report["by_reason"]["quota"]["bytes"] >= 2 * size
+    assert report["freed_bytes"] >= 2 * size
+    assert report["remaining_bytes"] <= manager.max_bytes
+    assert {s["path"] for s in report["sample"]} == {str(outputs[0]), str(outputs[1])}
+    assert all(path.exists() for path in outputs)
+
+
+def test_eviction_removes_cache_links_and_only_deleted_history(outputs):
+    from utils.file_handler import web_path
+    from utils.result_cache import ResultCache
+
+    _record(1, outputs)
+    manager = _manager(max_age_seconds=3600 - 150)
+    report = run(manager.collect())
+
+    # The three outputs older than the cutoff go, together with their cache links
+    assert report["by_reason"]["age"]["bytes"] > 0
+    assert [path.exists() for path in outputs] == [False, False, False, True, True, True]
+    cache_dir = ResultCache.instance().directory
+    assert sorted(p.stem for p in cache_dir.iterdir()) == ["key3", "key4", "key5"]
+    assert _history_paths() == {web_path(path) for path in outputs[3:]}
+
+
+def test_latest_output_is_never_evicted(outputs):
+    from utils.file_handler import web_path
+
+    _record(1, outputs)
+    # Everything is past the age limit, but the newest output is still linked as latest
+    manager = _manager(max_age_seconds=1, max_bytes=1)
+    report = run(manager.collect())
+
+    assert outputs[-1].exists()
+    assert not any(path.exists() for path in outputs[:-1])
+    assert report["remaining_bytes"] > 0
+    assert _history_paths() == {web_path(outputs[-1])}
+
+
+def test_user_quota_keeps_rows_of_files_still_on_disk(outputs):
+    from utils.file_handler import web_path
+
+    _record(2, outputs[3:])
+    # User 2's only room is the newest file, which latest pins; the two older ones go
+    manager = _manager(user_quota_bytes=outputs[5].stat().st_size)
+    report = run(manager.collect())
+
+    assert {s["path"] for s in report["sample"] if s["reason"] == "user_quota"} == {str(outputs[3]), str(outputs[4])}
+    assert [path.exists() for path in outputs] == [True, True, True, False, False, True]
+    assert _history_paths() == {web_path(outputs[5])}
+
+
+def test_user_quota_keeps_images_shared_with_other_users(outputs):
+    from utils.file_handler import web_path
+
+    _record(2, outputs[3:5])
+    # The same image came out for user 3 as well (content naming reuses the file)
+    _record(3, [outputs[3]])
+    manager = _manager(user_quota_bytes=1)
+    run(manager.collect())
+
+    assert [path.exists() for path in outputs[3:5]] == [True, False]
+    assert _history_paths() == {web_path(outputs[3])}
+
+
+def test_user_quota_follows_cache_hit_rows_to_their_output(outputs):
+    from utils.file_handler import web_path
+    from utils.result_cache import ResultCache
+
+    cache_dir = ResultCache.instance().directory
+    # Cache hits record the result cache link as the image path
+    hits = [cache_dir / "key4.png", cache_dir / "key5.png"]
+    _record(2, [outputs[3], *hits])
+    # Room for the newest image only, which latest pins anyway
+    manager = _manager(user_quota_bytes=outputs[5].stat().st_size)
+    report = run(manager.collect())
+
+    assert report["stale_history_rows"] == 0
+    assert [path.exists() for path in outputs[3:]] == [False, False, True]
+    assert [path.exists() for path in hits] == [False, True]
+    assert _history_paths() == {web_path(hits[1])}
@@ -0,0 +1,97 @@
+import asyncio
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from utils.upload_limit import UploadLimitMiddleware
+
+LIMIT = 4096
+BOUNDARY = "testboundary"
+
+
+def _app(handled: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_body_bytes=LIMIT)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"size": len(await file.read())}
+
+    return app
+
+
+def _multipart(size: int) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"s.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _call(app, body: bytes, chunk: int, declare_length: bool) -> tuple[int, int]:
+    """Send body in chunks straight to the ASGI app; returns (status, chunks the app read)."""
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if declare_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/upload", "raw_path": b"/upload", "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+    read = 0
+    status = []
+
+    async def receive():
+        nonlocal read
+        if read < len(chunks):
+            read += 1
+            return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    asyncio.run(app(scope, receive, send))
+    return status[0], read
+
+
+def test_uploads_under_the_limit_pass_through():
+    handled = []
+    response = TestClient(_app(handled)).post("/upload", files={"file": ("s.png", b"x" * 1000, "image/png")})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+    assert handled == ["s.png"]
+
+
+def test_declared_oversized_body_is_refused_unread():
+    handled = []
+    status, read = _call(_app(handled), _multipart(LIMIT * 10), chunk=1024, declare_length=True)
+
+    assert status == 413
+    assert read == 0
+    assert handled == []
+
+
+def test_undeclared_oversized_body_is_cut_off_while_streaming():
+    handled = []
+    body = _multipart(LIMIT * 10)
+    status, read = _call(_app(handled), body, chunk=1024, declare_length=False)
+
+    assert status == 413
+    assert read <= LIMIT // 1024 + 1
+    assert handled == []
+
+
+def test_other_bodies_are_not_limited():
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_body_bytes=LIMIT)
+
+    @app.post("/echo")
+    async def echo(payload: dict):
+        return {"size": len(payload["text"])}
+
+    response = TestClient(app).post("/echo", json={"text": "x" * LIMIT * 2})
+    assert response.json() == {"size": LIMIT * 2}
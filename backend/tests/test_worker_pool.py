@@ -0,0 +1,120 @@
+import time
+import queue
+import asyncio
+import threading
+
+import pytest
+
+from models.worker_pool import InferenceWorkerPool
+
+
+class FakeProcess:
+    def __init__(self, **kwargs):
+        self.alive = False
+        self.exitcode = None
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def kill(self):
+        self.alive = False
+        self.exitcode = -9
+
+
+class FakeContext:
+    """Stands in for the spawn context: worker processes that never run, plain queues."""
+
+    Process = FakeProcess
+    Queue = queue.Queue
+
+
+@pytest.fixture
+def pool():
+    pool = InferenceWorkerPool()
+    pool._ctx = FakeContext()
+    pool._results = queue.Queue()
+    pool.status = "loading"
+    return pool
+
+
+def _start(pool: InferenceWorkerPool, size: int, ready: bool):
+    pool.size = size
+    for index in range(size):
+        pool._spawn(index)
+    if ready:
+        pool._ready_workers.update(range(size))
+        pool.status = "ready"
+
+
+def test_worker_dying_while_loading_fails_the_pool(pool):
+    _start(pool, 2, ready=False)
+    pool._processes[0].kill()
+    pool._reap_dead_workers()
+    assert pool.status == "loading"
+
+    pool._processes[1].kill()
+    pool._reap_dead_workers()
+    assert pool.status == "failed"
+    assert "exit code -9" in pool.error
+    assert pool.wait_until_ready(timeout=0) is False
+
+
+def test_dead_workers_are_noticed_under_steady_traffic(pool):
+    _start(pool, 1, ready=False)
+    pool.reap_interval = 0.05
+    threading.Thread(target=pool._read_results, daemon=True).start()
+    pool._processes[0].kill()
+
+    deadline = time.monotonic() + 2
+    while pool.status != "failed" and time.monotonic() < deadline:
+        # The reader never waits long enough for the results queue to run empty
+        pool._results.put(("progress", None, {"job_id": "x", "step": 1}))
+        time.sleep(0.001)
+    assert pool.status == "failed"
+
+
+def test_respawned_worker_is_not_dispatched_through_stale_idle_entries(pool):
+    _start(pool, 2, ready=True)
+
+    async def main():
+        pool._idle = asyncio.Queue()
+        pool._idle_loop = asyncio.get_running_loop()
+        pool._mark_idle(0)
+        pool._mark_idle(1)
+        # Worker 0 dies while idle and comes back
+        pool._processes[0].kill()
+        pool._reap_dead_workers()
+        pool._processes[0].start()
+        pool._ready_workers.add(0)
+        pool._mark_idle(0)
+        tasks = [asyncio.create_task(pool.run_batch(i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        waiting = [task.done() for task in tasks]
+        for task in tasks:
+            task.cancel()
+        return waiting
+
+    # One batch per live worker; the entry left behind by the dead worker 0 is skipped
+    assert asyncio.run(main()) == [False, False, False]
+    assert pool._jobs[0].qsize() == 1
+    assert pool._jobs[1].qsize() == 1
+    assert len(pool._pending) == 2
+
+
+def test_waiting_dispatches_fail_once_no_worker_is_left(pool):
+    _start(pool, 1, ready=False)
+
+    async def main():
+        pool._idle = asyncio.Queue()
+        pool._idle_loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(pool.run_batch(i)) for i in range(2)]
+        await asyncio.sleep(0)
+        pool._processes[0].kill()
+        pool._reap_dead_workers()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -1,39 +1,291 @@
 import os
+import re
+import base64
+import asyncio
+import glob
+import hashlib
 from pathlib import Path
 from fastapi import UploadFile
 import secrets
 from PIL import Image
 import io
 
+from utils.metrics import STAGE_SECONDS
+
 
 OUTPUT_PATH = Path(os.getenv("OUTPUT_PATH", "./static/outputs"))
 OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-LATEST_FILENAME = os.getenv("LATEST_FILENAME", "latest.png")
+
+# Output encoding: format -> (PIL format, extension, mime type)
+IMAGE_FORMATS = {
+    "png": ("PNG", ".png", "image/png"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "jpg": ("JPEG", ".jpg", "image/jpeg"),
+}
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png").lower()
+if OUTPUT_FORMAT not in IMAGE_FORMATS:
+    raise RuntimeError(f"Unsupported OUTPUT_FORMAT '{OUTPUT_FORMAT}'; use one of {sorted(IMAGE_FORMATS)}")
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", "90"))
+PNG_OPTIMIZE = os.getenv("PNG_OPTIMIZE", "false").lower() in {"1", "true", "yes"}
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "6"))
+LATEST_FILENAME = os.getenv("LATEST_FILENAME", f"latest{IMAGE_FORMATS[OUTPUT_FORMAT][1]}")
+
+# Derived copies of each output for gallery/history views: variant -> max edge (None keeps full size).
+# Stored in a variants/ folder next to the source as <stem>.<variant>.<content hash><ext>,
+# so every variant URL is immutable. VARIANTS_ON_SAVE are made when the output is written,
+# the rest on first request (/static/...?variant=<name>).
+VARIANTS = {
+    "thumb": int(os.getenv("THUMBNAIL_SIZE", "256")),
+    "medium": int(os.getenv("MEDIUM_SIZE", "1024")),
+    "webp": None,
+}
+VARIANT_FORMAT = os.getenv("VARIANT_FORMAT", "webp").lower()
+VARIANT_QUALITY = int(os.getenv("VARIANT_QUALITY", "80"))
+VARIANTS_ON_SAVE = [v.strip() for v in os.getenv("VARIANTS_ON_SAVE", "thumb").split(",") if v.strip() in VARIANTS]
+VARIANTS_DIRNAME = "variants"
+
+# Files are spread over hash-prefix subdirectories (<kind>/ab/cd/<name>) so no single
+# directory grows past a few thousand entries; latest.* and cache/ stay at the top level
+GENERATED_DIR = "generated"
+SKETCHES_DIR = "sketches"
+
+# Uploads are read in fixed-size chunks so memory per upload stays bounded
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "20")) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_KB", "256")) * 1024
+
+
+def storage_path(kind: str, name: str, create: bool = True) -> Path:
+    """Sharded location of a file; the same name always maps to the same path."""
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    directory = OUTPUT_PATH / kind / digest[:2] / digest[2:4]
+    if create:
+        directory.mkdir(parents=True, exist_ok=True)
+    return directory / name
+
+
+def web_path(path: str | Path) -> str:
+    # If path is within backend/static, expose under /static
+    try:
+        abs_path = os.path.abspath(path)
+        # Find 'static' segment and rebuild as /static/...
+        parts = abs_path.replace("\\", "/").split("/static/")
+        if len(parts) == 2:
+            return f"/static/{parts[1]}"
+    except Exception:
+        pass
+    # Fallback to original
+    return str(path).replace("\\", "/")
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+        self.max_bytes = max_bytes
+
+
+def _check_declared_size(upload_file: UploadFile, max_bytes: int):
+    # Reject early when the multipart parser already knows the size
+    size = getattr(upload_file, "size", None)
+    if size is not None and size > max_bytes:
+        raise UploadTooLarge(max_bytes)
 
 
+async def read_upload_bytes(upload_file: UploadFile, max_bytes: int | None = None) -> bytes:
+    """Read an upload that must be held in memory (e.g. for inference), enforcing the size cap."""
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    _check_declared_size(upload_file, max_bytes)
+    buf = bytearray()
+    while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+        if len(buf) + len(chunk) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        buf += chunk
+    return bytes(buf)
+
+
+def _store_sketch(tmp_path: Path, name: str) -> Path:
+    """Move a fully written upload to its content-addressed place (blocking; run off the loop)."""
+    fpath = storage_path(SKETCHES_DIR, name)
+    if fpath.exists():
+        # Same content already stored
+        tmp_path.unlink(missing_ok=True)
+    else:
+        os.replace(tmp_path, fpath)
+    return fpath
+
+
+async def stream_upload_to_disk(upload_file: UploadFile, max_bytes: int | None = None) -> tuple[str, str, int]:
+    """
+    Stream an upload to the sketches store chunk by chunk, hashing as it is written.
+
+    The file is content-addressed, so re-uploading the same sketch reuses the
+    existing file. Returns (path, sha256 hex digest, size in bytes).
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    _check_declared_size(upload_file, max_bytes)
+    ext = Path(upload_file.filename or "").suffix or ".png"
+    tmp_path = OUTPUT_PATH / f".upload_{secrets.token_hex(8)}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    # All file system work goes through a worker thread so the event loop never blocks on I/O
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
+    await asyncio.to_thread(f.close)
+
+    sha = digest.hexdigest()
+    fpath = await asyncio.to_thread(_store_sketch, tmp_path, f"sketch_{sha[:16]}{ext}")
+    return str(fpath), sha, size
 
 
 async def save_upload_file(upload_file: UploadFile) -> str:
-# create secure filename
-    ext = Path(upload_file.filename).suffix or ".png"
-    token = secrets.token_hex(8)
-    fname = f"sketch_{token}{ext}"
-    fpath = OUTPUT_PATH / fname
+    path, _, _ = await stream_upload_to_disk(upload_file)
+    return path
 
 
-    contents = await upload_file.read()
-    with open(fpath, "wb") as f:
-        f.write(contents)
-    return str(fpath)
 
 
+def encode_image(image: Image.Image, fmt: str | None = None, quality: int | None = None) -> tuple[bytes, str]:
+    """Encode once into memory. Returns (encoded bytes, file extension)."""
+    fmt = (fmt or OUTPUT_FORMAT).lower()
+    pil_format, ext, _ = IMAGE_FORMATS[fmt]
+    quality = quality or OUTPUT_QUALITY
+    buf = io.BytesIO()
+    if pil_format == "PNG":
+        # optimize=True runs extra compression passes: smaller files, slower encode
+        image.save(buf, format="PNG", optimize=PNG_OPTIMIZE, compress_level=PNG_COMPRESS_LEVEL)
+    elif pil_format == "WEBP":
+        image.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        image.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buf.getvalue(), ext
+
+
+def mime_for_path(path: str) -> str:
+    ext = Path(path).suffix.lower()
+    for _, format_ext, mime in IMAGE_FORMATS.values():
+        if format_ext == ext:
+            return mime
+    return "application/octet-stream"
+
+
+def _write_atomic(path: Path, data: bytes):
+    # Readers (the static server) never observe a half-written file
+    tmp = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def find_variant(source: str | Path, variant: str) -> Path | None:
+    source = Path(source)
+    return next((source.parent / VARIANTS_DIRNAME).glob(f"{glob.escape(source.stem)}.{variant}.*"), None)
+
+
+def ensure_variant(source: str | Path, variant: str, image: Image.Image | None = None) -> str:
+    """
+    Return the path of a derived variant of an output file, creating it on first use.
+    Pass the already-decoded image to skip reading source back. Raises KeyError
+    for an unknown variant.
+    """
+    max_edge = VARIANTS[variant]
+    source = Path(source)
+    existing = find_variant(source, variant)
+    if existing is not None:
+        return str(existing)
+    if image is None:
+        image = Image.open(source)
+    # convert() always copies, so thumbnail() below never touches the caller's image
+    derived = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    if max_edge:
+        derived.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    data, ext = encode_image(derived, VARIANT_FORMAT, VARIANT_QUALITY)
+    target = source.parent / VARIANTS_DIRNAME / f"{source.stem}.{variant}.{hashlib.sha256(data).hexdigest()[:16]}{ext}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(target, data)
+    return str(target)
+
+
+# Names derived from the file's own bytes: generated outputs (<prefix>_<20 hex>), uploaded
+# sketches (sketch_<16 hex>) and variants (<stem>.<variant>.<16 hex>). Such a name can never
+# be reused for other content; everything else (latest.*, cache entries, outputs written
+# before content naming) may be replaced in place.
+_CONTENT_HASHED_NAME = re.compile(
+    r"(?:[a-z]+_[0-9a-f]{20}|sketch_[0-9a-f]{16}|[^.]+\.[a-z]+\.[0-9a-f]{16})\.[A-Za-z0-9]+"
+)
+
+
+def content_name(data: bytes, prefix: str, ext: str) -> str:
+    """File name for an output that embeds a hash of its encoded bytes."""
+    return f"{prefix}_{hashlib.sha256(data).hexdigest()[:20]}{ext}"
+
+
+def _write_content(path: Path, data: bytes):
+    """Write a content-named file, or refresh the mtime of the identical file already there."""
+    try:
+        # Keeps age-based storage GC from evicting an image that was just produced again
+        os.utime(path)
+    except FileNotFoundError:
+        _write_atomic(path, data)
+
+
+def is_immutable_output(path: str | Path) -> bool:
+    """True for files under OUTPUT_PATH whose content-hashed name guarantees they never change."""
+    path = Path(path).resolve()
+    return path.is_relative_to(OUTPUT_PATH.resolve()) and _CONTENT_HASHED_NAME.fullmatch(path.name) is not None
+
+
+def publish_latest(source: str | Path) -> str:
+    """Atomically point the stable latest file at source (hardlink + rename, copy as fallback)."""
+    latest_path = OUTPUT_PATH / LATEST_FILENAME
+    tmp = latest_path.with_name(f".{latest_path.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        os.link(source, tmp)
+    except OSError:
+        with open(source, "rb") as f:
+            data = f.read()
+        with open(tmp, "wb") as f:
+            f.write(data)
+    os.replace(tmp, latest_path)
+    return str(latest_path)
+
+
+def publish_image(image: Image.Image, prefix: str = "out") -> tuple[str, str, bytes]:
+    """
+    Encode image once, write the unique file and publish it as latest.
+
+    Returns (unique_file_path, latest_file_path, encoded_bytes) so callers can
+    reuse the bytes (e.g. for a base64 response) without encoding again.
+    """
+    with STAGE_SECONDS.time("encode"):
+        data, ext = encode_image(image)
+    fpath = storage_path(GENERATED_DIR, content_name(data, prefix, ext))
+    with STAGE_SECONDS.time("save"):
+        _write_content(fpath, data)
+    latest_path = str(OUTPUT_PATH / LATEST_FILENAME)
+    try:
+        latest_path = publish_latest(fpath)
+    except Exception:
+        pass
+    return str(fpath), latest_path, data
 
 
 def save_image_to_outputs(image: Image.Image, prefix: str = "out") -> str:
-    token = secrets.token_hex(8)
-    fname = f"{prefix}_{token}.png"
-    fpath = OUTPUT_PATH / fname
-    image.save(fpath, format="PNG")
+    data, ext = encode_image(image)
+    fpath = storage_path(GENERATED_DIR, content_name(data, prefix, ext))
+    _write_content(fpath, data)
     return str(fpath)
 
 
@@ -42,18 +294,12 @@ def save_image_and_latest(image: Image.Image, prefix: str = "out") -> tuple[str,
 
     Returns (unique_file_path, latest_file_path)
     """
-    unique = save_image_to_outputs(image, prefix=prefix)
-    latest_path = OUTPUT_PATH / LATEST_FILENAME
-    try:
-        image.save(latest_path, format="PNG")
-    except Exception:
-        pass
-    return unique, str(latest_path)
+    unique, latest_path, _ = publish_image(image, prefix=prefix)
+    return unique, latest_path
 
 
 
 
 def image_to_base64(image: Image.Image) -> str:
-    buf = io.BytesIO()
-    image.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode()
\ No newline at end of file
+    data, _ = encode_image(image)
+    return base64.b64encode(data).decode()
\ No newline at end of file
@@ -1,48 +1,164 @@
-# import logging
-#
-#
-# def get_logger(name: str = __name__):
-#     logger = logging.getLogger(name)
-#     logging.basicConfig(level=logging.INFO)
-import logging
+import os
 import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import multiprocessing
+import threading
+import logging.handlers
 from pathlib import Path
 
-def get_logger(name: str = __name__):
+# Attributes every LogRecord has; anything else came in through extra= and is logged as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_setup_lock = threading.Lock()
+_listener: logging.handlers.QueueListener | None = None
+
+# Name prefix of the inference worker processes (models.worker_pool); they log to the
+# console only, so app.log rotation never races between processes
+CONSOLE_ONLY_PROCESS_PREFIX = "inference-worker"
+
+
+def writes_log_file() -> bool:
     """
-    Create and return a configured logger instance.
-    This ensures consistent logging format across the backend.
+    False inside an inference worker. Other child processes (uvicorn's --reload
+    and --workers servers) keep the file log. The name is checked rather than
+    an env flag because a spawned worker sets up logging while importing its
+    modules, before its entry point runs.
     """
-    logger = logging.getLogger(name)
+    return not multiprocessing.current_process().name.startswith(CONSOLE_ONLY_PROCESS_PREFIX)
 
-    # Avoid re-adding handlers if logger already exists
-    if not logger.handlers:
-        logger.setLevel(logging.INFO)
 
-        # Console handler
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.INFO)
+def truncate(value, limit: int | None = None):
+    """Shorten long strings anywhere inside value (dicts, lists, tuples) so payloads stay loggable."""
+    limit = limit if limit is not None else int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+    if isinstance(value, str):
+        if len(value) > limit:
+            return f"{value[:limit]}...[{len(value) - limit} chars truncated]"
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, dict):
+        return {str(k): truncate(v, limit) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate(v, limit) for v in value]
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return truncate(str(value), limit)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra= fields are included after truncation."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = truncate(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records (LOG_DEBUG_SAMPLE_RATE); a call can
+    override its own rate with extra={"sample": 0.1}. Runs before the record
+    is queued, so dropped lines cost almost nothing.
+    """
 
-        # File handler (optional: stores logs in backend/logs/app.log)
-        log_dir = Path(__file__).resolve().parent.parent / "logs"
-        log_dir.mkdir(parents=True, exist_ok=True)
-        file_handler = logging.FileHandler(log_dir / "app.log")
-        file_handler.setLevel(logging.INFO)
+    def __init__(self, debug_rate: float):
+        super().__init__()
+        self.debug_rate = debug_rate
 
-        # Common log format
-        formatter = logging.Formatter(
-            "[%(asctime)s] [%(levelname)s] [%(name)s]: %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample", None)
+        if rate is None:
+            rate = self.debug_rate if record.levelno <= logging.DEBUG else 1.0
+        return rate >= 1.0 or random.random() < rate
 
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message on the caller's thread and drops
+    # extra fields' structure; keep the record as is and let the listener format it.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging():
+    """
+    Route all logging through a QueueHandler; a QueueListener thread does the
+    formatting and the (rotating) file and console writes, so callers on the
+    event loop never block on I/O.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        if os.getenv("LOG_FORMAT", "json").lower() == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                "[%(asctime)s] [%(levelname)s] [%(name)s]: %(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S"
+            )
+
+        handlers: list[logging.Handler] = []
+        console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+        # Rotating file in backend/logs/app.log; LOG_FILE="" turns it off.
+        default_file = Path(__file__).resolve().parent.parent / "logs" / "app.log"
+        log_file = os.getenv("LOG_FILE", str(default_file))
+        if log_file and writes_log_file():
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file,
+                maxBytes=int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024),
+                backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+                encoding="utf-8",
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        # Bounded so a log storm can't grow memory without limit; overflow is dropped
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        queue_handler = _PreparedQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))))
+
+        root = logging.getLogger()
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.addHandler(queue_handler)
+        # httpx logs every request at INFO; those calls are covered by the metrics instead
+        logging.getLogger("httpx").setLevel(os.getenv("LOG_HTTPX_LEVEL", "WARNING").upper())
 
-        # Add handlers
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
 
-        # Prevent duplicate logs
-        logger.propagate = False
 
-    return logger
+def get_logger(name: str = __name__):
+    """
+    Return a logger that writes through the shared non-blocking pipeline.
+    This ensures consistent logging format across the backend.
+    """
+    setup_logging()
+    return logging.getLogger(name)
@@ -0,0 +1,256 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds, from sub-millisecond image ops to multi-minute CPU denoising
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._children: dict[tuple, object] = {}
+        self._mutex = threading.Lock()
+
+    def labels(self, *values):
+        """Child for one label combination; cache it at call sites on hot paths."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._mutex:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_mutex")
+
+    def __init__(self):
+        self.value = 0.0
+        self._mutex = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._mutex:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._mutex:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_label_text(self.label_names, key)} {_number(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), fn=None):
+        super().__init__(name, help_text, labels)
+        # fn() is read at scrape time: a number, or {label values tuple: number} for labelled gauges
+        self.fn = fn
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self) -> list[str]:
+        if self.fn is None:
+            return super()._samples()
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(value)}"]
+        return [
+            f"{self.name}{_label_text(self.label_names, key if isinstance(key, tuple) else (key,))} {_number(v)}"
+            for key, v in value.items()
+            if v is not None
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_mutex")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._mutex = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._mutex:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self, *label_values):
+        return self.labels(*label_values).time()
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._mutex:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound) if bound == float("inf") else repr(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {cumulative}")
+        return lines
+
+
+# Singleton registry rendered by GET /metrics in the Prometheus text format.
+# Recording is a dict lookup plus a locked add; all formatting happens at scrape time.
+class MetricsRegistry:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._mutex = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._mutex:
+            # Re-registering a name (e.g. a module imported twice) returns the existing metric
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = (), fn=None) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._mutex:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry.instance()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "designmate_generation_stage_seconds", "Time spent in each stage of sketch-to-image generation.", ("stage",)
+)
+EXTERNAL_SECONDS = REGISTRY.histogram(
+    "designmate_external_request_seconds", "Latency of calls to external APIs.", ("service",)
+)
+EXTERNAL_ERRORS = REGISTRY.counter(
+    "designmate_external_request_errors_total", "Failed calls to external APIs.", ("service",)
+)
+
+
+# cache name -> stats() callable returning at least hits, misses and hit_ratio
+_CACHE_STATS: dict = {}
+
+
+def _cache_field(field: str):
+    return lambda: {(cache,): stats()[field] for cache, stats in list(_CACHE_STATS.items())}
+
+
+REGISTRY.gauge("designmate_cache_hits", "Cache hits since start.", ("cache",), _cache_field("hits"))
+REGISTRY.gauge("designmate_cache_misses", "Cache misses since start.", ("cache",), _cache_field("misses"))
+REGISTRY.gauge("designmate_cache_hit_ratio", "Cache hit ratio since start.", ("cache",), _cache_field("hit_ratio"))
+
+
+def register_cache(cache: str, stats_fn):
+    """Report hits, misses and hit ratio of a cache at scrape time."""
+    _CACHE_STATS[cache] = stats_fn
+
+
+@contextmanager
+def track_external(service: str):
+    """Time an external call and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.labels(service).inc()
+        raise
+    finally:
+        EXTERNAL_SECONDS.labels(service).observe(time.perf_counter() - start)
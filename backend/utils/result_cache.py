@@ -0,0 +1,159 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from utils.file_handler import OUTPUT_PATH, OUTPUT_FORMAT, IMAGE_FORMATS
+from utils.metrics import register_cache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Singleton content-addressed store of finished generations.
+# Keys are hex digests computed by the caller; values are image files on disk.
+class ResultCache:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.enabled = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+        self.directory = Path(os.getenv("RESULT_CACHE_DIR", str(OUTPUT_PATH / "cache")))
+        self.max_bytes = int(float(os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+        # Extensions an entry can have, the current output format's first
+        self.extensions = list(dict.fromkeys(
+            [IMAGE_FORMATS[OUTPUT_FORMAT][1]] + [ext for _, ext, _ in IMAGE_FORMATS.values()]
+        ))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (path, size in bytes), least recently used first
+        self._index: OrderedDict[str, tuple[Path, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._mutex = threading.Lock()
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._rebuild_index()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _rebuild_index(self):
+        # Oldest access first so the LRU order survives restarts
+        entries = []
+        for path in self.directory.iterdir():
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(entries):
+            self._index[path.stem] = (path, size)
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._index and (self._total_bytes > self.max_bytes or len(self._index) > self.max_entries):
+            _, (path, size) = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _adopt(self, key: str) -> tuple[Path, int] | None:
+        # Another process (e.g. an inference worker) may have stored this key;
+        # a stat per known extension instead of scanning the directory
+        for ext in self.extensions:
+            path = self.directory / f"{key}{ext}"
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            self._index[key] = (path, size)
+            self._total_bytes += size
+            return self._index[key]
+        return None
+
+    def get(self, key: str) -> Path | None:
+        """Return the cached file for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._mutex:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._adopt(key)
+            if entry is None or not entry[0].exists():
+                if entry is not None:
+                    # File removed behind our back
+                    self._index.pop(key, None)
+                    self._total_bytes -= entry[1]
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            # Persist recency for the index rebuild on restart
+            os.utime(entry[0])
+        except OSError:
+            pass
+        return entry[0]
+
+    def put(self, key: str, source_path: str) -> Path | None:
+        """Store a copy of source_path under key; returns the cached path."""
+        if not self.enabled:
+            return None
+        with self._mutex:
+            entry = self._index.get(key) or self._adopt(key)
+            if entry is not None and entry[0].exists():
+                # Same key, same result: keep the stored file rather than relinking it
+                self._index.move_to_end(key)
+                return entry[0]
+        source = Path(source_path)
+        target = self.directory / f"{key}{source.suffix}"
+        try:
+            if target.exists():
+                target.unlink()
+            # Hardlink when possible so a cache entry costs no extra disk space
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+            size = target.stat().st_size
+        except OSError as e:
+            logger.warning("Result cache store failed", extra={"error": str(e)})
+            return None
+        with self._mutex:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._index[key] = (target, size)
+            self._total_bytes += size
+            self._evict()
+        return target
+
+    def stats(self) -> dict:
+        with self._mutex:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+register_cache("result", lambda: ResultCache.instance().stats())
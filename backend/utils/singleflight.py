@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from utils.metrics import REGISTRY
+
+CALLS = REGISTRY.counter(
+    "designmate_singleflight_calls_total",
+    "Calls through a single-flight group; role=shared calls reused an in-flight computation.",
+    ("group", "role"),
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "on_abandon")
+
+    def __init__(self, task: asyncio.Task, on_abandon: Callable[[], None] | None):
+        self.task = task
+        self.waiters = 0
+        self.on_abandon = on_abandon
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key onto one computation: the first
+    caller starts it, later callers await the same result (or exception).
+
+    The computation runs as its own task, so one caller going away doesn't
+    cancel it for the others; it is cancelled (and on_abandon called) only
+    when every caller has gone. Nothing is kept once it finishes, so this
+    complements the result caches rather than replacing them.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: dict[Hashable, _Call] = {}
+        self._leader = CALLS.labels(group, "leader")
+        self._shared = CALLS.labels(group, "shared")
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], on_abandon: Callable[[], None] | None = None):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()), on_abandon)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self._leader.inc()
+        else:
+            self._shared.inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Last interested caller left: stop the work instead of finishing it for nobody
+                if call.on_abandon is not None:
+                    call.on_abandon()
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,83 @@
+import os
+import re
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, RedirectResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from utils.file_handler import LATEST_FILENAME, VARIANTS, VARIANTS_DIRNAME, ensure_variant, is_immutable_output
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Files that can be replaced in place (latest.*, outputs without a content hash):
+# cacheable, but revalidated against the ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# <stem>.<variant>.<content hash>.<ext> as written by ensure_variant
+_VARIANT_NAME = re.compile(r"\.[a-z]+\.([0-9a-f]{16})\.[a-z]+$")
+
+
+class OutputStaticFiles(StaticFiles):
+    """
+    StaticFiles for generated outputs: content-hashed files are served with a
+    one-year immutable Cache-Control, everything else (latest.* included) with
+    no-cache so clients revalidate (ETag/304 and Range requests come from
+    Starlette). ?variant=<name> lazily creates a derived copy and redirects to
+    its content-hashed URL.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        variant = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("variant")
+        if variant and scope["method"] in ("GET", "HEAD"):
+            return await self._variant_response(path, variant[0], scope)
+        return await super().get_response(path, scope)
+
+    async def _variant_response(self, path: str, variant: str, scope: Scope) -> Response:
+        if variant not in VARIANTS:
+            raise HTTPException(status_code=400, detail=f"Unknown variant '{variant}'; use one of {sorted(VARIANTS)}")
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if stat_result is None or not os.path.isfile(full_path):
+            raise HTTPException(status_code=404)
+        # latest.* changes on every generation, and variants of variants make no sense
+        if Path(full_path).name == LATEST_FILENAME or Path(full_path).parent.name == VARIANTS_DIRNAME:
+            raise HTTPException(status_code=400, detail="Variants are only available for unique outputs")
+        try:
+            variant_path = await anyio.to_thread.run_sync(ensure_variant, full_path, variant)
+        except OSError:
+            raise HTTPException(status_code=404)
+        url = "/".join(p for p in (scope.get("root_path", "").rstrip("/"), os.path.dirname(path), VARIANTS_DIRNAME) if p)
+        # The target is content-hashed, but the redirect can only be cached for good
+        # when the source can't be replaced by another image under the same name
+        cache_control = IMMUTABLE_CACHE_CONTROL if is_immutable_output(full_path) else REVALIDATE_CACHE_CONTROL
+        return RedirectResponse(
+            f"{url}/{Path(variant_path).name}",
+            status_code=307,
+            headers={"Cache-Control": cache_control},
+        )
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if is_immutable_output(full_path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            match = _VARIANT_NAME.search(os.path.basename(full_path))
+            if match:
+                # Content-hashed name: the hash is a strong validator across servers
+                response.headers["ETag"] = f'"{match.group(1)}"'
+        else:
+            # Starlette's ETag (mtime + size) changes whenever the file is replaced
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        # Checked after the headers are final so a 304 carries them too
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,347 @@
+"""
+Retention and quotas for OUTPUT_PATH.
+
+A background task periodically scans the output tree and evicts generated
+images and uploaded sketches (together with their variants) that are past
+STORAGE_MAX_AGE_DAYS, belong to a user over STORAGE_USER_QUOTA_MB, or are
+needed to bring the whole tree under STORAGE_MAX_GB. Files are ordered by
+access time (STORAGE_EVICTION_POLICY=lru) or write time (age).
+
+Outputs are hard-linked into the result cache and as latest.*, so bytes are
+counted per inode: an evicted output takes its result cache links with it,
+while an output that latest.* (or any link outside the tree) still points at
+is kept. Outputs are named by content, so one file can back several history
+rows; a user over quota only loses files no other user's rows point at.
+History rows are only dropped for files that are gone from disk.
+
+Dry run from backend/:
+    python -m utils.storage --dry-run
+"""
+import os
+import time
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import select, delete, func
+
+from database import SessionLocal, Generation
+from utils.file_handler import (
+    OUTPUT_PATH, LATEST_FILENAME, GENERATED_DIR, SKETCHES_DIR, VARIANTS_DIRNAME, web_path
+)
+from utils.metrics import REGISTRY
+from utils.result_cache import ResultCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Paths listed in a report, so a dry run shows what would go without dumping millions of lines
+REPORT_SAMPLE_SIZE = 20
+
+
+@dataclass
+class _Candidate:
+    path: Path
+    stamp: float
+    # Bytes released on delete, counting each inode once
+    freeable: int
+    variants: list[Path] = field(default_factory=list)
+    # Result cache hard links of this file, unlinked with it so its bytes are really freed
+    links: list[Path] = field(default_factory=list)
+    reason: str | None = None
+
+
+class StorageManager:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.root = OUTPUT_PATH
+        # 0 turns a limit off
+        self.max_bytes = int(float(os.getenv("STORAGE_MAX_GB", "0")) * 1024 ** 3)
+        self.user_quota_bytes = int(float(os.getenv("STORAGE_USER_QUOTA_MB", "0")) * 1024 ** 2)
+        self.max_age_seconds = float(os.getenv("STORAGE_MAX_AGE_DAYS", "0")) * 86400
+        self.policy = os.getenv("STORAGE_EVICTION_POLICY", "lru").lower()
+        self.interval = float(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "3600"))
+        self.dry_run = os.getenv("STORAGE_GC_DRY_RUN", "false").lower() in {"1", "true", "yes"}
+        self.last_report: dict | None = None
+        self._task: asyncio.Task | None = None
+        self._running = asyncio.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_bytes or self.user_quota_bytes or self.max_age_seconds)
+
+    def start(self):
+        """Run collect() every STORAGE_GC_INTERVAL_SECONDS on the current event loop."""
+        if self._task is None and self.enabled and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.collect(self.dry_run)
+            except Exception:
+                logger.exception("Storage GC failed")
+
+    def _walk(self, root: Path):
+        """Yield (directory, entry, stat) for every non-hidden file under root."""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                    continue
+                try:
+                    yield directory, entry, entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+    def _scan(self) -> tuple[dict[Path, _Candidate], int, int]:
+        """Walk the tree once: evictable files keyed by path, plus total files and unique bytes on disk."""
+        files = list(self._walk(self.root))
+        cache_dir = ResultCache.instance().directory
+        # Links from outside OUTPUT_PATH still count, so look at a relocated result cache too
+        if not cache_dir.is_relative_to(self.root):
+            external = list(self._walk(cache_dir))
+        else:
+            external = []
+        links: dict[tuple[int, int], list[Path]] = {}
+        for directory, entry, st in files + external:
+            links.setdefault((st.st_dev, st.st_ino), []).append(Path(entry.path))
+
+        def removable(path: Path, st) -> tuple[list[Path], int] | None:
+            # The file's result cache links and the bytes freed by unlinking them all with it;
+            # None while something else (latest.*, an unknown link) keeps the inode alive
+            others = [p for p in links[(st.st_dev, st.st_ino)] if p != path]
+            cached = [p for p in others if p.parent == cache_dir]
+            if len(others) != len(cached) or st.st_nlink != 1 + len(others):
+                return None
+            return cached, st.st_size
+
+        candidates: dict[Path, _Candidate] = {}
+        variants: dict[tuple[Path, str], list[tuple[Path, int]]] = {}
+        sources: set[tuple[Path, str]] = set()
+        seen_inodes: set[tuple[int, int]] = set()
+        total_bytes = 0
+        use_atime = self.policy == "lru"
+        evictable_roots = (self.root / GENERATED_DIR, self.root / SKETCHES_DIR)
+
+        for directory, entry, st in files:
+            if (st.st_dev, st.st_ino) not in seen_inodes:
+                seen_inodes.add((st.st_dev, st.st_ino))
+                total_bytes += st.st_size
+            path = Path(entry.path)
+            if directory.name == VARIANTS_DIRNAME:
+                # <stem>.<variant>.<hash><ext> belongs to <stem> in the parent directory
+                key = (directory.parent, entry.name.split(".", 1)[0])
+                variants.setdefault(key, []).append((path, st.st_size if st.st_nlink == 1 else 0))
+                continue
+            sources.add((directory, path.stem))
+            legacy = directory == self.root and entry.name != LATEST_FILENAME
+            if legacy or any(directory.is_relative_to(r) for r in evictable_roots):
+                found = removable(path, st)
+                if found is None:
+                    continue
+                stamp = st.st_atime if use_atime else st.st_mtime
+                candidates[path] = _Candidate(path, stamp, found[1], links=found[0])
+
+        by_stem = {(c.path.parent, c.path.stem): c for c in candidates.values()}
+        for key, files in variants.items():
+            owner = by_stem.get(key)
+            if owner is None:
+                if key not in sources:
+                    # Source already gone: the variants are orphans and can go right away
+                    for path, freeable in files:
+                        candidates[path] = _Candidate(path, 0.0, freeable, reason="orphan")
+                # Otherwise the source isn't ours to evict (e.g. pinned as latest)
+                continue
+            owner.variants.extend(path for path, _ in files)
+            owner.freeable += sum(freeable for _, freeable in files)
+        return candidates, len(files), total_bytes
+
+    def _row_file(self, image_path: str) -> Path:
+        """File behind a history row's image_path (a generated output or a result cache link)."""
+        prefix = web_path(self.root).rstrip("/") + "/"
+        if image_path.startswith(prefix):
+            return self.root / image_path[len(prefix):]
+        # web_path() leaves paths outside backend/static (e.g. a relocated result cache) as they are
+        return Path(image_path)
+
+    async def _over_quota_rows(self, db, candidates: dict[Path, _Candidate]) -> list[int]:
+        """
+        Mark the oldest files of each user over quota. Returns the ids of rows whose
+        file is already gone; rows of marked files are dropped once those are deleted.
+        """
+        over = await db.execute(
+            select(Generation.user_id, func.sum(Generation.size_bytes))
+            .group_by(Generation.user_id)
+            .having(func.sum(Generation.size_bytes) > self.user_quota_bytes)
+        )
+        # Cache hits record the result cache link, which goes together with its output
+        by_path = dict(candidates)
+        for candidate in candidates.values():
+            by_path.update((link, candidate) for link in candidate.links)
+        gone = []
+        for user_id, used in over.all():
+            rows = await db.execute(
+                select(Generation.id, Generation.image_path, Generation.size_bytes)
+                .where(Generation.user_id == user_id)
+                .order_by(Generation.created_at, Generation.id)
+            )
+            for row_id, image_path, size_bytes in rows.all():
+                if used <= self.user_quota_bytes:
+                    break
+                path = self._row_file(image_path)
+                candidate = by_path.get(path)
+                if candidate is None:
+                    if path.exists():
+                        # Still linked elsewhere (e.g. latest): keep the file and its row
+                        continue
+                    gone.append(row_id)
+                elif candidate.reason is None:
+                    shared = await db.execute(
+                        select(Generation.id).where(
+                            Generation.image_path.in_([web_path(p) for p in (candidate.path, *candidate.links)]),
+                            Generation.user_id != user_id,
+                        ).limit(1)
+                    )
+                    if shared.first() is not None:
+                        # The same image is in another user's history: keep the file and this row
+                        continue
+                    candidate.reason = "user_quota"
+                used -= size_bytes or 0
+        return gone
+
+    def _select(self, candidates: dict[Path, _Candidate], total_bytes: int) -> int:
+        """Mark age and global-quota evictions; returns the bytes left afterwards."""
+        cutoff = time.time() - self.max_age_seconds
+        remaining = total_bytes
+        for candidate in candidates.values():
+            if candidate.reason is None and self.max_age_seconds and candidate.stamp < cutoff:
+                candidate.reason = "age"
+            if candidate.reason is not None:
+                remaining -= candidate.freeable
+        if self.max_bytes and remaining > self.max_bytes:
+            for candidate in sorted(candidates.values(), key=lambda c: c.stamp):
+                if remaining <= self.max_bytes:
+                    break
+                # Deleting a file that frees nothing wouldn't get the tree any closer to the cap
+                if candidate.reason is None and candidate.freeable > 0:
+                    candidate.reason = "quota"
+                    remaining -= candidate.freeable
+        return remaining
+
+    @staticmethod
+    def _delete(evicted: list[_Candidate]) -> list[_Candidate]:
+        """Unlink each candidate with its cache links and variants; returns those whose file is gone."""
+        deleted = []
+        for candidate in evicted:
+            try:
+                candidate.path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning("Storage GC could not delete file", extra={"path": str(candidate.path), "error": str(e)})
+                continue
+            deleted.append(candidate)
+            for path in (*candidate.links, *candidate.variants):
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning("Storage GC could not delete file", extra={"path": str(path), "error": str(e)})
+        return deleted
+
+    async def collect(self, dry_run: bool = False) -> dict:
+        """One GC pass. With dry_run nothing is deleted; the report says what would be."""
+        async with self._running:
+            start = time.perf_counter()
+            candidates, scanned, total_bytes = await asyncio.to_thread(self._scan)
+
+            row_ids: list[int] = []
+            if self.user_quota_bytes:
+                async with SessionLocal() as db:
+                    row_ids = await self._over_quota_rows(db, candidates)
+            remaining = self._select(candidates, total_bytes)
+            evicted = [c for c in candidates.values() if c.reason is not None]
+
+            if not dry_run and (evicted or row_ids):
+                deleted = await asyncio.to_thread(self._delete, evicted)
+                # Drop history entries whose image is gone (the output or one of its cache links),
+                # in chunks to stay under parameter limits
+                image_paths = [
+                    web_path(path) for c in deleted if c.reason != "orphan" for path in (c.path, *c.links)
+                ]
+                async with SessionLocal() as db:
+                    for i in range(0, len(row_ids), 500):
+                        await db.execute(delete(Generation).where(Generation.id.in_(row_ids[i:i + 500])))
+                    for i in range(0, len(image_paths), 500):
+                        await db.execute(delete(Generation).where(Generation.image_path.in_(image_paths[i:i + 500])))
+                    await db.commit()
+                EVICTED_FILES.inc(sum(1 + len(c.links) + len(c.variants) for c in deleted))
+
+            by_reason: dict[str, dict] = {}
+            for candidate in evicted:
+                stats = by_reason.setdefault(candidate.reason, {"files": 0, "bytes": 0})
+                stats["files"] += 1 + len(candidate.links) + len(candidate.variants)
+                stats["bytes"] += candidate.freeable
+            report = {
+                "dry_run": dry_run,
+                "policy": self.policy,
+                "scanned_files": scanned,
+                "total_bytes": total_bytes,
+                "evicted_files": sum(s["files"] for s in by_reason.values()),
+                "freed_bytes": total_bytes - remaining,
+                "remaining_bytes": remaining,
+                "stale_history_rows": len(row_ids),
+                "by_reason": by_reason,
+                "sample": [
+                    {"path": str(c.path), "bytes": c.freeable, "reason": c.reason}
+                    for c in evicted[:REPORT_SAMPLE_SIZE]
+                ],
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            self.last_report = report
+            logger.info("Storage GC finished", extra={k: v for k, v in report.items() if k != "sample"})
+            return report
+
+
+EVICTED_FILES = REGISTRY.counter("designmate_storage_evicted_files_total", "Files removed by the storage GC.")
+REGISTRY.gauge(
+    "designmate_storage_bytes",
+    "Bytes under OUTPUT_PATH as of the last storage GC scan.",
+    fn=lambda: (StorageManager.instance().last_report or {}).get("total_bytes"),
+)
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be evicted without deleting")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(StorageManager.instance().collect(args.dry_run)), indent=2))
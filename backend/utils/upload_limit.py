@@ -0,0 +1,55 @@
+import os
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from utils.file_handler import UPLOAD_MAX_BYTES, UploadTooLarge
+
+# Room for the form fields and multipart boundaries around the file itself
+UPLOAD_FORM_OVERHEAD = int(os.getenv("UPLOAD_FORM_OVERHEAD_KB", "64")) * 1024
+
+
+class UploadLimitMiddleware:
+    """
+    Enforce the upload cap on multipart request bodies before they are parsed.
+
+    The form parser spools the whole body (to memory, then disk) before any
+    handler runs, so a cap checked in the handler comes too late. Bodies that
+    declare a Content-Length over the limit are refused without being read;
+    others (e.g. chunked) are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app, max_body_bytes: int | None = None):
+        self.app = app
+        self.max_body_bytes = max_body_bytes or UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = str(UploadTooLarge(UPLOAD_MAX_BYTES))
+        declared = headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > self.max_body_bytes:
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised while the form is parsed, so the app answers with a 413
+                    raise HTTPException(status_code=413, detail=detail, headers={"Connection": "close"})
+            return message
+
+        await self.app(scope, limited_receive, send)
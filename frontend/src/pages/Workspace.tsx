@@ -113,7 +113,7 @@ export default function Workspace() {
       
       if (result.status === 'ok' && result.data) {
         if (result.data.image_base64) {
-          setGeneratedImage(`data:image/png;base64,${result.data.image_base64}`);
+          setGeneratedImage(`data:${result.data.image_mime || "image/png"};base64,${result.data.image_base64}`);
         } else if (result.data.latest_path || result.data.image_path) {
           // Normalize path from backend (handles windows backslashes and leading ./)
           const normalizedPath = String(result.data.latest_path || result.data.image_path)
@@ -141,7 +141,7 @@ export default function Workspace() {
           timestamp: new Date().toISOString(),
           title: `Generated ${mode === "ui" ? "UI" : "3D"} Design`,
           description: description,
-          imageUrl: result.data.image_base64 ? `data:image/png;base64,${result.data.image_base64}` : 
+          imageUrl: result.data.image_base64 ? `data:${result.data.image_mime || "image/png"};base64,${result.data.image_base64}` : 
                     (result.data.latest_path ? `${ENDPOINTS.HEALTH.replace(/\/health$/, "")}/${result.data.latest_path.replace(/\\/g, "/").replace(/^\.\//, "")}` : 
                     (result.data.image_path ? `${ENDPOINTS.HEALTH.replace(/\/health$/, "")}/${result.data.image_path.replace(/\\/g, "/").replace(/^\.\//, "")}` : undefined))
         };